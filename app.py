@@ -1,24 +1,47 @@
 # inbuilt libraries
+import time
+_STARTED_AT = time.perf_counter()
+
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
 # third-party libraries
-from flask import Flask, jsonify
+import click
+from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 
-from flask_smorest import Api
+from flask_smorest import Api, abort
 
 # custom libraries
+from geospatial_api import migrations, partitioning, projection
+from geospatial_api.admission import init_admission
+from geospatial_api.compression import init_compression
+from geospatial_api.hot_queries import init_hot_queries
+from geospatial_api.query_log import init_query_log
+from geospatial_api.serialization import make_json_provider
 from geospatial_api.models.db import db
+from geospatial_api.models.geometry_cell import GeometryCellModel
+from geospatial_api.models.geometry_piece import GeometryPieceModel
+from geospatial_api.storage import init_storage
 from geospatial_api.resources.geometry import blp as GeometryBlueprint
 from geospatial_api.resources.free_geocoding import blp as FreeGeoCodingBlueprint
+from geospatial_api.resources.aggregation import blp as AggregationBlueprint
+from geospatial_api.resources.geofence import blp as GeofenceBlueprint
+from geospatial_api.resources.admin import blp as AdminBlueprint
 
 
-def create_app() -> Flask:
+def create_app(config: dict = None) -> Flask:
     """
     Creates and configures the Flask app.
 
+    Parameters
+    ----------
+    config : dict, optional
+        Configuration values that override the defaults, e.g. {"JSON_PROVIDER": "default"}
+        or {"COMPRESS_ALGORITHMS": ["gzip"], "COMPRESS_MIN_SIZE": 512}.
+
     Returns
     -------
         The Flask app.
@@ -43,20 +66,282 @@ def create_app() -> Flask:
 
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # Quantidade máxima de ids por comando nas operações em massa
+    app.config["BULK_CHUNK_SIZE"] = 1000
+
+    # Quantidade máxima de sub-pedidos em POST /geometry/query-batch
+    app.config["QUERY_BATCH_MAX_QUERIES"] = 100
+
+    # Validação das geometrias na escrita: reparo com make_valid e limite de vértices
+    app.config["GEOMETRY_REPAIR"] = True
+    app.config["GEOMETRY_MAX_VERTICES"] = 1_000_000
+
+    # Quantidade máxima de vértices de cada pedaço (ST_Subdivide) da tabela geometry_pieces
+    app.config["GEOMETRY_SUBDIVIDE_MAX_VERTICES"] = 256
+
+    # Células geohash de cobertura das geometrias (tabela geometry_cells), usadas como pré-filtro
+    # das consultas espaciais: precisões mínima e máxima e quantidade máxima de células
+    app.config["GEOMETRY_CELL_INDEX"] = True
+    app.config["GEOMETRY_CELL_MIN_PRECISION"] = 1
+    app.config["GEOMETRY_CELL_MAX_PRECISION"] = 7
+    app.config["GEOMETRY_CELL_MAX_CELLS"] = 32
+    app.config["GEOMETRY_CELL_MAX_QUERY_CELLS"] = 256
+
+    # Particionamento espacial opcional ("flask partitions"): precisão da chave geohash, poda das
+    # partições nas consultas e limites de linhas para criar ou desfazer uma partição
+    app.config["GEOMETRY_PARTITIONING"] = os.getenv("GEOMETRY_PARTITIONING", "false").lower() == "true"
+    app.config["GEOMETRY_PARTITION_PRECISION"] = 3
+    app.config["GEOMETRY_PARTITION_MAX_KEYS"] = 1024
+    app.config["PARTITION_SPLIT_ROWS"] = 1_000_000
+    app.config["PARTITION_MERGE_ROWS"] = 100_000
+
+    # Agregações: quantidade máxima de células da grade e de clusters e raio (em pixels) dos clusters
+    app.config["AGGREGATION_MAX_CELLS"] = 100_000
+    app.config["AGGREGATION_MAX_CLUSTERS"] = 10_000
+    app.config["CLUSTER_RADIUS_PIXELS"] = 40
+
+    # Geofencing: tamanho dos micro-lotes de posições, validade (em segundos) do índice das zonas
+    # e quantidade máxima de índices (um por descrição) mantidos em memória
+    app.config["GEOFENCE_BATCH_SIZE"] = 1000
+    app.config["GEOFENCE_INDEX_TTL"] = 30
+    app.config["GEOFENCE_MAX_INDEXES"] = 64
+
+    # Controle de admissão: taxa por chave de API (token bucket), requisições simultâneas por
+    # rota com fila limitada e custo estimado (EXPLAIN) dos filtros espaciais
+    app.config["ADMISSION_CONTROL"] = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+    app.config["ADMISSION_API_KEY_HEADER"] = "X-API-Key"
+    app.config["ADMISSION_API_KEYS"] = []
+    app.config["ADMISSION_RATE"] = 50
+    app.config["ADMISSION_BURST"] = 100
+    app.config["ADMISSION_CLIENT_LIMITS"] = {}
+    app.config["ADMISSION_MAX_CLIENTS"] = 10_000
+    app.config["ADMISSION_ROUTE_CONCURRENCY"] = {
+        "/geometry": 16,
+        "/geometry/bulk": 2,
+        "/geometry/query-batch": 4,
+        "/geometry/aggregate/grid": 4,
+        "/geometry/aggregate/clusters": 4,
+        "/geometry/geofence": 8,
+        "/adresses": 4,
+        "/coordinates": 4,
+    }
+    app.config["ADMISSION_QUEUE_SIZE"] = 32
+    app.config["ADMISSION_QUEUE_TIMEOUT"] = 5
+    app.config["ADMISSION_COST_CHECK"] = True
+    app.config["ADMISSION_EXPENSIVE_QUERY_COST"] = 50_000
+    app.config["ADMISSION_EXPENSIVE_CONCURRENCY"] = 2
+    app.config["ADMISSION_MAX_QUERY_COST"] = 5_000_000
+
+    # Registro das consultas SQL lentas: limite (em ms), parâmetros mascarados, amostra das
+    # consultas lentas reexecutadas com EXPLAIN (ANALYZE, BUFFERS) e estatísticas por consulta
+    app.config["SLOW_QUERY_LOG"] = os.getenv("SLOW_QUERY_LOG", "true").lower() == "true"
+    app.config["SLOW_QUERY_THRESHOLD_MS"] = 200
+    app.config["SLOW_QUERY_REDACT_PARAMETERS"] = True
+    app.config["SLOW_QUERY_EXPLAIN_SAMPLE"] = 0.1
+    app.config["SLOW_QUERY_MAX_FINGERPRINTS"] = 500
+    app.config["SLOW_QUERY_RECENT"] = 100
+
+    # Rotas de administração (/admin/...): registradas apenas com um token definido, que deve ser
+    # enviado no cabeçalho ADMIN_TOKEN_HEADER
+    app.config["ADMIN_TOKEN"] = os.getenv("ADMIN_TOKEN")
+    app.config["ADMIN_TOKEN_HEADER"] = "X-Admin-Token"
+
+    # Consultas frequentes de GET /geometry cujas respostas são pré-calculadas e atualizadas nas
+    # escritas, e.g. [{"description": "escola"}, {"description": "parque", "bbox": [-47, -24, -46, -23]}]
+    app.config["HOT_QUERIES"] = []
+
+    # Serialização JSON ("orjson", se instalado, ou "default") e compressão negociada das respostas
+    app.config["JSON_PROVIDER"] = "orjson"
+    app.config["COMPRESS_ALGORITHMS"] = ["br", "zstd", "gzip"]
+    app.config["COMPRESS_MIN_SIZE"] = 1024
+    app.config["COMPRESS_LEVELS"] = {"br": 4, "zstd": 3, "gzip": 6}
+
+    # Armazenamento das geometrias: "postgis" ou "memory" (STRtree, com snapshot opcional em arquivo)
+    app.config["STORAGE_BACKEND"] = os.getenv("STORAGE_BACKEND", "postgis")
+    app.config["MEMORY_SNAPSHOT_PATH"] = os.getenv("MEMORY_SNAPSHOT_PATH")
+    app.config["MEMORY_SNAPSHOT_ON_EXIT"] = True
+
+    app.config.update(config or {})
+
+    # O armazenamento em memória não depende de um servidor de banco de dados
+    if app.config["STORAGE_BACKEND"] == "memory" and not os.getenv("DATABASE_HOST"):
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+
+    app.json = make_json_provider(app, app.config["JSON_PROVIDER"])
+    init_compression(app)
+
     db.init_app(app)
+    init_storage(app)
+    init_hot_queries(app)
+    init_admission(app)
+    init_query_log(app)
 
     api = Api(app)
 
-    with app.app_context():
-        db.create_all()
+    # O esquema é conferido até a primeira requisição que o encontra completo: com migrações pendentes
+    # (e.g. colunas derivadas ainda não criadas), a resposta é 503 com o comando a executar, em vez
+    # de um erro na primeira escrita ou leitura da coluna ausente
+    if app.config["STORAGE_BACKEND"] == "postgis":
+        @app.before_request
+        def check_schema():
+            if app.extensions.get("schema_checked") or request.blueprint in (None, "api-docs"):
+                return
+            with db.engine.connect() as connection:
+                missing = migrations.missing_columns(connection, db.metadata)
+            if missing:
+                abort(503, message=f"The database schema is out of date (missing {', '.join(missing)}), run 'flask migrate'")
+            app.extensions["schema_checked"] = True
+
+    # O esquema do banco é criado e atualizado pelo comando "flask migrate", e não na inicialização
+    @app.cli.command("migrate")
+    @click.option("--target", type=int, default=None, help="Schema version to migrate to.")
+    @click.option("--status", is_flag=True, help="Only show the current schema version.")
+    def migrate(target, status):
+        """Applies the pending schema migrations."""
+        if status:
+            with db.engine.begin() as connection:
+                version = migrations.current_version(connection)
+            print(f"Schema version {version}, latest version {migrations.latest_version()}")
+            return
+
+        applied = migrations.upgrade(db.engine, app.config, target=target)
+        for version, description in applied:
+            print(f"Applied migration {version}: {description}")
+        if not applied:
+            print("The schema is up to date")
+
+    @app.cli.command("refresh-pieces")
+    def refresh_pieces():
+        """Rebuilds the subdivided pieces of every stored geometry."""
+        total = GeometryPieceModel.rebuild(
+            max_vertices=app.config["GEOMETRY_SUBDIVIDE_MAX_VERTICES"],
+            chunk_size=app.config["BULK_CHUNK_SIZE"]
+        )
+        print(f"Pieces rebuilt for {total} geometries")
+
+    @app.cli.command("refresh-cells")
+    def refresh_cells():
+        """Rebuilds the covering cells of every stored geometry."""
+        total = GeometryCellModel.rebuild(
+            min_precision=app.config["GEOMETRY_CELL_MIN_PRECISION"],
+            max_precision=app.config["GEOMETRY_CELL_MAX_PRECISION"],
+            max_cells=app.config["GEOMETRY_CELL_MAX_CELLS"],
+            chunk_size=app.config["BULK_CHUNK_SIZE"]
+        )
+        print(f"Cells rebuilt for {total} geometries")
+
+    @app.cli.command("refresh-hot-queries")
+    def refresh_hot_queries():
+        """Recomputes the stored results of the hot queries."""
+        total = app.extensions["hot_queries"].refresh()
+        print(f"Results refreshed for {total} hot queries")
+
+    @app.cli.group("partitions")
+    def partitions():
+        """Manages the spatial partitions of the geometries."""
+
+    @partitions.command("enable")
+    def enable_partitions():
+        """Converts the geometries tables into tables partitioned by the spatial key."""
+        if partitioning.enable(db.engine):
+            print("The geometries tables are now partitioned, run 'flask partitions rebalance'")
+        else:
+            print("The geometries tables are already partitioned")
+
+    @partitions.command("rebalance")
+    @click.option("--split-rows", type=int, default=None, help="Rows from which a key gets its own partition.")
+    @click.option("--merge-rows", type=int, default=None, help="Rows below which a partition is merged.")
+    def rebalance_partitions(split_rows, merge_rows):
+        """Creates partitions for the crowded keys and merges the sparse ones."""
+        moved = partitioning.rebalance(
+            db.engine,
+            split_rows=split_rows or app.config["PARTITION_SPLIT_ROWS"],
+            merge_rows=merge_rows if merge_rows is not None else app.config["PARTITION_MERGE_ROWS"]
+        )
+        for action, key, rows in moved:
+            print(f"{action.capitalize()} key '{key}' ({rows} geometries)")
+        if not moved:
+            print("The partitions are balanced")
+
+    @partitions.command("status")
+    def partitions_status():
+        """Shows the partitions of the geometries table."""
+        with db.engine.connect() as connection:
+            rows = partitioning.status(connection)
+        for name, bound, count in rows:
+            print(f"{name:<32} {bound:<32} ~{count} rows")
+
+    @app.cli.group("projections")
+    def projections():
+        """Manages the materialized projections of the geometries."""
+
+    @projections.command("materialize")
+    @click.argument("srid", type=int)
+    def materialize_projection(srid):
+        """Stores the geometries reprojected to SRID in a generated column."""
+        if projection.materialize(db.engine, srid):
+            print(f"The geometries in EPSG:{srid} are now stored in the column geom_{srid}, restart the workers to use it")
+        else:
+            print(f"The projection EPSG:{srid} is already materialized")
+
+    @projections.command("drop")
+    @click.argument("srid", type=int)
+    def drop_projection(srid):
+        """Drops the generated column of SRID."""
+        if projection.dematerialize(db.engine, srid):
+            print(f"The column geom_{srid} was dropped")
+        else:
+            print(f"The projection EPSG:{srid} is not materialized")
+
+    @projections.command("status")
+    def projections_status():
+        """Shows the materialized projections."""
+        with db.engine.connect() as connection:
+            srids = sorted(projection.materialized_srids(connection))
+        print(", ".join(f"EPSG:{srid}" for srid in srids) if srids else "No materialized projection")
 
     # Registrando as interações dos usuários com a API
     api.register_blueprint(GeometryBlueprint)
     api.register_blueprint(FreeGeoCodingBlueprint)
+    api.register_blueprint(AggregationBlueprint)
+    api.register_blueprint(GeofenceBlueprint)
+    if app.config["ADMIN_TOKEN"]:
+        api.register_blueprint(AdminBlueprint)
 
     return app
 
 
+def check_startup() -> dict:
+    """
+    Measures the startup of the app: module imports, app creation and the first served
+    request, which does not touch the database.
+
+    Returns
+    -------
+        A dictionary with the timings, in milliseconds, and the lazily loaded libraries
+        that were already imported.
+    """
+    imported_at = time.perf_counter()
+    app = create_app()
+    created_at = time.perf_counter()
+    response = app.test_client().get(f"{app.config['OPENAPI_URL_PREFIX'].rstrip('/')}/openapi.json")
+    served_at = time.perf_counter()
+
+    return {
+        "imports_ms": round((imported_at - _STARTED_AT) * 1000, 1),
+        "create_app_ms": round((created_at - imported_at) * 1000, 1),
+        "first_request_ms": round((served_at - created_at) * 1000, 1),
+        "total_ms": round((served_at - _STARTED_AT) * 1000, 1),
+        "first_request_status": response.status_code,
+        "lazy_libraries_loaded": sorted(name for name in ("requests",) if name in sys.modules)
+    }
+
+
 if __name__ == "__main__":
+    if "--check-startup" in sys.argv:
+        for key, value in check_startup().items():
+            print(f"{key:<24} {value}")
+        sys.exit(0)
+
     app = create_app()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+    Benchmark of the geofence index: number of position updates evaluated per second, per
+    micro-batch size, against circular zones spread over the globe.
+
+    It does not require a database, the zones are indexed directly.
+
+    Usage: python benchmarks/bench_geofence.py [--zones 10000] [--objects 10000] [--updates 200000]
+"""
+# inbuilt libraries
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# third-party libraries
+from shapely.geometry import Point
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# custom libraries
+from geospatial_api.geofence import GeofenceIndex, GeofenceTracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--zones", type=int, default=10_000)
+    parser.add_argument("--objects", type=int, default=10_000)
+    parser.add_argument("--updates", type=int, default=200_000)
+    args = parser.parse_args()
+
+    random.seed(42)
+
+    # Zonas com centenas de vértices, do tamanho de um bairro a uma cidade
+    zones = [
+        Point(random.uniform(-170, 170), random.uniform(-70, 70)).buffer(random.uniform(0.01, 0.5), quad_segs=64)
+        for _ in range(args.zones)
+    ]
+    start = time.perf_counter()
+    index = GeofenceIndex(list(range(1, args.zones + 1)), zones)
+    print(f"{args.zones} zones indexed in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    updates = [
+        (i % args.objects, random.uniform(-170, 170), random.uniform(-70, 70), i)
+        for i in range(args.updates)
+    ]
+
+    for batch_size in (1, 100, 1000, 10_000):
+        tracker = GeofenceTracker(index)
+        count = min(args.updates, batch_size * 1000)
+        events = 0
+
+        start = time.perf_counter()
+        for i in range(0, count, batch_size):
+            events += len(tracker.process(updates[i:i + batch_size]))
+        elapsed = time.perf_counter() - start
+
+        print(f"batch {batch_size:>6} {count / elapsed:12.0f} updates/s {events:>8} events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+    Benchmark of the containment and intersection filters on huge polygons, comparing the
+    test on the whole geometry with the test on its subdivided pieces (geometry_pieces).
+
+    It requires the same .env file as the application, pointing to a PostGIS database whose
+    tables may be dropped.
+
+    Usage: python benchmarks/bench_pieces.py [--polygons 20] [--vertices 100000] [--queries 200]
+"""
+# inbuilt libraries
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+# third-party libraries
+from shapely.geometry import Point, mapping
+from sqlalchemy import func, select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# custom libraries
+from app import create_app
+from geospatial_api.models import GeometryModel, GeometryPieceModel, db
+
+
+def _time_queries(conditions: list) -> float:
+    """
+        Runs one query per condition and returns the mean time in milliseconds.
+    """
+    start = time.perf_counter()
+    for condition in conditions:
+        db.session.execute(select(GeometryModel.id).where(condition)).scalars().all()
+    return (time.perf_counter() - start) * 1000 / len(conditions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--polygons", type=int, default=20)
+    parser.add_argument("--vertices", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    client = app.test_client()
+    random.seed(42)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        # Polígonos do tamanho de um país, com milhares de vértices cada
+        for i in range(args.polygons):
+            center = Point(random.uniform(-150, 150), random.uniform(-60, 60))
+            polygon = center.buffer(10, quad_segs=args.vertices // 4)
+            response = client.post("/geometry", json={
+                "description": f"Country {i}",
+                "geom": mapping(polygon)
+            })
+            assert response.status_code == 201, response.get_json()
+
+        pieces = db.session.execute(select(func.count()).select_from(GeometryPieceModel)).scalar_one()
+        print(f"{args.polygons} polygons with {args.vertices} vertices, {pieces} pieces")
+
+        points = [
+            func.ST_GeomFromGeoJSON(json.dumps(mapping(Point(random.uniform(-180, 180), random.uniform(-70, 70)))))
+            for _ in range(args.queries)
+        ]
+
+        benchmarks = {
+            "contains (whole geometry)": [func.ST_Contains(GeometryModel.geom, p) for p in points],
+            "contains (pieces)": [GeometryPieceModel.contains_condition(p) for p in points],
+            "intersects (whole geometry)": [func.ST_Intersects(GeometryModel.geom, p) for p in points],
+            "intersects (pieces)": [GeometryPieceModel.intersects_condition(p) for p in points],
+        }
+
+        for name, conditions in benchmarks.items():
+            print(f"{name:<30} {_time_queries(conditions):10.3f} ms/query")
+
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+    Benchmark of the containment and intersection tests on huge polygons, comparing the test
+    on the whole geometry with the test on its subdivided pieces, directly in GEOS (the library
+    PostGIS uses for ST_Contains and ST_Intersects).
+
+    It does not require a database: the polygons are subdivided in halves, as ST_Subdivide
+    does, and the candidates are selected by an STRtree, as the GiST index does. Only the
+    predicate tests are measured, not the reads, joins and fallbacks of the SQL queries, which
+    bench_pieces.py measures in PostGIS.
+
+    Usage: python benchmarks/bench_pieces_geos.py [--polygons 20] [--vertices 100000] [--queries 200]
+"""
+# inbuilt libraries
+import argparse
+import random
+import time
+
+# third-party libraries
+import shapely
+from shapely.geometry import Point, box
+from shapely.strtree import STRtree
+
+
+def subdivide(geometry, max_vertices: int = 256) -> list:
+    """
+        Splits a geometry in halves, along its longest side, until each piece has at most
+        max_vertices vertices.
+    """
+    if shapely.get_num_coordinates(geometry) <= max_vertices:
+        return [geometry]
+
+    minx, miny, maxx, maxy = geometry.bounds
+    if maxx - minx >= maxy - miny:
+        middle = (minx + maxx) / 2
+        halves = [box(minx, miny, middle, maxy), box(middle, miny, maxx, maxy)]
+    else:
+        middle = (miny + maxy) / 2
+        halves = [box(minx, miny, maxx, middle), box(minx, middle, maxx, maxy)]
+
+    pieces = []
+    for half in halves:
+        piece = shapely.clip_by_rect(geometry, *half.bounds)
+        if not piece.is_empty:
+            pieces.extend(subdivide(piece, max_vertices))
+    return pieces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--polygons", type=int, default=20)
+    parser.add_argument("--vertices", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+
+    # Polígonos do tamanho de um país, com dezenas de milhares de vértices cada
+    polygons = [
+        Point(random.uniform(-150, 150), random.uniform(-60, 60)).buffer(10, quad_segs=args.vertices // 4)
+        for _ in range(args.polygons)
+    ]
+    pieces, owners = [], []
+    for id, polygon in enumerate(polygons):
+        polygon_pieces = subdivide(polygon)
+        pieces.extend(polygon_pieces)
+        owners.extend([id] * len(polygon_pieces))
+
+    whole_tree, pieces_tree = STRtree(polygons), STRtree(pieces)
+    print(
+        f"{args.polygons} polygons with {shapely.get_num_coordinates(polygons[0])} vertices, "
+        f"{len(pieces)} pieces"
+    )
+
+    # Pontos aleatórios, em sua maioria fora dos polígonos, e os centros, dentro deles
+    points = [Point(random.uniform(-180, 180), random.uniform(-70, 70)) for _ in range(args.queries)]
+    points += [polygon.centroid for polygon in polygons]
+
+    benchmarks = {
+        "contains (whole geometry)": lambda p: {int(i) for i in whole_tree.query(p) if polygons[i].contains(p)},
+        "contains (pieces)": lambda p: {owners[i] for i in pieces_tree.query(p) if pieces[i].contains(p)},
+        "intersects (whole geometry)": lambda p: {int(i) for i in whole_tree.query(p) if polygons[i].intersects(p)},
+        "intersects (pieces)": lambda p: {owners[i] for i in pieces_tree.query(p) if pieces[i].intersects(p)},
+    }
+
+    results = {}
+    for name, query in benchmarks.items():
+        start = time.perf_counter()
+        results[name] = [query(point) for point in points]
+        elapsed = (time.perf_counter() - start) * 1000 / len(points)
+        print(f"{name:<30} {elapsed:10.3f} ms/query")
+
+    # Os dois métodos devem selecionar os mesmos polígonos
+    assert results["contains (whole geometry)"] == results["contains (pieces)"]
+    assert results["intersects (whole geometry)"] == results["intersects (pieces)"]
+
+
+if __name__ == "__main__":
+    main()
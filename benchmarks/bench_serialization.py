@@ -0,0 +1,88 @@
+"""
+    Benchmark of the JSON providers and of the response compression on a payload shaped like
+    the response of GET /geometry (a list of geometries serialized as WKT).
+
+    It does not require a database.
+
+    Usage: python benchmarks/bench_serialization.py [--geometries 10000] [--vertices 100]
+"""
+# inbuilt libraries
+import argparse
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+# third-party libraries
+from flask import Flask
+from shapely.geometry import Polygon
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# custom libraries
+from geospatial_api.compression import available_encodings, compress
+from geospatial_api.serialization import JSON_PROVIDERS, orjson
+
+
+def _payload(geometries: int, vertices: int) -> list:
+    """
+        Builds a list of geometries in the format returned by GeometryModel.as_dict.
+    """
+    payload = []
+    for i in range(geometries):
+        x, y = random.uniform(-180, 180), random.uniform(-90, 90)
+        polygon = Polygon([
+            (x + math.cos(2 * math.pi * j / vertices), y + math.sin(2 * math.pi * j / vertices))
+            for j in range(vertices)
+        ])
+        payload.append({"ID": i, "DESCRIPTION": f"Geometry {i % 50}", "GEOMETRY": polygon.wkt})
+    return payload
+
+
+def _best_of(function, repeat: int = 5) -> float:
+    """
+        Returns the best execution time of the function, in milliseconds.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--geometries", type=int, default=10_000)
+    parser.add_argument("--vertices", type=int, default=100)
+    args = parser.parse_args()
+
+    random.seed(42)
+    payload = _payload(args.geometries, args.vertices)
+    app = Flask(__name__)
+
+    print(f"{args.geometries} geometries with {args.vertices} vertices")
+    print("\nJSON encoding (response body)")
+
+    body = None
+    for name, provider_class in JSON_PROVIDERS.items():
+        if name == "orjson" and orjson is None:
+            print(f"{name:<10} not installed")
+            continue
+        provider = provider_class(app)
+        with app.app_context():
+            elapsed = _best_of(lambda: provider.response(payload).get_data())
+            body = provider.response(payload).get_data()
+        print(f"{name:<10} {elapsed:10.1f} ms {len(body):>14,} bytes")
+
+    print("\nCompression (bytes on the wire)")
+    print(f"{'identity':<10} {0:10.1f} ms {len(body):>14,} bytes")
+    for encoding in available_encodings():
+        elapsed = _best_of(lambda: compress(body, encoding))
+        size = len(compress(body, encoding))
+        print(f"{encoding:<10} {elapsed:10.1f} ms {size:>14,} bytes ({size / len(body):.1%})")
+
+
+if __name__ == "__main__":
+    main()
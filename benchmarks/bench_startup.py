@@ -0,0 +1,108 @@
+"""
+    Benchmark of the cold start of the app: each run starts a new Python process that imports
+    the app, creates it and serves a first request that does not touch the database, as
+    'python app.py --check-startup' does.
+
+    With --baseline, the same runs are made, interleaved, on another revision checked out in a
+    temporary git worktree, e.g. the revision before a change to the startup. A revision whose
+    create_app fails (e.g. one that connects to an unreachable database) only reports its
+    import time and the error.
+
+    Usage: python benchmarks/bench_startup.py [--runs 10] [--baseline <git revision>]
+"""
+# inbuilt libraries
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Executado no diretório da revisão medida; não depende de --check-startup, que revisões
+# anteriores não têm
+PROBE = """
+import json, time
+started_at = time.perf_counter()
+import app
+imported_at = time.perf_counter()
+report = {"imports_ms": (imported_at - started_at) * 1000}
+try:
+    flask_app = app.create_app()
+    created_at = time.perf_counter()
+    flask_app.test_client().get("/openapi.json")
+    report["create_app_ms"] = (created_at - imported_at) * 1000
+    report["first_request_ms"] = (time.perf_counter() - created_at) * 1000
+except Exception as e:
+    report["error"] = f"{type(e).__name__}: {str(e).splitlines()[0]}"
+print(json.dumps(report))
+"""
+
+
+def _run(tree: Path) -> dict:
+    """
+        Starts the app of a source tree in a new process and returns its startup report, with
+        the wall-clock time of the whole process (interpreter startup included).
+    """
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=tree, capture_output=True, text=True, check=True
+    ).stdout
+    elapsed = (time.perf_counter() - start) * 1000
+    return {"process_ms": elapsed, **json.loads(output.splitlines()[-1])}
+
+
+def _summary(reports: list) -> dict:
+    """
+        Returns the median of each timing of the reports and the errors, if any.
+    """
+    summary = {
+        key: statistics.median(report[key] for report in reports if key in report)
+        for key in ("process_ms", "imports_ms", "create_app_ms", "first_request_ms")
+        if any(key in report for report in reports)
+    }
+    errors = {report["error"] for report in reports if "error" in report}
+    if errors:
+        summary["error"] = "; ".join(sorted(errors))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--baseline", help="Git revision measured as the baseline.")
+    args = parser.parse_args()
+
+    trees = {"current": ROOT}
+    worktree = None
+    if args.baseline:
+        worktree = Path(tempfile.mkdtemp(prefix="bench_startup_")) / "baseline"
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", str(worktree), args.baseline],
+            cwd=ROOT, capture_output=True, check=True
+        )
+        trees = {f"baseline ({args.baseline})": worktree, **trees}
+
+    try:
+        # As execuções são intercaladas para que variações da máquina afetem as duas revisões
+        reports = {name: [] for name in trees}
+        for _ in range(args.runs):
+            for name, tree in trees.items():
+                reports[name].append(_run(tree))
+    finally:
+        if worktree is not None:
+            subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=ROOT, check=True)
+
+    print(f"Cold start, median of {args.runs} runs")
+    for name, tree_reports in reports.items():
+        print(name)
+        for key, value in _summary(tree_reports).items():
+            print(f"    {key:<20} {value:10.1f} ms" if key != "error" else f"    {key:<20} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+# inbuilt libraries
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# third-party libraries
+from flask import Flask, current_app, g, request
+from flask_smorest import abort
+
+# custom libraries
+from geospatial_api.storage.base import StorageBackend
+
+
+# Rotas que nunca passam pelo controle de admissão (métricas e documentação da API)
+EXEMPT_BLUEPRINTS = ("Admin", "api-docs")
+
+
+class RateLimited(Exception):
+    """
+    Raised when a client has no token left in its bucket. It is reported as a 429 response.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed because its queue is full or it waited too long for a slot.
+    It is reported as a 503 response.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket of one client: 'rate' tokens per second are added up to 'burst' tokens, and
+    each request takes one token.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Takes a token from the bucket.
+
+        Returns
+        ----------
+            0 if a token was taken, otherwise the number of seconds until a token is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class ConcurrencyGate:
+    """
+    Limits the number of requests of a route running at the same time.
+
+    Requests above the limit wait in a bounded queue for at most 'timeout' seconds; when the
+    queue is full, or the wait times out, the request is shed with Overloaded.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.counters = {"admitted": 0, "queued": 0, "shed": 0, "wait_ms": 0.0}
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Waits for a slot of the gate.
+
+        Raises
+        ----------
+            Overloaded
+                If the queue is full or no slot was released within the timeout.
+        """
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                self.counters["admitted"] += 1
+                return
+
+            if self.waiting >= self.queue_size:
+                self.counters["shed"] += 1
+                raise Overloaded(f"Too many requests waiting for {self.name}", self.timeout)
+
+            self.waiting += 1
+            self.counters["queued"] += 1
+            started_at = time.monotonic()
+            try:
+                admitted = self._condition.wait_for(lambda: self.active < self.limit, timeout=self.timeout)
+            finally:
+                self.waiting -= 1
+                self.counters["wait_ms"] += (time.monotonic() - started_at) * 1000
+
+            if not admitted:
+                self.counters["shed"] += 1
+                raise Overloaded(f"No slot was released for {self.name} in {self.timeout} seconds", self.timeout)
+
+            self.active += 1
+            self.counters["admitted"] += 1
+
+    def release(self) -> None:
+        """
+        Releases a slot acquired with acquire.
+        """
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def metrics(self) -> dict:
+        """
+        Returns the limits, the current state and the counters of the gate.
+
+        Returns
+        ----------
+            A dictionary with the metrics.
+        """
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "queue_size": self.queue_size,
+                "active": self.active,
+                "waiting": self.waiting,
+                **self.counters,
+                "wait_ms": round(self.counters["wait_ms"], 1)
+            }
+
+
+class AdmissionController:
+    """
+    Admission control of the app: a token bucket per API key (or client address when the key
+    is not sent or not configured), a concurrency gate per route and a cost check of the spatial filters, whose
+    expensive queries share a smaller gate.
+
+    The limits are per process, so with several workers the effective limits are multiplied
+    by the number of workers.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Forgets the buckets of the clients and recreates the gates with the current
+        configuration, e.g. between tests.
+        """
+        config = self.config
+        queue_size = config.get("ADMISSION_QUEUE_SIZE", 32)
+        timeout = config.get("ADMISSION_QUEUE_TIMEOUT", 5)
+
+        with self._lock:
+            self.buckets = OrderedDict()
+            self.counters = {"rate_limited": 0, "cost_checked": 0, "cost_rejected": 0}
+            self.gates = {
+                route: ConcurrencyGate(route, limit, queue_size, timeout)
+                for route, limit in config.get("ADMISSION_ROUTE_CONCURRENCY", {}).items()
+            }
+            self.expensive_gate = ConcurrencyGate(
+                "expensive queries", config.get("ADMISSION_EXPENSIVE_CONCURRENCY", 2), queue_size, timeout
+            )
+
+    def take_token(self, client: str) -> None:
+        """
+        Takes a token from the bucket of a client.
+
+        Parameters
+        ----------
+        client : str
+            The API key, or the address of the client.
+
+        Raises
+        ----------
+            RateLimited
+                If the bucket of the client is empty.
+        """
+        with self._lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                limits = self.config.get("ADMISSION_CLIENT_LIMITS", {}).get(client, {})
+                bucket = TokenBucket(
+                    rate=limits.get("rate", self.config.get("ADMISSION_RATE", 50)),
+                    burst=limits.get("burst", self.config.get("ADMISSION_BURST", 100))
+                )
+                self.buckets[client] = bucket
+
+                # Os clientes inativos há mais tempo são esquecidos (voltam com o balde cheio)
+                if len(self.buckets) > self.config.get("ADMISSION_MAX_CLIENTS", 10_000):
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(client)
+
+            wait = bucket.take()
+            if wait:
+                self.counters["rate_limited"] += 1
+                raise RateLimited("Rate limit exceeded, retry later", wait)
+
+    def gate(self, route: str):
+        """
+        Returns the concurrency gate of a route.
+
+        Parameters
+        ----------
+        route : str
+            The URL rule of the route, e.g. '/geometry'.
+
+        Returns
+        ----------
+            The gate, or None if the route has no concurrency limit.
+        """
+        return self.gates.get(route)
+
+    @contextmanager
+    def admit_query(self, storage: StorageBackend, filters: list):
+        """
+        Checks the estimated cost of the spatial filters before they run. A filter above
+        ADMISSION_MAX_QUERY_COST is rejected, and when a filter is above
+        ADMISSION_EXPENSIVE_QUERY_COST the queries run within the gate of the expensive queries.
+
+        Parameters
+        ----------
+        storage : StorageBackend
+            The storage that runs the queries.
+        filters : list
+            The keyword arguments of StorageBackend.find of each query.
+
+        Raises
+        ----------
+            ValueError
+                If a filter is estimated above ADMISSION_MAX_QUERY_COST.
+            Overloaded
+                If the gate of the expensive queries sheds the request.
+        """
+        max_cost = self.config.get("ADMISSION_MAX_QUERY_COST")
+        expensive_cost = self.config.get("ADMISSION_EXPENSIVE_QUERY_COST")
+        cost = 0
+
+        # Apenas os filtros espaciais são estimados, os de descrição usam o índice da coluna
+        if self.config.get("ADMISSION_CONTROL", True) and self.config.get("ADMISSION_COST_CHECK", True):
+            for arguments in filters:
+                if arguments.get("geometry") is None:
+                    continue
+                estimate = storage.estimate_cost(**arguments)
+                if estimate is None:
+                    continue
+
+                with self._lock:
+                    self.counters["cost_checked"] += 1
+                if max_cost is not None and estimate > max_cost:
+                    with self._lock:
+                        self.counters["cost_rejected"] += 1
+                    raise ValueError(
+                        f"The estimated cost of the query ({estimate:.0f}) is above {max_cost}, "
+                        "please narrow the filter"
+                    )
+                cost = max(cost, estimate)
+
+        if expensive_cost is None or cost <= expensive_cost:
+            yield
+            return
+
+        self.expensive_gate.acquire()
+        try:
+            yield
+        finally:
+            self.expensive_gate.release()
+
+    def metrics(self) -> dict:
+        """
+        Returns the limits and counters of the admission control.
+
+        Returns
+        ----------
+            A dictionary with the metrics of the rate limits, of the gate of each route and of
+            the gate of the expensive queries.
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            clients = len(self.buckets)
+
+        return {
+            "rate": {
+                "rate": self.config.get("ADMISSION_RATE", 50),
+                "burst": self.config.get("ADMISSION_BURST", 100),
+                "clients": clients,
+                "rate_limited": counters["rate_limited"]
+            },
+            "routes": {route: gate.metrics() for route, gate in self.gates.items()},
+            "cost": {
+                "expensive_query_cost": self.config.get("ADMISSION_EXPENSIVE_QUERY_COST"),
+                "max_query_cost": self.config.get("ADMISSION_MAX_QUERY_COST"),
+                "checked": counters["cost_checked"],
+                "rejected": counters["cost_rejected"],
+                "expensive": self.expensive_gate.metrics()
+            }
+        }
+
+
+def init_admission(app: Flask) -> AdmissionController:
+    """
+    Registers the admission control of the app, if ADMISSION_CONTROL is enabled: every request,
+    except the ones of the admin and documentation routes, takes a token of its client and a
+    slot of its route before running, and is rejected with 429 or shed with 503, both with a
+    Retry-After header, when it cannot.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app.
+
+    Returns
+    ----------
+        The admission controller, also available in app.extensions["admission"].
+    """
+    controller = AdmissionController(app.config)
+    app.extensions["admission"] = controller
+
+    if not app.config.get("ADMISSION_CONTROL", True):
+        return controller
+
+    @app.before_request
+    def admit():
+        if request.url_rule is None or request.blueprint in EXEMPT_BLUEPRINTS:
+            return
+
+        try:
+            controller.take_token(client_identity(app.config))
+
+            gate = controller.gate(request.url_rule.rule)
+            if gate is not None:
+                gate.acquire()
+                g.admission_gate = gate
+        except RateLimited as rl:
+            abort(429, message=str(rl), headers=retry_after(rl.retry_after))
+        except Overloaded as ol:
+            abort(503, message=str(ol), headers=retry_after(ol.retry_after))
+
+    # Executado também ao fim das respostas em streaming (stream_with_context)
+    @app.teardown_request
+    def release(exception=None):
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            gate.release()
+
+    return controller
+
+
+def client_identity(config: dict) -> str:
+    """
+    Returns the identity of the client of the current request for the rate limits.
+
+    The API key header is chosen by the client, so it is only trusted when the key is
+    configured in ADMISSION_API_KEYS or ADMISSION_CLIENT_LIMITS; otherwise a client could get a
+    new bucket by sending a new key on each request. Every other request is limited by the
+    address of the client.
+
+    Parameters
+    ----------
+    config : dict
+        The app configuration.
+
+    Returns
+    ----------
+        The API key, or 'address:<remote address>'.
+    """
+    key = request.headers.get(config.get("ADMISSION_API_KEY_HEADER", "X-API-Key"))
+    if key and (key in config.get("ADMISSION_API_KEYS", ()) or key in config.get("ADMISSION_CLIENT_LIMITS", {})):
+        return key
+    return f"address:{request.remote_addr}"
+
+
+def admit_query(storage: StorageBackend, filters: list):
+    """
+    Checks the estimated cost of the queries of the current request, see
+    AdmissionController.admit_query.
+
+    Parameters
+    ----------
+    storage : StorageBackend
+        The storage that runs the queries.
+    filters : list
+        The keyword arguments of StorageBackend.find of each query.
+
+    Returns
+    ----------
+        A context manager within which the queries should run.
+    """
+    return current_app.extensions["admission"].admit_query(storage, filters)
+
+
+def retry_after(seconds: float) -> dict:
+    """
+    Builds the Retry-After header of a rejected request.
+
+    Parameters
+    ----------
+    seconds : float
+        The number of seconds the client should wait.
+
+    Returns
+    ----------
+        The headers of the response.
+    """
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
@@ -0,0 +1,159 @@
+# inbuilt libraries
+import gzip
+
+# third-party libraries
+from flask import Flask, Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Tipos de conteúdo que se beneficiam da compressão (JSON, WKT, GeoJSON, etc.)
+COMPRESSIBLE_MIMETYPES = (
+    "application/json",
+    "application/geo+json",
+    "application/xml",
+    "application/javascript",
+    "text/",
+)
+
+DEFAULT_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+
+
+def available_encodings() -> list:
+    """
+    Returns the content encodings supported by the installed libraries.
+
+    Returns
+    ----------
+        A list with 'gzip' and, if installed, 'br' (brotli) and 'zstd' (zstandard).
+    """
+    encodings = ["gzip"]
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    """
+    Compresses the data with the given content encoding.
+
+    Parameters
+    ----------
+    data : bytes
+        The data to be compressed.
+    encoding : str
+        The content encoding, 'gzip', 'br' or 'zstd'.
+    level : int, optional
+        The compression level. The default level of the encoding is used if not provided.
+
+    Returns
+    ----------
+        The compressed data.
+
+    Raises
+    ----------
+        ValueError
+            If the encoding is not available.
+    """
+    if encoding not in available_encodings():
+        raise ValueError(f"Content encoding '{encoding}' is not available")
+
+    level = DEFAULT_LEVELS[encoding] if level is None else level
+
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _negotiate(algorithms: list) -> str:
+    """
+    Chooses the content encoding of the response from the Accept-Encoding header.
+
+    Parameters
+    ----------
+    algorithms : list
+        The enabled encodings, in order of preference.
+
+    Returns
+    ----------
+        The chosen encoding, or None if the client accepts none of them.
+    """
+    available = available_encodings()
+    accepted = [
+        encoding for encoding in algorithms
+        if encoding in available and request.accept_encodings.quality(encoding) > 0
+    ]
+    if not accepted:
+        return None
+
+    # A preferência do cliente (q) prevalece; em caso de empate, vale a ordem configurada
+    return max(accepted, key=lambda encoding: request.accept_encodings.quality(encoding))
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Compresses the response body when the client accepts one of the enabled encodings and
+    the body is compressible and larger than COMPRESS_MIN_SIZE bytes.
+
+    Parameters
+    ----------
+    response : Response
+        The response to be compressed.
+
+    Returns
+    ----------
+        The response, compressed or not.
+    """
+    config = current_app.config
+    algorithms = config.get("COMPRESS_ALGORITHMS", ["br", "zstd", "gzip"])
+
+    if (
+        not algorithms
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_MIMETYPES)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+
+    data = response.get_data()
+    if len(data) < config.get("COMPRESS_MIN_SIZE", 1024):
+        return response
+
+    encoding = _negotiate(algorithms)
+    if not encoding:
+        return response
+
+    levels = {**DEFAULT_LEVELS, **config.get("COMPRESS_LEVELS", {})}
+    response.set_data(compress(data, encoding, levels[encoding]))
+    response.headers["Content-Encoding"] = encoding
+
+    return response
+
+
+def init_compression(app: Flask) -> None:
+    """
+    Registers the response compression on the app.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app.
+    """
+    app.after_request(compress_response)
@@ -0,0 +1,188 @@
+# inbuilt libraries
+import threading
+import time
+from collections import OrderedDict
+
+# third-party libraries
+import numpy as np
+import shapely
+from flask import Flask
+from shapely.strtree import STRtree
+
+# custom libraries
+from geospatial_api.storage.base import StorageBackend
+
+
+class GeofenceIndex:
+    """
+    In-memory index of the zones (stored geometries) used to locate moving points.
+
+    The STRtree selects the zones whose bounding box contains each point, and the exact test
+    runs on prepared geometries with shapely.contains_xy, vectorized over the whole batch.
+    """
+
+    def __init__(self, ids: list, geometries: list, generation: int = 0):
+        self.generation = generation
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.zones = np.asarray(geometries, dtype=object)
+        shapely.prepare(self.zones)
+        self.tree = STRtree(self.zones)
+        self.built_at = time.monotonic()
+
+    def locate(self, x: np.ndarray, y: np.ndarray) -> list:
+        """
+        Returns the zones that contain each point.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The longitudes of the points.
+        y : np.ndarray
+            The latitudes of the points.
+
+        Returns
+        ----------
+            A list with, for each point, the set of ids of the zones that contain it.
+        """
+        located = [set() for _ in range(len(x))]
+        if not len(x) or not len(self.zones):
+            return located
+
+        points, zones = self.tree.query(shapely.points(x, y))
+        inside = shapely.contains_xy(self.zones[zones], x[points], y[points])
+
+        for point, zone in zip(points[inside].tolist(), self.ids[zones[inside]].tolist()):
+            located[point].add(zone)
+        return located
+
+
+class GeofenceTracker:
+    """
+    Tracks the zones each object is inside of, along one stream of position updates, and
+    turns the updates into enter and exit events.
+    """
+
+    def __init__(self, index: GeofenceIndex):
+        self.index = index
+        self.inside = {}
+
+    def process(self, updates: list) -> list:
+        """
+        Processes a micro-batch of position updates, in order.
+
+        Parameters
+        ----------
+        updates : list
+            A list of (object_id, lon, lat, ts) tuples.
+
+        Returns
+        ----------
+            A list of events {"object_id", "geometry_id", "event", "ts"}, where event is
+            'enter' or 'exit'.
+        """
+        if not updates:
+            return []
+
+        x = np.fromiter((update[1] for update in updates), dtype=np.float64, count=len(updates))
+        y = np.fromiter((update[2] for update in updates), dtype=np.float64, count=len(updates))
+
+        events = []
+        for (object_id, _, _, ts), zones in zip(updates, self.index.locate(x, y)):
+            previous = self.inside.get(object_id, set())
+            if zones == previous:
+                continue
+
+            events.extend(
+                {"object_id": object_id, "geometry_id": zone, "event": "exit", "ts": ts}
+                for zone in sorted(previous - zones)
+            )
+            events.extend(
+                {"object_id": object_id, "geometry_id": zone, "event": "enter", "ts": ts}
+                for zone in sorted(zones - previous)
+            )
+            self.inside[object_id] = zones
+
+        return events
+
+
+def parse_update(update) -> tuple:
+    """
+    Validates a position update.
+
+    Parameters
+    ----------
+    update : dict
+        The update {"object_id", "lon", "lat", "ts"}, ts being optional.
+
+    Returns
+    ----------
+        A tuple (object_id, lon, lat, ts).
+
+    Raises
+    ----------
+        ValueError
+            If the object id is missing or the coordinates are not valid numbers.
+    """
+    if not isinstance(update, dict) or update.get("object_id") is None:
+        raise ValueError("Each update should be an object with object_id, lon, lat and ts")
+
+    object_id = update["object_id"]
+    if not isinstance(object_id, (str, int)) or isinstance(object_id, bool):
+        raise ValueError("Object_id should be a string or an integer")
+
+    try:
+        lon, lat = float(update["lon"]), float(update["lat"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Lon and lat should be numbers")
+
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError("Lon should be between -180 and 180 and lat between -90 and 90")
+
+    return object_id, lon, lat, update.get("ts")
+
+
+_INDEX_LOCK = threading.Lock()
+
+
+def get_index(app: Flask, storage: StorageBackend, description: str = None) -> GeofenceIndex:
+    """
+    Returns the geofence index of the zones with the given description, rebuilding it after
+    a write in this process or when it is older than GEOFENCE_INDEX_TTL seconds, which bounds
+    the delay of the writes made by other processes.
+
+    The indexes are shared by all the streams of the app, so a burst of connections does not
+    reload the zones from the storage. At most GEOFENCE_MAX_INDEXES descriptions are kept, the
+    least recently used ones being dropped first.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app.
+    storage : StorageBackend
+        The storage of the zones.
+    description : str, optional
+        Description of the zones. All the stored geometries are used if not provided.
+
+    Returns
+    ----------
+        The geofence index.
+    """
+    indexes = app.extensions.setdefault("geofence_indexes", OrderedDict())
+    ttl = app.config.get("GEOFENCE_INDEX_TTL", 30)
+
+    with _INDEX_LOCK:
+        index = indexes.get(description)
+        if (
+            index is None
+            or index.generation != storage.generation
+            or time.monotonic() - index.built_at > ttl
+        ):
+            generation = storage.generation
+            index = GeofenceIndex(*storage.geometries(description=description), generation=generation)
+            indexes[description] = index
+
+        # A descrição vem do cliente, então a quantidade de índices guardados é limitada
+        indexes.move_to_end(description)
+        while len(indexes) > app.config.get("GEOFENCE_MAX_INDEXES", 64):
+            indexes.popitem(last=False)
+        return index
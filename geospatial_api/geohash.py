@@ -0,0 +1,243 @@
+# inbuilt libraries
+import math
+
+# third-party libraries
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _grid_size(precision: int) -> tuple:
+    """
+    Returns the number of geohash cells along the longitude and the latitude.
+
+    Parameters
+    ----------
+    precision : int
+        The number of characters of the geohashes.
+
+    Returns
+    ----------
+        A tuple (columns, rows).
+    """
+    bits = 5 * precision
+    return 2 ** ((bits + 1) // 2), 2 ** (bits // 2)
+
+
+def _from_indexes(column: int, row: int, precision: int) -> str:
+    """
+    Builds the geohash of the cell in the given column and row of the grid.
+
+    The bits of the longitude and of the latitude are interleaved, starting with the
+    longitude, and every 5 bits are encoded as one base32 character.
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+
+    value = 0
+    for i in range(5 * precision):
+        if i % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((column >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((row >> lat_bits) & 1)
+
+    return "".join(
+        BASE32[(value >> (5 * (precision - 1 - i))) & 31]
+        for i in range(precision)
+    )
+
+
+def encode(lon: float, lat: float, precision: int) -> str:
+    """
+    Returns the geohash of a point.
+
+    Parameters
+    ----------
+    lon : float
+        The longitude of the point.
+    lat : float
+        The latitude of the point.
+    precision : int
+        The number of characters of the geohash.
+
+    Returns
+    ----------
+        The geohash, an empty string if the precision is 0.
+    """
+    columns, rows = _grid_size(precision)
+    column = min(max(int((lon + 180) / 360 * columns), 0), columns - 1)
+    row = min(max(int((lat + 90) / 180 * rows), 0), rows - 1)
+    return _from_indexes(column, row, precision)
+
+
+def decode_bounds(geohash: str) -> tuple:
+    """
+    Returns the bounds of a geohash cell.
+
+    Parameters
+    ----------
+    geohash : str
+        The geohash.
+
+    Returns
+    ----------
+        A tuple (minx, miny, maxx, maxy).
+    """
+    min_lon, max_lon, min_lat, max_lat = -180.0, 180.0, -90.0, 90.0
+
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                middle = (min_lon + max_lon) / 2
+                min_lon, max_lon = (middle, max_lon) if bit else (min_lon, middle)
+            else:
+                middle = (min_lat + max_lat) / 2
+                min_lat, max_lat = (middle, max_lat) if bit else (min_lat, middle)
+            even = not even
+
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def covering_cell(bounds: tuple, precision: int) -> str:
+    """
+    Returns the smallest geohash cell, with at most the given precision, that contains a
+    bounding box.
+
+    It is the common prefix of the geohashes of the south-west and north-east corners, so
+    large boxes, or boxes crossing the border of a cell, get shorter geohashes.
+
+    Parameters
+    ----------
+    bounds : tuple
+        The bounding box (minx, miny, maxx, maxy).
+    precision : int
+        The maximum number of characters of the geohash.
+
+    Returns
+    ----------
+        The geohash of the cell, an empty string for the whole world.
+    """
+    minx, miny, maxx, maxy = bounds
+    south_west = encode(minx, miny, precision)
+    north_east = encode(maxx, maxy, precision)
+
+    length = 0
+    while length < precision and south_west[length] == north_east[length]:
+        length += 1
+    return south_west[:length]
+
+
+def intersecting_cells(bounds: tuple, precision: int, limit: int = None) -> list:
+    """
+    Returns the geohash cells with the given precision that intersect a bounding box,
+    including the cells that only touch its border.
+
+    Parameters
+    ----------
+    bounds : tuple
+        The bounding box (minx, miny, maxx, maxy).
+    precision : int
+        The number of characters of the geohashes.
+    limit : int, optional
+        The maximum number of cells. None is returned if the box has more cells.
+
+    Returns
+    ----------
+        A list of geohashes, or None if the limit is exceeded.
+    """
+    minx, miny, maxx, maxy = bounds
+    columns, rows = _grid_size(precision)
+    width, height = 360 / columns, 180 / rows
+
+    # As células são fechadas: a célula anterior também é incluída quando a borda da caixa
+    # coincide com a borda da célula
+    first_column = min(max(math.ceil((minx + 180) / width) - 1, 0), columns - 1)
+    last_column = min(max(int((maxx + 180) / width), 0), columns - 1)
+    first_row = min(max(math.ceil((miny + 90) / height) - 1, 0), rows - 1)
+    last_row = min(max(int((maxy + 90) / height), 0), rows - 1)
+
+    count = (last_column - first_column + 1) * (last_row - first_row + 1)
+    if limit is not None and count > limit:
+        return None
+
+    return [
+        _from_indexes(column, row, precision)
+        for column in range(first_column, last_column + 1)
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def covering_cells(geometry: BaseGeometry, min_precision: int, max_precision: int, max_cells: int) -> list:
+    """
+    Returns a set of geohash cells that covers a geometry.
+
+    The cells have the highest precision, between min_precision and max_precision, for which
+    the bounding box of the geometry has at most max_cells cells, and only the cells that
+    intersect the geometry itself are kept. Small geometries get a few fine cells, while large
+    ones get coarser cells.
+
+    Parameters
+    ----------
+    geometry : BaseGeometry
+        The geometry.
+    min_precision : int
+        The minimum number of characters of the geohashes.
+    max_precision : int
+        The maximum number of characters of the geohashes.
+    max_cells : int
+        The maximum number of cells of the bounding box.
+
+    Returns
+    ----------
+        A list of geohashes, all with the same precision.
+    """
+    cells = None
+    precision = max_precision
+    while cells is None:
+        limit = max_cells if precision > min_precision else None
+        cells = intersecting_cells(geometry.bounds, precision, limit=limit)
+        precision -= 1
+
+    boxes = shapely.box(*zip(*[decode_bounds(cell) for cell in cells]))
+    return [cell for cell, touched in zip(cells, shapely.intersects(boxes, geometry)) if touched]
+
+
+def query_cells(bounds: tuple, min_precision: int, max_precision: int, max_cells: int = None) -> list:
+    """
+    Returns the geohash cells, at every precision between min_precision and max_precision,
+    that intersect a bounding box.
+
+    A geometry stored with covering_cells can only intersect the box if one of its cells is
+    in the returned list.
+
+    Parameters
+    ----------
+    bounds : tuple
+        The bounding box (minx, miny, maxx, maxy).
+    min_precision : int
+        The minimum number of characters of the geohashes.
+    max_precision : int
+        The maximum number of characters of the geohashes.
+    max_cells : int, optional
+        The maximum number of cells. None is returned if the box has more cells.
+
+    Returns
+    ----------
+        A list of geohashes, or None if the limit is exceeded.
+    """
+    finest = intersecting_cells(bounds, max_precision, limit=max_cells)
+    if finest is None:
+        return None
+
+    # As células de menor precisão que tocam a caixa são os prefixos das células mais finas
+    cells = {cell[:length] for cell in finest for length in range(min_precision, max_precision + 1)}
+    if max_cells is not None and len(cells) > max_cells:
+        return None
+    return sorted(cells)
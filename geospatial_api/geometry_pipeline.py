@@ -0,0 +1,95 @@
+# inbuilt libraries
+from typing import Callable
+
+# third-party libraries
+import shapely
+from shapely.errors import ShapelyError
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+from shapely.validation import explain_validity
+
+
+def parse_geometry(geom: dict) -> BaseGeometry:
+    """
+        Parses a GeoJSON geometry, e.g. the geometry of a spatial filter.
+
+    Args
+    ----
+        geom: dict,
+            Geometry in GeoJSON format.
+
+    Returns
+    -------
+        BaseGeometry
+            The Shapely geometry.
+
+    Raises
+    ------
+        ValueError
+            If the geometry is not a valid GeoJSON object or is empty.
+    """
+    if not isinstance(geom, dict):
+        raise ValueError("Geom should be a GeoJSON object")
+
+    try:
+        geometry = shape(geom)
+    except (AttributeError, KeyError, TypeError, ValueError, ShapelyError) as e:
+        raise ValueError(f"Geom should be a GeoJSON object: {str(e)}")
+
+    if geometry.is_empty:
+        raise ValueError("Geom cannot be empty")
+
+    return geometry
+
+
+def prepare_geometry(geom: dict, repair: bool = True, max_vertices: int = None,
+                     project: Callable = None) -> BaseGeometry:
+    """
+        Validates a GeoJSON geometry before it is written to the database.
+
+        The geometry is parsed, rejected if it is empty or has more vertices than allowed and,
+        if it is not valid (e.g. a self-intersecting polygon), repaired with make_valid or
+        rejected when repair is disabled.
+
+    Args
+    ----
+        geom: dict,
+            Geometry in GeoJSON format.
+        repair: bool, default value is True,
+            Whether invalid geometries should be repaired instead of rejected.
+        max_vertices: int, optional
+            The maximum number of vertices accepted. No limit is applied if not provided.
+        project: Callable, optional
+            Function that reprojects the parsed geometry to EPSG:4326, when it was sent in
+            another coordinate reference system. It runs before the validation.
+
+    Returns
+    -------
+        BaseGeometry
+            The valid Shapely geometry.
+
+    Raises
+    ------
+        ValueError
+            If the geometry is not a valid GeoJSON object, is empty, is oversized or is
+            invalid and repair is disabled.
+
+    Example
+    -------
+        geometry = prepare_geometry({"type": "Point", "coordinates": [-73.93, 40.73]})
+    """
+    geometry = parse_geometry(geom)
+
+    vertices = shapely.get_num_coordinates(geometry)
+    if max_vertices and vertices > max_vertices:
+        raise ValueError(f"Geom has {vertices} vertices, the maximum allowed is {max_vertices}")
+
+    if project is not None:
+        geometry = project(geometry)
+
+    if not geometry.is_valid:
+        if not repair:
+            raise ValueError(f"Invalid geometry: {explain_validity(geometry)}")
+        geometry = shapely.make_valid(geometry)
+
+    return geometry
@@ -0,0 +1,327 @@
+# inbuilt libraries
+import hashlib
+import json
+import threading
+from typing import Optional
+
+# third-party libraries
+import shapely
+from flask import Flask, current_app
+from shapely.geometry.base import BaseGeometry
+
+# custom libraries
+from geospatial_api.geometry_pipeline import parse_geometry
+from geospatial_api.storage.base import PREDICATES, StorageBackend, check_predicate
+
+
+def query_key(description: str = None, geometry: BaseGeometry = None, predicate: str = "contains") -> str:
+    """
+    Returns the key of the stored result of a query. Equivalent geometries (e.g. the same
+    polygon starting at another vertex) have the same key, and the predicate is ignored when
+    there is no spatial filter.
+
+    Parameters
+    ----------
+    description : str, optional
+        Description of the geometries.
+    geometry : BaseGeometry, optional
+        Geometry matched with the predicate.
+    predicate : str, default value is 'contains',
+        The spatial predicate, 'contains' or 'intersects'.
+
+    Returns
+    ----------
+        The hexadecimal SHA-1 of the normalized filters.
+    """
+    wkb = None if geometry is None else shapely.to_wkb(shapely.normalize(geometry), hex=True)
+    filters = [description or None, wkb, predicate if geometry is not None else None]
+    return hashlib.sha1(json.dumps(filters).encode()).hexdigest()
+
+
+class HotQuery:
+    """
+    A query of GET /geometry declared in HOT_QUERIES, whose serialized result is stored and
+    served without running the query.
+    """
+
+    def __init__(self, description: str = None, geometry: BaseGeometry = None, predicate: str = "contains"):
+        if not description and geometry is None:
+            raise ValueError("A hot query should have a description and/or a geom or bbox")
+        check_predicate(predicate)
+
+        self.description = description or None
+        self.geometry = geometry
+        self.predicate = predicate
+        self.bounds = None if geometry is None else geometry.bounds
+        self.key = query_key(self.description, geometry, predicate)
+
+    @property
+    def arguments(self) -> dict:
+        """
+        The keyword arguments of StorageBackend.find of the query.
+        """
+        return {"description": self.description, "geometry": self.geometry, "predicate": self.predicate}
+
+    def affected_by(self, description: str, bounds: Optional[tuple]) -> bool:
+        """
+        Checks whether a written geometry may change the result of the query. The test is
+        conservative: the envelopes of the written geometry and of the filter are compared.
+
+        Parameters
+        ----------
+        description : str
+            Description of the written geometry.
+        bounds : tuple, optional
+            The (minx, miny, maxx, maxy) envelope of the written geometry, None if unknown.
+
+        Returns
+        ----------
+            False if the result of the query is certainly unchanged, True otherwise.
+        """
+        if self.description is not None and description != self.description:
+            return False
+        if self.geometry is None or bounds is None:
+            return True
+
+        minx, miny, maxx, maxy = self.bounds
+        return bounds[0] <= maxx and bounds[2] >= minx and bounds[1] <= maxy and bounds[3] >= miny
+
+    def as_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "description": self.description,
+            "bbox": list(self.bounds) if self.bounds else None,
+            "predicate": self.predicate if self.geometry is not None else None
+        }
+
+
+def parse_hot_queries(definitions: list) -> list:
+    """
+    Parses the hot queries of the HOT_QUERIES setting.
+
+    Parameters
+    ----------
+    definitions : list
+        A list of dictionaries with an optional 'description', an optional 'geom' (a GeoJSON
+        geometry) or 'bbox' ([minx, miny, maxx, maxy]) and an optional 'predicate', e.g.
+        [{"description": "school"}, {"description": "park", "bbox": [-47, -24, -46, -23],
+        "predicate": "intersects"}].
+
+    Returns
+    ----------
+        A list of HotQuery.
+
+    Raises
+    ----------
+        ValueError
+            If a definition is invalid.
+    """
+    queries = []
+    for definition in definitions:
+        geometry = None
+        if definition.get("geom") is not None:
+            geometry = parse_geometry(definition["geom"])
+        elif definition.get("bbox") is not None:
+            bbox = definition["bbox"]
+            if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+                raise ValueError("The bbox of a hot query should be [minx, miny, maxx, maxy]")
+            geometry = shapely.box(*bbox)
+
+        queries.append(HotQuery(definition.get("description"), geometry, definition.get("predicate", "contains")))
+    return queries
+
+
+class HotQueryCache:
+    """
+    Serves the results of the hot queries (HOT_QUERIES) from a result store of the storage
+    backend, where each result is kept as the serialized body of its response.
+
+    A result is computed on its first request. The write paths of the storage remove, in the
+    same transaction as each write, the stored results of the hot queries whose description and
+    envelope match a written geometry, and these results are computed again, outside the write,
+    on their next request. The other hot queries are left untouched.
+    """
+
+    def __init__(self, app: Flask, storage: StorageBackend):
+        self.config = app.config
+        self.json = app.json
+        self.storage = storage
+        self._lock = threading.Lock()
+        self.queries = {}
+        self.descriptions = set()
+
+    def reset(self) -> None:
+        """
+        Parses HOT_QUERIES again and clears the counters, e.g. after the setting changed.
+        """
+        queries = parse_hot_queries(self.config.get("HOT_QUERIES", []))
+
+        with self._lock:
+            self.queries = {query.key: query for query in queries}
+            self.descriptions = {query.description for query in queries}
+            self.counters = {"hits": 0, "misses": 0, "refreshes": 0, "invalidations": 0}
+
+        # As escritas só calculam as geometrias alteradas quando há consultas declaradas
+        if self.queries and self.on_write not in self.storage.listeners:
+            self.storage.listeners.append(self.on_write)
+        elif not self.queries and self.on_write in self.storage.listeners:
+            self.storage.listeners.remove(self.on_write)
+
+    def lookup(self, description: str = None, geometry: BaseGeometry = None,
+               predicate: str = "contains") -> Optional[HotQuery]:
+        """
+        Returns the hot query with the given filters.
+
+        Parameters
+        ----------
+        description : str, optional
+            Description of the geometries.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+
+        Returns
+        ----------
+            The hot query, or None if the filters are not a hot query.
+        """
+        # A maioria das requisições é descartada sem calcular a chave
+        if (description or None) not in self.descriptions or predicate not in PREDICATES:
+            return None
+        return self.queries.get(query_key(description, geometry, predicate))
+
+    def result(self, query: HotQuery) -> tuple:
+        """
+        Returns the stored result of a hot query, computing it if it is not stored yet.
+
+        Parameters
+        ----------
+        query : HotQuery
+            The hot query.
+
+        Returns
+        ----------
+            A tuple (body, count) with the serialized list of geometries and its length.
+        """
+        stored = self.storage.stored_result(query.key)
+        with self._lock:
+            self.counters["hits" if stored is not None else "misses"] += 1
+        if stored is not None:
+            return stored
+        return self._refresh(query)
+
+    def refresh(self) -> int:
+        """
+        Recomputes the results of all the hot queries, e.g. after the geometries were changed
+        outside the API.
+
+        Returns
+        ----------
+            The number of refreshed hot queries.
+        """
+        for key in sorted(self.queries):
+            self._refresh(self.queries[key])
+        return len(self.queries)
+
+    def on_write(self, changes: Optional[list]) -> None:
+        """
+        Listener of the writes of the storage: removes, within the write, the stored results of
+        the hot queries affected by the written geometries, which are computed again on their
+        next request. The write does not run nor serialize the hot queries, so its duration
+        does not depend on the size of their results.
+
+        Parameters
+        ----------
+        changes : list, optional
+            The (description, bounds) of the written geometries, before and after the write.
+            None when all the geometries were replaced, in which case all the stored results
+            are removed.
+        """
+        if changes is None:
+            self.storage.remove_results()
+            return
+
+        keys = [
+            key for key, query in self.queries.items()
+            if any(query.affected_by(description, bounds) for description, bounds in changes)
+        ]
+        if keys:
+            with self._lock:
+                self.counters["invalidations"] += len(keys)
+            self.storage.remove_results(keys, commit=False)
+
+    def metrics(self) -> dict:
+        """
+        Returns the hot queries and the counters of the served results.
+
+        Returns
+        ----------
+            A dictionary with the hot queries and the hits, misses, refreshes and invalidations.
+        """
+        with self._lock:
+            return {
+                "queries": [query.as_dict() for query in self.queries.values()],
+                **self.counters
+            }
+
+    def _refresh(self, query: HotQuery) -> tuple:
+        """
+        Runs a hot query and replaces its stored result.
+        """
+        with self._lock:
+            self.counters["refreshes"] += 1
+        return self.storage.save_result(query.key, lambda: self._compute(query))
+
+    def _compute(self, query: HotQuery) -> tuple:
+        """
+        Runs a hot query and serializes its result as the body of the GET /geometry response.
+        """
+        geometries = self.storage.find(**query.arguments)
+        return self.json.dumps(geometries).encode(), len(geometries)
+
+
+def init_hot_queries(app: Flask) -> HotQueryCache:
+    """
+    Creates the cache of the hot queries declared in HOT_QUERIES.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app, whose storage was already initialized.
+
+    Returns
+    ----------
+        The cache, also available in app.extensions["hot_queries"].
+
+    Raises
+    ----------
+        ValueError
+            If a hot query is invalid.
+    """
+    cache = HotQueryCache(app, app.extensions["geometry_storage"])
+    app.extensions["hot_queries"] = cache
+    cache.reset()
+    return cache
+
+
+def hot_result(description: str = None, geometry: BaseGeometry = None, predicate: str = "contains"):
+    """
+    Returns the stored result of the hot query of the current app with the given filters.
+
+    Parameters
+    ----------
+    description : str, optional
+        Description of the geometries.
+    geometry : BaseGeometry, optional
+        Geometry matched with the predicate.
+    predicate : str, default value is 'contains',
+        The spatial predicate, 'contains' or 'intersects'.
+
+    Returns
+    ----------
+        A tuple (body, count), see HotQueryCache.result, or None if the filters are not a
+        hot query.
+    """
+    cache = current_app.extensions["hot_queries"]
+    query = cache.lookup(description, geometry, predicate)
+    return None if query is None else cache.result(query)
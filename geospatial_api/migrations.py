@@ -0,0 +1,293 @@
+# inbuilt libraries
+from typing import Callable
+
+# third-party libraries
+import shapely
+from sqlalchemy import MetaData, bindparam, text
+from sqlalchemy.engine import Connection, Engine
+
+# custom libraries
+from geospatial_api import geohash
+
+
+# Identificador do advisory lock que impede migrações simultâneas de vários workers
+MIGRATION_LOCK_ID = 7_640_131
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str) -> Callable:
+    """
+    Registers a schema migration.
+
+    Parameters
+    ----------
+    version : int
+        The version of the schema after the migration. Versions must be registered in order.
+    description : str
+        A short description of the migration.
+
+    Returns
+    ----------
+        The decorator that registers the migration function, which receives the connection
+        and the app configuration.
+    """
+    def decorator(function: Callable) -> Callable:
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} must be registered after migration {MIGRATIONS[-1][0]}")
+        MIGRATIONS.append((version, description, function))
+        return function
+    return decorator
+
+
+@migration(1, "Create the geometries table")
+def _create_geometries(connection: Connection, config: dict) -> None:
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS geometries (
+            id SERIAL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            geom geometry(GEOMETRY, 4326) NOT NULL
+        )
+    """))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_geometries_geom ON geometries USING gist (geom)"))
+
+
+@migration(2, "Add the derived columns of the geometries")
+def _add_derived_columns(connection: Connection, config: dict) -> None:
+    connection.execute(text("""
+        ALTER TABLE geometries
+            ADD COLUMN IF NOT EXISTS bbox geometry(GEOMETRY, 4326),
+            ADD COLUMN IF NOT EXISTS area DOUBLE PRECISION,
+            ADD COLUMN IF NOT EXISTS centroid geometry(POINT, 4326),
+            ADD COLUMN IF NOT EXISTS num_points INTEGER
+    """))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_geometries_centroid ON geometries USING gist (centroid)"))
+
+    # Aplica às geometrias existentes o mesmo reparo feito na escrita
+    connection.execute(text("UPDATE geometries SET geom = ST_MakeValid(geom) WHERE NOT ST_IsValid(geom)"))
+    connection.execute(text("""
+        UPDATE geometries SET
+            bbox = ST_Envelope(geom),
+            area = ST_Area(geom::geography),
+            centroid = ST_Centroid(geom),
+            num_points = ST_NPoints(geom)
+        WHERE centroid IS NULL
+    """))
+
+
+@migration(3, "Create the subdivided geometry pieces")
+def _create_geometry_pieces(connection: Connection, config: dict) -> None:
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS geometry_pieces (
+            id SERIAL PRIMARY KEY,
+            geometry_id INTEGER NOT NULL,
+            geom geometry(GEOMETRY, 4326) NOT NULL
+        )
+    """))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_geometry_pieces_geometry_id ON geometry_pieces (geometry_id)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_geometry_pieces_geom ON geometry_pieces USING gist (geom)"
+    ))
+    connection.execute(
+        text("""
+            INSERT INTO geometry_pieces (geometry_id, geom)
+            SELECT id, ST_Subdivide(geom, :max_vertices) FROM geometries
+            WHERE NOT EXISTS (SELECT 1 FROM geometry_pieces WHERE geometry_id = geometries.id)
+        """),
+        {"max_vertices": config.get("GEOMETRY_SUBDIVIDE_MAX_VERTICES", 256)}
+    )
+
+
+@migration(4, "Add the spatial partition key of the geometries")
+def _add_partition_key(connection: Connection, config: dict) -> None:
+    for table in ("geometries", "geometry_pieces"):
+        connection.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS partition_key VARCHAR(12) NOT NULL DEFAULT ''"
+        ))
+
+    # Prefixo comum dos geohashes dos cantos do envelope, equivalente a partitioning.partition_key
+    connection.execute(text("""
+        CREATE OR REPLACE FUNCTION geometry_partition_key(g geometry, precision integer) RETURNS text AS $$
+            SELECT substr(sw, 1, (
+                SELECT max(n) FROM generate_series(0, precision) AS n WHERE substr(sw, 1, n) = substr(ne, 1, n)
+            ))
+            FROM (
+                SELECT
+                    ST_GeoHash(ST_SetSRID(ST_MakePoint(ST_XMin(g), ST_YMin(g)), 4326), precision) AS sw,
+                    ST_GeoHash(ST_SetSRID(ST_MakePoint(ST_XMax(g), ST_YMax(g)), 4326), precision) AS ne
+            ) AS corners
+        $$ LANGUAGE sql IMMUTABLE STRICT
+    """))
+    connection.execute(
+        text("UPDATE geometries SET partition_key = geometry_partition_key(geom, :precision)"),
+        {"precision": config.get("GEOMETRY_PARTITION_PRECISION", 3)}
+    )
+    connection.execute(text("""
+        UPDATE geometry_pieces SET partition_key = geometries.partition_key
+        FROM geometries WHERE geometries.id = geometry_pieces.geometry_id
+    """))
+
+
+@migration(5, "Create the covering cells of the geometries")
+def _create_geometry_cells(connection: Connection, config: dict) -> None:
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS geometry_cells (
+            cell VARCHAR(12) NOT NULL,
+            geometry_id INTEGER NOT NULL,
+            PRIMARY KEY (cell, geometry_id)
+        )
+    """))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_geometry_cells_geometry_id ON geometry_cells (geometry_id)"
+    ))
+
+    # As células são calculadas em Python, com a mesma função usada na escrita
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            text("SELECT id, ST_AsBinary(geom) FROM geometries WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": config.get("BULK_CHUNK_SIZE", 1000)}
+        ).all()
+        if not rows:
+            return
+
+        cells = [
+            {"cell": cell, "geometry_id": id}
+            for id, wkb in rows
+            for cell in geohash.covering_cells(
+                shapely.from_wkb(bytes(wkb)),
+                min_precision=config.get("GEOMETRY_CELL_MIN_PRECISION", 1),
+                max_precision=config.get("GEOMETRY_CELL_MAX_PRECISION", 7),
+                max_cells=config.get("GEOMETRY_CELL_MAX_CELLS", 32)
+            )
+        ]
+        if cells:
+            connection.execute(
+                text("INSERT INTO geometry_cells (cell, geometry_id) VALUES (:cell, :geometry_id) ON CONFLICT DO NOTHING"),
+                cells
+            )
+        last_id = rows[-1][0]
+
+
+@migration(6, "Create the results of the hot queries")
+def _create_hot_query_results(connection: Connection, config: dict) -> None:
+    # Os resultados são calculados pelo app na primeira requisição de cada consulta
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS hot_query_results (
+            key VARCHAR(40) PRIMARY KEY,
+            body BYTEA NOT NULL,
+            count INTEGER NOT NULL,
+            refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def latest_version() -> int:
+    """
+    Returns the version of the schema after all the registered migrations.
+
+    Returns
+    ----------
+        The latest schema version.
+    """
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def missing_columns(connection: Connection, metadata: MetaData) -> list:
+    """
+    Returns the columns of the models that the database does not have, e.g. the derived
+    columns of the geometries on a table created before them and not migrated yet.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database.
+    metadata : MetaData
+        The metadata of the models.
+
+    Returns
+    ----------
+        A sorted list of 'table.column' names, empty if the schema has every column.
+    """
+    rows = connection.execute(
+        text("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name IN :tables
+        """).bindparams(bindparam("tables", expanding=True)),
+        {"tables": list(metadata.tables)}
+    )
+    existing = {f"{table}.{column}" for table, column in rows}
+    return sorted(
+        f"{table.name}.{column.name}"
+        for table in metadata.tables.values()
+        for column in table.columns
+        if f"{table.name}.{column.name}" not in existing
+    )
+
+
+def current_version(connection: Connection) -> int:
+    """
+    Returns the version of the database schema.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database.
+
+    Returns
+    ----------
+        The version of the last applied migration, 0 if no migration was applied.
+    """
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """))
+    return connection.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations")).scalar_one()
+
+
+def upgrade(engine: Engine, config: dict, target: int = None) -> list:
+    """
+    Applies the pending migrations, each one in its own transaction.
+
+    An advisory lock ensures that only one process migrates the database at a time, so the
+    command can run safely when several workers start together.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    config : dict
+        The app configuration, used by some migrations.
+    target : int, optional
+        The version to migrate to. All the pending migrations are applied if not provided.
+
+    Returns
+    ----------
+        A list with the (version, description) of the applied migrations.
+    """
+    target = latest_version() if target is None else target
+    applied = []
+
+    for version, description, function in MIGRATIONS:
+        if version > target:
+            break
+
+        with engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            if current_version(connection) >= version:
+                continue
+
+            function(connection, config)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description}
+            )
+            applied.append((version, description))
+
+    return applied
@@ -1,2 +1,5 @@
 from geospatial_api.models.db import db
-from geospatial_api.models.geometry import GeometryModel
\ No newline at end of file
+from geospatial_api.models.geometry import GeometryModel
+from geospatial_api.models.geometry_cell import GeometryCellModel
+from geospatial_api.models.geometry_piece import GeometryPieceModel
+from geospatial_api.models.hot_query_result import HotQueryResultModel
\ No newline at end of file
@@ -1,9 +1,13 @@
 # third-party libraries
-from geoalchemy2 import Geometry
-from geoalchemy2.shape import to_shape 
+import shapely
+from geoalchemy2 import Geography, Geometry
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry.base import BaseGeometry
+from sqlalchemy import cast, func, literal
 
 # custom libraries
 from geospatial_api.models.db import db
+from geospatial_api.partitioning import partition_key
 
 
 class GeometryModel(db.Model):
@@ -14,6 +18,46 @@ class GeometryModel(db.Model):
     description = db.Column(db.String(255), nullable=False)
     geom = db.Column(Geometry(geometry_type='GEOMETRY', srid=4326), nullable=False)
 
+    # Colunas derivadas, calculadas na escrita para evitar recalcular a cada leitura
+    bbox = db.Column(Geometry(geometry_type='GEOMETRY', srid=4326, spatial_index=False))
+    area = db.Column(db.Float)
+    centroid = db.Column(Geometry(geometry_type='POINT', srid=4326))
+    num_points = db.Column(db.Integer)
+
+    # Chave espacial (prefixo geohash) usada no particionamento opcional da tabela
+    partition_key = db.Column(db.String(12), nullable=False, server_default="")
+
+    @staticmethod
+    def geometry_values(geometry: BaseGeometry, partition_precision: int = 3) -> dict:
+        """
+        Returns the values of the geometry column and of its derived columns.
+
+        The bounding box, centroid, vertex count and partition key are computed from the
+        Shapely geometry, while the area (in square meters) is computed by PostGIS on the
+        geography type.
+
+        Parameters
+        ----------
+        geometry : BaseGeometry
+            A valid geometry, usually returned by prepare_geometry.
+        partition_precision : int, default value is 3,
+            The maximum number of characters of the partition key.
+
+        Returns
+        -------
+            A dictionary with the column names as keys, suitable for the model constructor
+            or for an UPDATE statement.
+        """
+        geom = from_shape(geometry, srid=4326)
+        return {
+            "geom": geom,
+            "bbox": from_shape(shapely.envelope(geometry), srid=4326),
+            "area": func.ST_Area(cast(literal(geom, Geometry(srid=4326)), Geography(srid=4326))),
+            "centroid": from_shape(geometry.centroid, srid=4326),
+            "num_points": shapely.get_num_coordinates(geometry),
+            "partition_key": partition_key(geometry, partition_precision)
+        }
+
     def as_dict(self) -> dict:
         """
         Returns a dictionary representation of the Geometry object.
@@ -26,4 +70,4 @@ class GeometryModel(db.Model):
             "ID": self.id,
             "DESCRIPTION": self.description,
             "GEOMETRY": to_shape(self.geom).wkt
-        }
\ No newline at end of file
+        }
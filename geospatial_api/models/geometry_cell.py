@@ -0,0 +1,121 @@
+# third-party libraries
+from geoalchemy2.shape import to_shape
+from sqlalchemy import delete, insert, select
+
+# custom libraries
+from geospatial_api import geohash
+from geospatial_api.models.db import db
+from geospatial_api.models.geometry import GeometryModel
+
+
+class GeometryCellModel(db.Model):
+
+    __tablename__ = 'geometry_cells'
+
+    # A chave primária (cell, geometry_id) é o índice B-tree usado nas consultas por célula
+    cell = db.Column(db.String(12), primary_key=True)
+    geometry_id = db.Column(db.Integer, primary_key=True, index=True)
+
+    @classmethod
+    def refresh(cls, cells: dict) -> None:
+        """
+        Replaces the covering cells of the given geometries.
+
+        It must be called in the same transaction as the write that changed the geometries.
+
+        Parameters
+        ----------
+        cells : dict
+            The covering cells (see geohash.covering_cells) of each geometry, by geometry id.
+        """
+        if not cells:
+            return
+
+        cls.remove(list(cells))
+
+        rows = [
+            {"geometry_id": id, "cell": cell}
+            for id, geometry_cells in cells.items()
+            for cell in geometry_cells
+        ]
+        if rows:
+            db.session.execute(insert(cls), rows)
+
+    @classmethod
+    def rebuild(cls, min_precision: int = 1, max_precision: int = 7, max_cells: int = 32,
+                chunk_size: int = 1000) -> int:
+        """
+        Rebuilds the cells of every stored geometry, e.g. after the precisions were changed.
+
+        Parameters
+        ----------
+        min_precision : int, default value is 1,
+            The minimum number of characters of the cells.
+        max_precision : int, default value is 7,
+            The maximum number of characters of the cells.
+        max_cells : int, default value is 32,
+            The maximum number of cells of the bounding box of each geometry.
+        chunk_size : int, default value is 1000,
+            The number of geometries rebuilt per transaction.
+
+        Returns
+        -------
+            The number of geometries whose cells were rebuilt.
+        """
+        total = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(GeometryModel.id, GeometryModel.geom)
+                .where(GeometryModel.id > last_id)
+                .order_by(GeometryModel.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return total
+
+            cls.refresh({
+                id: geohash.covering_cells(to_shape(geom), min_precision, max_precision, max_cells)
+                for id, geom in rows
+            })
+            db.session.commit()
+
+            total += len(rows)
+            last_id = rows[-1][0]
+
+    @classmethod
+    def remove(cls, ids: list) -> None:
+        """
+        Removes the cells of the given geometries.
+
+        Parameters
+        ----------
+        ids : list
+            The ids of the geometries whose cells must be removed.
+        """
+        if not ids:
+            return
+
+        db.session.execute(
+            delete(cls).where(cls.geometry_id.in_(ids)).execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def candidates(cls, cells: list):
+        """
+        Returns the ids of the geometries that have one of the given cells.
+
+        It is a coarse prefilter: every geometry that intersects an area has one of the cells
+        returned by geohash.query_cells for that area, but the exact spatial test is still
+        required.
+
+        Parameters
+        ----------
+        cells : list
+            The cells of the queried area.
+
+        Returns
+        -------
+            A SELECT of geometry ids.
+        """
+        return select(cls.geometry_id).where(cls.cell.in_(cells))
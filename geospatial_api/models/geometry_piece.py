@@ -0,0 +1,167 @@
+# third-party libraries
+from geoalchemy2 import Geometry
+from sqlalchemy import delete, func, insert, or_, select
+
+# custom libraries
+from geospatial_api.models.db import db
+from geospatial_api.models.geometry import GeometryModel
+
+
+class GeometryPieceModel(db.Model):
+
+    __tablename__ = 'geometry_pieces'
+
+    id = db.Column(db.Integer, primary_key=True)
+    geometry_id = db.Column(db.Integer, nullable=False, index=True)
+    geom = db.Column(Geometry(geometry_type='GEOMETRY', srid=4326), nullable=False)
+
+    # Mesma chave espacial da geometria, para que os pedaços sigam o seu particionamento
+    partition_key = db.Column(db.String(12), nullable=False, server_default="")
+
+    @classmethod
+    def refresh(cls, ids: list, max_vertices: int = 256) -> None:
+        """
+        Rebuilds the pieces of the given geometries with ST_Subdivide.
+
+        It must be called in the same transaction as the write that changed the geometries,
+        after the session was flushed.
+
+        Parameters
+        ----------
+        ids : list
+            The ids of the geometries whose pieces must be rebuilt.
+        max_vertices : int, default value is 256,
+            The maximum number of vertices of each piece.
+        """
+        if not ids:
+            return
+
+        cls.remove(ids)
+
+        pieces = select(
+            GeometryModel.id,
+            GeometryModel.partition_key,
+            func.ST_Subdivide(GeometryModel.geom, max_vertices)
+        ).where(GeometryModel.id.in_(ids))
+
+        db.session.execute(
+            insert(cls).from_select(["geometry_id", "partition_key", "geom"], pieces)
+        )
+
+    @classmethod
+    def rebuild(cls, max_vertices: int = 256, chunk_size: int = 1000) -> int:
+        """
+        Rebuilds the pieces of every stored geometry, e.g. for geometries written before the
+        geometry_pieces table existed.
+
+        Parameters
+        ----------
+        max_vertices : int, default value is 256,
+            The maximum number of vertices of each piece.
+        chunk_size : int, default value is 1000,
+            The number of geometries rebuilt per transaction.
+
+        Returns
+        -------
+            The number of geometries whose pieces were rebuilt.
+        """
+        total = 0
+        last_id = 0
+        while True:
+            ids = db.session.execute(
+                select(GeometryModel.id)
+                .where(GeometryModel.id > last_id)
+                .order_by(GeometryModel.id)
+                .limit(chunk_size)
+            ).scalars().all()
+            if not ids:
+                return total
+
+            cls.refresh(ids, max_vertices=max_vertices)
+            db.session.commit()
+
+            total += len(ids)
+            last_id = ids[-1]
+
+    @classmethod
+    def remove(cls, ids: list) -> None:
+        """
+        Removes the pieces of the given geometries.
+
+        Parameters
+        ----------
+        ids : list
+            The ids of the geometries whose pieces must be removed.
+        """
+        if not ids:
+            return
+
+        db.session.execute(
+            delete(cls).where(cls.geometry_id.in_(ids)).execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def contains_condition(cls, geom, keys: list = None, candidates=None):
+        """
+        Returns a condition equivalent to ST_Contains(GeometryModel.geom, geom) evaluated on the pieces.
+
+        A geometry contains the input if one of its pieces contains it. Only the geometries with
+        a piece that intersects the input, but no piece that contains it (i.e. the input crosses
+        the border between pieces), fall back to the exact test on the whole geometry.
+
+        Parameters
+        ----------
+        geom : ColumnElement
+            The SQL expression of the input geometry.
+        keys : list, optional
+            The partition keys the pieces are restricted to, see partitioning.pruning_keys.
+        candidates : Select, optional
+            The ids of the geometries the pieces are restricted to, see GeometryCellModel.candidates.
+
+        Returns
+        -------
+            A SQLAlchemy condition on GeometryModel.id.
+        """
+        restrictions = cls._restrictions(keys, candidates)
+        contained = select(cls.geometry_id).where(func.ST_Contains(cls.geom, geom), *restrictions)
+        touched = select(cls.geometry_id).where(func.ST_Intersects(cls.geom, geom), *restrictions)
+
+        return or_(
+            GeometryModel.id.in_(contained),
+            GeometryModel.id.in_(touched) & func.ST_Contains(GeometryModel.geom, geom)
+        )
+
+    @classmethod
+    def intersects_condition(cls, geom, keys: list = None, candidates=None):
+        """
+        Returns a condition equivalent to ST_Intersects(GeometryModel.geom, geom) evaluated on the pieces.
+
+        Parameters
+        ----------
+        geom : ColumnElement
+            The SQL expression of the input geometry.
+        keys : list, optional
+            The partition keys the pieces are restricted to, see partitioning.pruning_keys.
+        candidates : Select, optional
+            The ids of the geometries the pieces are restricted to, see GeometryCellModel.candidates.
+
+        Returns
+        -------
+            A SQLAlchemy condition on GeometryModel.id.
+        """
+        return GeometryModel.id.in_(
+            select(cls.geometry_id).where(func.ST_Intersects(cls.geom, geom), *cls._restrictions(keys, candidates))
+        )
+
+    @classmethod
+    def _restrictions(cls, keys: list = None, candidates=None) -> list:
+        """
+        Returns the conditions that restrict the pieces to the given partition keys and
+        candidate geometries, if any.
+        """
+        conditions = []
+        if keys is not None:
+            conditions.append(cls.partition_key.in_(keys))
+        if candidates is not None:
+            conditions.append(cls.geometry_id.in_(candidates))
+        return conditions
@@ -0,0 +1,90 @@
+# inbuilt libraries
+from typing import Optional
+
+# third-party libraries
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+# custom libraries
+from geospatial_api.models.db import db
+
+
+# Classe dos advisory locks que serializam a atualização de cada resultado
+HOT_QUERY_LOCK_CLASS = 7_640_132
+
+
+class HotQueryResultModel(db.Model):
+
+    __tablename__ = 'hot_query_results'
+
+    # Chave da consulta (hot_queries.query_key) e corpo da resposta já serializado
+    key = db.Column(db.String(40), primary_key=True)
+    body = db.Column(db.LargeBinary, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    @classmethod
+    def fetch(cls, key: str) -> Optional[tuple]:
+        """
+        Retrieves a stored result.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+
+        Returns
+        -------
+            A tuple (body, count), or None if no result is stored with the key.
+        """
+        row = db.session.execute(select(cls.body, cls.count).where(cls.key == key)).first()
+        return None if row is None else (bytes(row[0]), row[1])
+
+    @classmethod
+    def lock(cls, key: str) -> None:
+        """
+        Takes the transaction-level advisory lock of a result, held until the transaction
+        ends. A save that waits for the lock computes its result after the write that held it
+        was committed.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+        """
+        db.session.execute(select(func.pg_advisory_xact_lock(HOT_QUERY_LOCK_CLASS, func.hashtext(key))))
+
+    @classmethod
+    def save(cls, key: str, body: bytes, count: int) -> None:
+        """
+        Inserts or replaces a stored result, in the current transaction.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+        body : bytes
+            The serialized result.
+        count : int
+            The number of geometries of the result.
+        """
+        statement = insert(cls).values(key=key, body=body, count=count)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[cls.key],
+            set_={"body": statement.excluded.body, "count": statement.excluded.count, "refreshed_at": func.now()}
+        ))
+
+    @classmethod
+    def remove(cls, keys: list = None) -> None:
+        """
+        Removes stored results, in the current transaction.
+
+        Parameters
+        ----------
+        keys : list, optional
+            The keys of the results, all the stored results if None.
+        """
+        statement = delete(cls)
+        if keys is not None:
+            statement = statement.where(cls.key.in_(keys))
+        db.session.execute(statement)
@@ -0,0 +1,289 @@
+# inbuilt libraries
+import re
+from typing import Optional
+
+# third-party libraries
+from shapely.geometry.base import BaseGeometry
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# custom libraries
+from geospatial_api import geohash
+from geospatial_api.migrations import MIGRATION_LOCK_ID
+
+
+# Tabelas particionadas pela chave espacial e seus índices, recriados na tabela particionada
+PARTITIONED_TABLES = {
+    "geometries": [
+        "CREATE INDEX idx_geometries_geom ON geometries USING gist (geom)",
+        "CREATE INDEX idx_geometries_centroid ON geometries USING gist (centroid)",
+    ],
+    "geometry_pieces": [
+        "CREATE INDEX ix_geometry_pieces_geometry_id ON geometry_pieces (geometry_id)",
+        "CREATE INDEX idx_geometry_pieces_geom ON geometry_pieces USING gist (geom)",
+    ],
+}
+
+_KEY_PATTERN = re.compile(f"^[{geohash.BASE32}]+$")
+
+
+def partition_key(geometry: BaseGeometry, precision: int) -> str:
+    """
+    Returns the spatial partition key of a geometry: the geohash of the smallest cell, with
+    at most the given precision, that contains its bounding box.
+
+    Parameters
+    ----------
+    geometry : BaseGeometry
+        The geometry.
+    precision : int
+        The maximum number of characters of the key.
+
+    Returns
+    ----------
+        The partition key, an empty string for geometries that do not fit in a cell.
+    """
+    return geohash.covering_cell(geometry.bounds, precision)
+
+
+def pruning_keys(bounds: tuple, precision: int, max_keys: int = 1024) -> Optional[list]:
+    """
+    Returns the partition keys of all the geometries that may intersect a bounding box.
+
+    A geometry is stored with the key of a cell that contains it, so it can only intersect
+    the box if that cell does: the keys are the cells that intersect the box, at the given
+    precision, and all their prefixes.
+
+    Parameters
+    ----------
+    bounds : tuple
+        The bounding box (minx, miny, maxx, maxy).
+    precision : int
+        The precision of the partition keys.
+    max_keys : int, default value is 1024,
+        The maximum number of cells. Larger boxes are not pruned.
+
+    Returns
+    ----------
+        A sorted list of partition keys, or None if the box is too large to be pruned.
+    """
+    cells = geohash.intersecting_cells(bounds, precision, limit=max_keys)
+    if cells is None:
+        return None
+    return sorted({cell[:length] for cell in cells for length in range(precision + 1)})
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """
+    Returns whether the geometries table is partitioned.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database.
+    """
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'geometries'::regclass)"
+    )).scalar_one()
+
+
+def enable(engine: Engine) -> bool:
+    """
+    Converts the geometries and geometry_pieces tables into tables partitioned by LIST on
+    partition_key, in a single transaction.
+
+    All the rows are copied into the DEFAULT partition, and the indexes are built after the
+    copy. Run rebalance afterwards to move the most populated keys to their own partitions.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+
+    Returns
+    ----------
+        True if the tables were converted, False if they were already partitioned.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        if is_partitioned(connection):
+            return False
+
+        for table, indexes in PARTITIONED_TABLES.items():
+            sequence = connection.execute(
+                text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}
+            ).scalar_one()
+
+            connection.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+            connection.execute(text(f"""
+                CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED)
+                PARTITION BY LIST (partition_key)
+            """))
+            # A sequência dos ids seria removida junto com a tabela antiga
+            connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+            connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+            columns = _columns(connection, f"{table}_unpartitioned")
+            connection.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_unpartitioned"))
+            connection.execute(text(f"DROP TABLE {table}_unpartitioned"))
+
+            # A chave primária de uma tabela particionada deve incluir a chave de particionamento
+            connection.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, partition_key)"))
+            for index in indexes:
+                connection.execute(text(index))
+
+    return True
+
+
+def rebalance(engine: Engine, split_rows: int, merge_rows: int) -> list:
+    """
+    Moves the keys of the DEFAULT partition with at least split_rows geometries to their own
+    partitions, and merges back into the DEFAULT partition the partitions with less than
+    merge_rows geometries.
+
+    Each key is moved in its own transaction, for both partitioned tables.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    split_rows : int
+        The number of geometries from which a key gets its own partition.
+    merge_rows : int
+        The number of geometries below which a partition is merged into the DEFAULT partition.
+
+    Returns
+    ----------
+        A list with the (action, key, rows) of each moved key, action being 'split' or 'merge'.
+
+    Raises
+    ----------
+        ValueError
+            If the tables are not partitioned.
+    """
+    with engine.begin() as connection:
+        if not is_partitioned(connection):
+            raise ValueError("The geometries table is not partitioned, run 'flask partitions enable' first")
+
+        crowded = connection.execute(
+            text("""
+                SELECT partition_key, count(*) FROM geometries_default
+                WHERE partition_key <> '' GROUP BY partition_key HAVING count(*) >= :rows
+            """),
+            {"rows": split_rows}
+        ).all()
+        sparse = [
+            (key, rows) for key, rows in _partitions(connection, limit=merge_rows)
+            if rows < merge_rows
+        ]
+
+    moved = []
+    for key, rows in crowded:
+        with engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            for table in PARTITIONED_TABLES:
+                _split(connection, table, key)
+        moved.append(("split", key, rows))
+
+    for key, rows in sparse:
+        with engine.begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            for table in PARTITIONED_TABLES:
+                _merge(connection, table, key)
+        moved.append(("merge", key, rows))
+
+    return moved
+
+
+def status(connection: Connection) -> list:
+    """
+    Returns the partitions of the geometries table with their estimated number of rows.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database.
+
+    Returns
+    ----------
+        A list with the (name, bound, estimated rows) of each partition.
+    """
+    return connection.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), greatest(c.reltuples, 0)::bigint
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'geometries'::regclass
+        ORDER BY c.relname
+    """)).all()
+
+
+def _partitions(connection: Connection, limit: int) -> list:
+    """
+    Returns the keys of the partitions of the geometries table, except the DEFAULT one, with
+    their number of rows, counted up to the given limit.
+    """
+    names = connection.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'geometries'::regclass AND c.relname LIKE 'geometries\\_p\\_%'
+    """)).scalars().all()
+
+    partitions = []
+    for name in names:
+        rows = connection.execute(
+            text(f"SELECT count(*) FROM (SELECT 1 FROM {name} LIMIT :limit) AS rows"), {"limit": limit}
+        ).scalar_one()
+        partitions.append((name[len("geometries_p_"):], rows))
+    return partitions
+
+
+def _check_key(key: str) -> str:
+    """
+    Ensures that a partition key is a geohash before it is used in a table name or in DDL.
+    """
+    if not _KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid partition key '{key}'")
+    return key
+
+
+def _split(connection: Connection, table: str, key: str) -> None:
+    """
+    Moves the rows of a key from the DEFAULT partition of a table to a new partition.
+    """
+    key = _check_key(key)
+    partition = f"{table}_p_{key}"
+
+    columns = _columns(connection, table)
+    connection.execute(text(f"CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)"))
+    connection.execute(
+        text(f"INSERT INTO {partition} ({columns}) SELECT {columns} FROM {table}_default WHERE partition_key = :key"),
+        {"key": key}
+    )
+    connection.execute(text(f"DELETE FROM {table}_default WHERE partition_key = :key"), {"key": key})
+    connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN ('{key}')"))
+
+
+def _merge(connection: Connection, table: str, key: str) -> None:
+    """
+    Moves the rows of the partition of a key back to the DEFAULT partition of a table.
+    """
+    key = _check_key(key)
+    partition = f"{table}_p_{key}"
+
+    connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+    columns = _columns(connection, table)
+    connection.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {partition}"))
+    connection.execute(text(f"DROP TABLE {partition}"))
+
+
+def _columns(connection: Connection, table: str) -> str:
+    """
+    Returns the column list of a table for an INSERT ... SELECT copy, without the generated
+    columns (e.g. the materialized projections), which PostgreSQL computes again.
+    """
+    rows = connection.execute(
+        text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :table AND is_generated = 'NEVER'
+            ORDER BY ordinal_position
+        """),
+        {"table": table}
+    )
+    return ", ".join(f'"{name}"' for name, in rows)
@@ -0,0 +1,263 @@
+# inbuilt libraries
+import re
+import threading
+from collections import OrderedDict
+
+# third-party libraries
+import numpy as np
+import shapely
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+try:
+    import pyproj
+except ImportError:
+    pyproj = None
+
+
+# SRID em que as geometrias são armazenadas
+STORAGE_SRID = 4326
+
+# Aceita "3857", "EPSG:3857" e a URI OGC "http://www.opengis.net/def/crs/EPSG/0/3857"
+_CRS_PATTERN = re.compile(r"^(?:EPSG:|https?://www\.opengis\.net/def/crs/EPSG/0/)?(\d{1,6})$", re.IGNORECASE)
+
+# Um cache de transformadores por thread, pois os objetos do pyproj não devem ser compartilhados.
+# Os SRIDs vêm dos clientes, então cada cache guarda apenas os pares usados mais recentemente
+_TRANSFORMERS = threading.local()
+MAX_TRANSFORMERS = 32
+
+
+def parse_srid(srid=None, crs: str = None):
+    """
+    Parses the SRID requested through the 'srid' or 'crs' parameters.
+
+    Parameters
+    ----------
+    srid : int or str, optional
+        The EPSG code, e.g. 3857.
+    crs : str, optional
+        The CRS, e.g. 'EPSG:3857' or 'http://www.opengis.net/def/crs/EPSG/0/3857'.
+
+    Returns
+    ----------
+        The integer SRID, or None if no parameter was provided.
+
+    Raises
+    ----------
+        ValueError
+            If a parameter is not a valid EPSG code or if both are provided with different codes.
+    """
+    parsed = []
+    for name, value in (("srid", srid), ("crs", crs)):
+        if value is None or value == "":
+            continue
+        match = _CRS_PATTERN.match(str(value).strip())
+        if not match or isinstance(value, bool):
+            raise ValueError(f"{name.capitalize()} should be an EPSG code, e.g. 3857 or 'EPSG:3857'")
+        parsed.append(int(match.group(1)))
+
+    if len(set(parsed)) > 1:
+        raise ValueError("Srid and crs refer to different coordinate reference systems")
+    return parsed[0] if parsed else None
+
+
+def crs_uri(srid: int) -> str:
+    """
+    Returns the OGC URI of an EPSG code, used in the Content-Crs header of the responses.
+
+    Parameters
+    ----------
+    srid : int
+        The EPSG code.
+
+    Returns
+    ----------
+        The URI of the CRS.
+    """
+    return f"<http://www.opengis.net/def/crs/EPSG/0/{srid}>"
+
+
+def transformer(source: int, target: int):
+    """
+    Returns the cached pyproj transformer between two EPSG codes, with the axes in the
+    (longitude, latitude) / (x, y) order of the geometries. Each thread keeps the
+    MAX_TRANSFORMERS most recently used transformers.
+
+    Parameters
+    ----------
+    source : int
+        The EPSG code of the coordinates.
+    target : int
+        The EPSG code of the transformed coordinates.
+
+    Returns
+    ----------
+        The transformer.
+
+    Raises
+    ----------
+        NotImplementedError
+            If pyproj is not installed.
+        ValueError
+            If an EPSG code is unknown.
+    """
+    if pyproj is None:
+        raise NotImplementedError("Reprojecting geometries requires pyproj (pip install pyproj)")
+
+    cache = getattr(_TRANSFORMERS, "cache", None)
+    if cache is None:
+        cache = _TRANSFORMERS.cache = OrderedDict()
+
+    key = (source, target)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    try:
+        cache[key] = pyproj.Transformer.from_crs(f"EPSG:{source}", f"EPSG:{target}", always_xy=True)
+    except pyproj.exceptions.CRSError:
+        raise ValueError(f"Unknown coordinate reference system: EPSG:{source} or EPSG:{target}")
+
+    # Descarta os transformadores usados há mais tempo
+    while len(cache) > MAX_TRANSFORMERS:
+        cache.popitem(last=False)
+    return cache[key]
+
+
+def transform(geometries: list, source: int, target: int) -> list:
+    """
+    Reprojects geometries with a single call of the transformer over the coordinates of all of
+    them.
+
+    Parameters
+    ----------
+    geometries : list
+        The Shapely geometries.
+    source : int
+        The EPSG code of the geometries.
+    target : int
+        The EPSG code of the reprojected geometries.
+
+    Returns
+    ----------
+        A list with the reprojected geometries.
+
+    Raises
+    ----------
+        NotImplementedError
+            If pyproj is not installed.
+        ValueError
+            If an EPSG code is unknown or a geometry is outside the area of use of the target.
+    """
+    if source == target or not len(geometries):
+        return list(geometries)
+
+    projector = transformer(source, target)
+
+    def project(coordinates: np.ndarray) -> np.ndarray:
+        x, y = projector.transform(coordinates[:, 0], coordinates[:, 1])
+        projected = np.column_stack((x, y))
+        if not np.isfinite(projected).all():
+            raise ValueError(f"The geometry cannot be represented in EPSG:{target}")
+        return projected
+
+    return list(shapely.transform(np.asarray(geometries, dtype=object), project))
+
+
+def materialize(engine: Engine, srid: int) -> bool:
+    """
+    Adds a stored generated column geom_<srid> to the geometries table, with the geometries
+    reprojected by ST_Transform. PostgreSQL keeps the column up to date on every write, and
+    the reads in that SRID use it instead of transforming the geometries.
+
+    The table is rewritten to fill the column, so the command should run off-peak.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    srid : int
+        The EPSG code of the column.
+
+    Returns
+    ----------
+        True if the column was added, False if it already existed.
+
+    Raises
+    ----------
+        ValueError
+            If PostGIS does not know the SRID.
+    """
+    with engine.begin() as connection:
+        if srid in materialized_srids(connection):
+            return False
+        check_srid(connection, srid)
+        connection.execute(text(f"""
+            ALTER TABLE geometries ADD COLUMN geom_{srid} geometry(GEOMETRY, {srid})
+            GENERATED ALWAYS AS (ST_Transform(geom, {srid})) STORED
+        """))
+    return True
+
+
+def dematerialize(engine: Engine, srid: int) -> bool:
+    """
+    Drops the generated column of a SRID added by materialize.
+
+    Parameters
+    ----------
+    engine : Engine
+        The engine of the database.
+    srid : int
+        The EPSG code of the column.
+
+    Returns
+    ----------
+        True if the column was dropped, False if it did not exist.
+    """
+    with engine.begin() as connection:
+        if srid not in materialized_srids(connection):
+            return False
+        connection.execute(text(f"ALTER TABLE geometries DROP COLUMN geom_{srid}"))
+    return True
+
+
+def materialized_srids(connection: Connection) -> set:
+    """
+    Returns the SRIDs whose reprojected geometries are stored in the geometries table.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database.
+
+    Returns
+    ----------
+        A set with the EPSG codes of the generated columns geom_<srid>.
+    """
+    rows = connection.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'geometries'
+            AND column_name ~ '^geom_[0-9]+$'
+    """))
+    return {int(name[len("geom_"):]) for name, in rows}
+
+
+def check_srid(connection: Connection, srid: int) -> None:
+    """
+    Ensures that PostGIS knows a SRID.
+
+    Parameters
+    ----------
+    connection : Connection
+        A connection to the database.
+    srid : int
+        The EPSG code.
+
+    Raises
+    ----------
+        ValueError
+            If the SRID is not in spatial_ref_sys.
+    """
+    known = connection.execute(text("SELECT 1 FROM spatial_ref_sys WHERE srid = :srid"), {"srid": srid}).first()
+    if known is None:
+        raise ValueError(f"Unknown coordinate reference system: EPSG:{srid}")
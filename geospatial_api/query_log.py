@@ -0,0 +1,328 @@
+# inbuilt libraries
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# third-party libraries
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+
+# custom libraries
+from geospatial_api.models.db import db
+
+
+# Parâmetros de posição (?, $1) ou nomeados (%(nome)s, :nome) e literais numéricos e de texto
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalizes a SQL statement so that executions that only differ by their parameters, literals
+    or the length of their IN lists share the same fingerprint.
+
+    Parameters
+    ----------
+    statement : str
+        The SQL statement.
+
+    Returns
+    ----------
+        The normalized statement.
+    """
+    normalized = _SPACES.sub(" ", statement).strip()
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    return _IN_LIST.sub("IN (...)", normalized)
+
+
+def redact(parameters, max_length: int = 64):
+    """
+    Redacts the bound parameters of a statement before they are logged: numbers, booleans and
+    nulls are kept, texts and binaries (descriptions, geometries) are replaced by their type
+    and length.
+
+    Parameters
+    ----------
+    parameters : dict, list or tuple
+        The parameters of the statement, or a list of them for an executemany.
+    max_length : int, default value is 64,
+        Maximum number of parameter sets kept for an executemany.
+
+    Returns
+    ----------
+        The redacted parameters, with the same structure.
+    """
+    if isinstance(parameters, dict):
+        return {name: redact(value) for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters[:max_length]]
+    if parameters is None or isinstance(parameters, (bool, int, float)):
+        return parameters
+    if isinstance(parameters, (str, bytes, bytearray, memoryview)):
+        return f"<{type(parameters).__name__}:{len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+
+# Campos do plano (EXPLAIN FORMAT JSON) que descrevem apenas a sua estrutura; as condições
+# (Filter, Index Cond, ...) e as colunas de saída, que contêm os parâmetros como literais, são descartadas
+_PLAN_NODE = ("Join Type", "Strategy")
+_PLAN_TARGET = ("Index Name", "Relation Name")
+_PLAN_COUNTERS = (
+    "Rows Removed by Filter", "Rows Removed by Index Recheck", "Rows Removed by Join Filter",
+    "Heap Fetches", "Shared Hit Blocks", "Shared Read Blocks", "Workers Launched"
+)
+
+
+def plan_outline(plan) -> str:
+    """
+    Renders the structure of a plan captured with EXPLAIN (..., FORMAT JSON): the node types,
+    relations, indexes, costs, rows and timings, without the conditions and outputs of the
+    nodes, in which PostgreSQL prints the bound parameters as literals.
+
+    Parameters
+    ----------
+    plan : list or str
+        The output of EXPLAIN (..., FORMAT JSON), parsed or as text.
+
+    Returns
+    ----------
+        The outline of the plan, one node per line, indented as the text format of EXPLAIN.
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]
+    lines = []
+
+    def render(node: dict, depth: int) -> None:
+        name = " ".join([*(str(node[key]) for key in _PLAN_NODE if key in node), node["Node Type"]])
+        targets = [f"{'using' if key == 'Index Name' else 'on'} {node[key]}" for key in _PLAN_TARGET if key in node]
+        line = " ".join([name, *targets])
+        line += f" (cost={node.get('Startup Cost', 0):.2f}..{node.get('Total Cost', 0):.2f} rows={node.get('Plan Rows', 0)})"
+        if "Actual Total Time" in node:
+            line += (
+                f" (actual time={node.get('Actual Startup Time', 0):.3f}..{node['Actual Total Time']:.3f}"
+                f" rows={node.get('Actual Rows', 0)} loops={node.get('Actual Loops', 0)})"
+            )
+        lines.append(("  " * depth + "->  " if depth else "") + line)
+
+        counters = [f"{key}: {node[key]}" for key in _PLAN_COUNTERS if node.get(key)]
+        if counters:
+            lines.append("  " * depth + ("      " if depth else "  ") + ", ".join(counters))
+        for child in node.get("Plans", []):
+            render(child, depth + 1)
+
+    render(root["Plan"], 0)
+    for key in ("Planning Time", "Execution Time"):
+        if key in root:
+            lines.append(f"{key}: {root[key]:.3f} ms")
+    return "\n".join(lines)
+
+
+class QueryLog:
+    """
+    Times every SQL statement run by the app. Statements slower than SLOW_QUERY_THRESHOLD_MS are
+    logged with their redacted parameters and kept in a buffer of the most recent ones, and a
+    sample of the slow SELECT statements (SLOW_QUERY_EXPLAIN_SAMPLE) is run again with
+    EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL to capture their plan, reduced to its structure
+    (plan_outline) when SLOW_QUERY_REDACT_PARAMETERS is enabled. The statistics are
+    aggregated by statement fingerprint.
+    """
+
+    def __init__(self, app: Flask):
+        self.config = app.config
+        self.logger = app.logger
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears the statistics and the recent slow statements.
+        """
+        with self._lock:
+            self.statements = {}
+            self.recent = deque(maxlen=self.config.get("SLOW_QUERY_RECENT", 100))
+            self.dropped = 0
+
+    def before_cursor_execute(self, connection: Connection, cursor, statement, parameters, context, executemany) -> None:
+        connection.info.setdefault("query_log_started_at", []).append(time.perf_counter())
+
+    def after_cursor_execute(self, connection: Connection, cursor, statement, parameters, context, executemany) -> None:
+        started_at = connection.info["query_log_started_at"].pop()
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+        # O EXPLAIN executado por este registro não é medido novamente
+        if connection.info.get("query_log_explaining"):
+            return
+
+        slow = elapsed_ms >= self.config.get("SLOW_QUERY_THRESHOLD_MS", 200)
+        plan = None
+        if slow and self._should_explain(connection, statement):
+            plan = self._explain(connection, statement, parameters)
+
+        key = fingerprint(statement)
+        digest = hashlib.md5(key.encode()).hexdigest()[:12]
+        if slow:
+            parameters = self._parameters(parameters)
+
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                if len(self.statements) >= self.config.get("SLOW_QUERY_MAX_FINGERPRINTS", 500):
+                    self.dropped += 1
+                else:
+                    stats = self.statements[key] = {
+                        "id": digest,
+                        "statement": key,
+                        "calls": 0,
+                        "slow": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "plan": None
+                    }
+            if stats is not None:
+                stats["calls"] += 1
+                stats["total_ms"] += elapsed_ms
+                stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+                if slow:
+                    stats["slow"] += 1
+                if plan is not None:
+                    stats["plan"] = plan
+
+            if slow:
+                self.recent.append({
+                    "fingerprint": digest,
+                    "statement": statement,
+                    "parameters": parameters,
+                    "duration_ms": round(elapsed_ms, 2),
+                    "at": time.time(),
+                    "plan": plan
+                })
+
+        if slow:
+            self.logger.warning(
+                "Slow query (%.1f ms): %s parameters=%s%s",
+                elapsed_ms, _SPACES.sub(" ", statement).strip(), parameters,
+                f"\n{plan}" if plan else ""
+            )
+
+    def handle_error(self, context) -> None:
+        # A execução que falhou não chega a after_cursor_execute
+        if context.connection is not None and context.cursor is not None:
+            started_at = context.connection.info.get("query_log_started_at")
+            if started_at:
+                started_at.pop()
+
+    def stats(self, limit: int = 50, order_by: str = "total_ms") -> list:
+        """
+        Returns the statistics of the statement fingerprints.
+
+        Parameters
+        ----------
+        limit : int, default value is 50,
+            Maximum number of fingerprints returned.
+        order_by : str, default value is 'total_ms',
+            The statistic the fingerprints are sorted by, in descending order: 'total_ms',
+            'mean_ms', 'max_ms', 'calls' or 'slow'.
+
+        Returns
+        ----------
+            A list with the statistics of each fingerprint.
+        """
+        with self._lock:
+            statements = [
+                {
+                    **stats,
+                    "total_ms": round(stats["total_ms"], 2),
+                    "mean_ms": round(stats["total_ms"] / stats["calls"], 2),
+                    "max_ms": round(stats["max_ms"], 2)
+                }
+                for stats in self.statements.values()
+            ]
+        return sorted(statements, key=lambda stats: stats[order_by], reverse=True)[:limit]
+
+    def _parameters(self, parameters):
+        """
+        Returns the parameters of a statement as they should be logged, according to
+        SLOW_QUERY_REDACT_PARAMETERS.
+        """
+        if self.config.get("SLOW_QUERY_REDACT_PARAMETERS", True):
+            return redact(parameters)
+        return parameters
+
+    def _should_explain(self, connection: Connection, statement: str) -> bool:
+        """
+        Decides whether the plan of a slow statement is captured: only SELECT statements, which
+        have no side effects when run again, on PostgreSQL and within a transaction, sampled with
+        the probability SLOW_QUERY_EXPLAIN_SAMPLE.
+        """
+        return (
+            connection.dialect.name == "postgresql"
+            and connection.in_transaction()
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and random.random() < self.config.get("SLOW_QUERY_EXPLAIN_SAMPLE", 0.1)
+        )
+
+    def _explain(self, connection: Connection, statement: str, parameters) -> str:
+        """
+        Runs a statement again with EXPLAIN (ANALYZE, BUFFERS) in a savepoint, so an error does
+        not abort the transaction of the request. With SLOW_QUERY_REDACT_PARAMETERS, the plan is
+        captured in JSON and only its structure is kept, since the text format prints the
+        parameters in the conditions of the nodes.
+
+        Returns
+        ----------
+            The text of the plan, or the error that prevented its capture.
+        """
+        redacted = self.config.get("SLOW_QUERY_REDACT_PARAMETERS", True)
+        cursor = connection.connection.cursor()
+        connection.info["query_log_explaining"] = True
+        try:
+            cursor.execute("SAVEPOINT query_log_explain")
+            try:
+                if redacted:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters)
+                    plan = plan_outline(cursor.fetchone()[0])
+                else:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                cursor.execute("RELEASE SAVEPOINT query_log_explain")
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_log_explain")
+                # A mensagem de erro do banco também pode citar os parâmetros
+                plan = f"EXPLAIN failed: {type(e).__name__ if redacted else e}"
+            return plan
+        finally:
+            connection.info["query_log_explaining"] = False
+            cursor.close()
+
+
+def init_query_log(app: Flask) -> QueryLog:
+    """
+    Registers the slow-query log on the engine of the app, if SLOW_QUERY_LOG is enabled.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app, whose database extension was already initialized.
+
+    Returns
+    ----------
+        The query log, also available in app.extensions["query_log"].
+    """
+    query_log = QueryLog(app)
+    app.extensions["query_log"] = query_log
+
+    if app.config.get("SLOW_QUERY_LOG", True):
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", query_log.before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", query_log.after_cursor_execute)
+        event.listen(engine, "handle_error", query_log.handle_error)
+
+    return query_log
@@ -0,0 +1,153 @@
+# inbuilt libraries
+import hmac
+
+# third-party libraries
+from flask import current_app, request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+
+# Mapeando as rotas de administração, que não passam pelo controle de admissão e só são
+# registradas quando ADMIN_TOKEN está definido
+blp = Blueprint("Admin", __name__, description="Administration and metrics of the API")
+
+
+@blp.before_request
+def check_admin_token():
+    """
+        Rejects the requests to the admin routes without the token of ADMIN_TOKEN in the
+        ADMIN_TOKEN_HEADER header.
+
+    Raises
+    ------
+        Unauthorized
+            If the token is missing or does not match.
+    """
+    expected = current_app.config.get("ADMIN_TOKEN")
+    token = request.headers.get(current_app.config.get("ADMIN_TOKEN_HEADER", "X-Admin-Token"), "")
+    if not expected or not hmac.compare_digest(token.encode(), expected.encode()):
+        abort(401, message="A valid admin token is required")
+
+
+@blp.route("/admin/admission")
+class AdmissionResource(MethodView):
+
+    def get(self) -> dict:
+        """
+            Returns the limits and counters of the admission control: the requests rejected by
+            the rate limits, the state of the concurrency gate of each route and the queries
+            checked, queued and rejected by their estimated cost.
+
+        Returns
+        -------
+            dict
+                The metrics of the admission control.
+
+        Raises
+        ------
+            Exception
+                For any server-side errors.
+        """
+        try:
+            metrics = current_app.extensions["admission"].metrics()
+            return {"ENABLED": current_app.config.get("ADMISSION_CONTROL", True), **metrics}
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+@blp.route("/admin/slow-queries")
+class SlowQueryResource(MethodView):
+
+    def get(self) -> dict:
+        """
+            Returns the statistics of the SQL statements run by the app, aggregated by
+            fingerprint (the statement without its parameters and literals), and the most recent
+            statements slower than SLOW_QUERY_THRESHOLD_MS, with their redacted parameters and,
+            when sampled, their EXPLAIN (ANALYZE, BUFFERS) plan.
+
+        Args
+        ----
+            limit : int, Optional
+                Maximum number of fingerprints returned, 50 by default.
+            order_by : str, Optional
+                'total_ms' (default), 'mean_ms', 'max_ms', 'calls' or 'slow'.
+
+        Returns
+        -------
+            dict
+                The statistics by fingerprint and the recent slow statements.
+
+        Raises
+        ------
+            ValueError
+                If the parameters are invalid.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            order_by = request.args.get('order_by', 'total_ms')
+            if order_by not in ("total_ms", "mean_ms", "max_ms", "calls", "slow"):
+                raise ValueError("Order_by should be 'total_ms', 'mean_ms', 'max_ms', 'calls' or 'slow'")
+
+            limit = request.args.get('limit', '50')
+            if not limit.isdigit() or int(limit) < 1:
+                raise ValueError("Limit should be a positive integer")
+
+            query_log = current_app.extensions["query_log"]
+            return {
+                "ENABLED": current_app.config.get("SLOW_QUERY_LOG", True),
+                "THRESHOLD_MS": current_app.config.get("SLOW_QUERY_THRESHOLD_MS", 200),
+                "STATEMENTS": query_log.stats(limit=int(limit), order_by=order_by),
+                "DROPPED": query_log.dropped,
+                "RECENT": list(query_log.recent)
+            }
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+    def delete(self) -> dict:
+        """
+            Clears the statistics and the recent slow statements.
+
+        Returns
+        -------
+            dict
+                A success message.
+
+        Raises
+        ------
+            Exception
+                For any server-side errors.
+        """
+        try:
+            current_app.extensions["query_log"].reset()
+            return {"Success": "The query statistics were cleared"}, 200
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+@blp.route("/admin/hot-queries")
+class HotQueryResource(MethodView):
+
+    def get(self) -> dict:
+        """
+            Returns the hot queries declared in HOT_QUERIES and how many requests were served
+            from their stored results (hits), required computing them (misses), how many times
+            they were computed (refreshes) and how many stored results the writes removed
+            (invalidations).
+
+        Returns
+        -------
+            dict
+                The hot queries and their counters.
+
+        Raises
+        ------
+            Exception
+                For any server-side errors.
+        """
+        try:
+            return current_app.extensions["hot_queries"].metrics()
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
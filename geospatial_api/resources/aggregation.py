@@ -0,0 +1,494 @@
+# inbuilt libraries
+import math
+
+# third-party libraries
+from flask import current_app, request
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from geoalchemy2.shape import to_shape
+
+from sqlalchemy import func, select
+
+# custom libraries
+from geospatial_api.models.db import db
+from geospatial_api.models.geometry import GeometryModel
+from geospatial_api.partitioning import pruning_keys
+from geospatial_api.storage import require_postgis
+
+
+# Mapeando as agregações espaciais sobre a tabela de geometrias
+blp = Blueprint("Aggregation", __name__, description="Spatial aggregations on geometries")
+
+
+@blp.route("/geometry/aggregate/count")
+class CountResource(MethodView):
+
+    def get(self) -> dict:
+        """
+            Counts the stored geometries, optionally grouped by description, with their total
+            area (in square meters) and number of vertices, read from the derived columns
+            computed at write time.
+
+        Args
+        ----
+            bbox : str, Optional
+                Bounding box 'minx,miny,maxx,maxy' the geometries must intersect.
+            description : str, Optional
+                Description of the geometries to be counted.
+            group_by : str, Optional
+                'description' to return one count per description.
+
+        Returns
+        -------
+            dict
+                The total count, area and vertices, or a list of them per description.
+
+        Raises
+        ------
+            ValueError
+                If the parameters are invalid.
+            NotImplementedError
+                If the geometries are not stored in PostGIS.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            require_postgis()
+            group_by = request.args.get('group_by')
+            conditions = _filter_conditions(geom_column=GeometryModel.geom)
+
+            # A área e os vértices vêm das colunas derivadas, sem ler as geometrias
+            totals = [
+                func.count(),
+                func.coalesce(func.sum(GeometryModel.area), 0.0),
+                func.coalesce(func.sum(GeometryModel.num_points), 0)
+            ]
+
+            if not group_by:
+                statement = select(*totals).select_from(GeometryModel).where(*conditions)
+                count, area, vertices = db.session.execute(statement).one()
+                return {"COUNT": count, "AREA": area, "VERTICES": vertices}
+
+            if group_by != 'description':
+                raise ValueError("Group_by should be 'description'")
+
+            statement = (
+                select(GeometryModel.description, *totals)
+                .where(*conditions)
+                .group_by(GeometryModel.description)
+                .order_by(func.count().desc())
+            )
+            return [
+                {"DESCRIPTION": description, "COUNT": count, "AREA": area, "VERTICES": vertices}
+                for description, count, area, vertices in db.session.execute(statement)
+            ]
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+@blp.route("/geometry/aggregate/grid")
+class GridResource(MethodView):
+
+    def get(self) -> dict:
+        """
+            Bins the centroids of the stored geometries in a square or hexagonal grid.
+
+            Only the cells with at least one geometry are returned, so the response size depends
+            on the resolution and not on the number of stored geometries.
+
+        Args
+        ----
+            size : float
+                The size of the cells, in degrees.
+            shape : str, Optional
+                'square' (default, ST_SnapToGrid) or 'hex' (ST_HexagonGrid).
+            bbox : str, Optional
+                Bounding box 'minx,miny,maxx,maxy' of the grid.
+            description : str, Optional
+                Description of the geometries to be binned.
+
+        Returns
+        -------
+            dict
+                A list with the polygon and the count of each non-empty cell.
+
+        Raises
+        ------
+            ValueError
+                If the parameters are invalid or the grid has too many cells.
+            NotImplementedError
+                If the geometries are not stored in PostGIS.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            require_postgis()
+            size = _parse_positive_float('size')
+            shape = request.args.get('shape', 'square')
+            conditions = _filter_conditions(geom_column=GeometryModel.centroid)
+
+            _check_grid_size(size, conditions)
+
+            if shape == 'square':
+                # ST_SnapToGrid leva o centróide ao ponto mais próximo da grade, o centro da célula
+                centers = (
+                    select(func.ST_SnapToGrid(GeometryModel.centroid, size).label('center'))
+                    .where(*conditions)
+                    .subquery()
+                )
+                statement = (
+                    select(func.ST_Expand(centers.c.center, size / 2), func.count())
+                    .group_by(centers.c.center)
+                )
+            elif shape == 'hex':
+                hexagons = (
+                    func.ST_HexagonGrid(size, _bounds(conditions))
+                    .table_valued('geom', 'i', 'j')
+                    .alias('hexagons')
+                )
+                # Um centróide sobre uma aresta ou vértice comum toca 2 ou 3 hexágonos, e é
+                # atribuído apenas ao de menor (i, j), para que as contagens somem o total
+                cells = (
+                    select(hexagons.c.i, hexagons.c.j)
+                    .join(GeometryModel, func.ST_Intersects(hexagons.c.geom, GeometryModel.centroid))
+                    .where(*conditions)
+                    .distinct(GeometryModel.id)
+                    .order_by(GeometryModel.id, hexagons.c.i, hexagons.c.j)
+                    .subquery()
+                )
+                hexagon = func.ST_SetSRID(func.ST_Hexagon(size, cells.c.i, cells.c.j), 4326)
+                statement = (
+                    select(hexagon, func.count())
+                    .group_by(cells.c.i, cells.c.j)
+                )
+            else:
+                raise ValueError("Shape should be 'square' or 'hex'")
+
+            return [
+                {"CELL": to_shape(cell).wkt, "COUNT": count}
+                for cell, count in db.session.execute(statement)
+            ]
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+@blp.route("/geometry/aggregate/clusters")
+class ClusterResource(MethodView):
+
+    def get(self) -> dict:
+        """
+            Clusters the centroids of the stored geometries for a map zoom level.
+
+            With the 'dbscan' method (default), the clustering distance is the size of
+            CLUSTER_RADIUS_PIXELS pixels at the given zoom level of a 256 pixels tile pyramid.
+            With the 'kmeans' method, the centroids are split in 'k' clusters.
+
+            At most AGGREGATION_MAX_CLUSTERS clusters are returned: at high zoom levels every
+            centroid may become its own cluster, and such requests should narrow the bbox.
+
+        Args
+        ----
+            zoom : int
+                The map zoom level, from 0 to 24. Required by the 'dbscan' method.
+            method : str, Optional
+                'dbscan' (default, ST_ClusterDBSCAN) or 'kmeans' (ST_ClusterKMeans).
+            k : int, Optional
+                The number of clusters of the 'kmeans' method, 8 by default.
+            bbox : str, Optional
+                Bounding box 'minx,miny,maxx,maxy' of the clustered centroids.
+            description : str, Optional
+                Description of the geometries to be clustered.
+
+        Returns
+        -------
+            dict
+                A list with the center, the extent and the count of each cluster.
+
+        Raises
+        ------
+            ValueError
+                If the parameters are invalid or there are more clusters than
+                AGGREGATION_MAX_CLUSTERS.
+            NotImplementedError
+                If the geometries are not stored in PostGIS.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            require_postgis()
+            method = request.args.get('method', 'dbscan')
+            conditions = _filter_conditions(geom_column=GeometryModel.centroid)
+
+            if method == 'dbscan':
+                zoom = _parse_int('zoom', minimum=0, maximum=24)
+                radius = current_app.config.get("CLUSTER_RADIUS_PIXELS", 40)
+                eps = 360 / (256 * 2 ** zoom) * radius
+                cluster_id = func.ST_ClusterDBSCAN(GeometryModel.centroid, eps, 1).over()
+            elif method == 'kmeans':
+                k = _parse_int('k', minimum=1, maximum=1000, default=8)
+                cluster_id = func.ST_ClusterKMeans(GeometryModel.centroid, k).over()
+            else:
+                raise ValueError("Method should be 'dbscan' or 'kmeans'")
+
+            members = (
+                select(GeometryModel.centroid.label('centroid'), cluster_id.label('cluster_id'))
+                .where(*conditions)
+                .subquery()
+            )
+            collected = func.ST_Collect(members.c.centroid)
+            statement = (
+                select(
+                    members.c.cluster_id,
+                    func.ST_Centroid(collected),
+                    func.ST_Envelope(collected),
+                    func.count()
+                )
+                .group_by(members.c.cluster_id)
+                .order_by(members.c.cluster_id)
+            )
+
+            # Um cluster a mais que o limite basta para saber que a resposta seria grande demais
+            max_clusters = current_app.config.get("AGGREGATION_MAX_CLUSTERS", 10_000)
+            rows = db.session.execute(statement.limit(max_clusters + 1)).all()
+            if len(rows) > max_clusters:
+                raise ValueError(
+                    f"There are more than {max_clusters} clusters, please use a lower zoom or a smaller bbox"
+                )
+
+            return [
+                {
+                    "CLUSTER": id,
+                    "CENTER": to_shape(center).wkt,
+                    "EXTENT": to_shape(extent).wkt,
+                    "COUNT": count
+                }
+                for id, center, extent, count in rows
+            ]
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+def _filter_conditions(geom_column) -> list:
+    """
+        Builds the WHERE conditions for the optional 'bbox' and 'description' query parameters.
+
+    Args
+    ----
+        geom_column: Column,
+            The geometry column tested against the bounding box.
+
+    Returns
+    -------
+        list
+            A list of SQLAlchemy conditions.
+    """
+    # Geometrias sem colunas derivadas ainda não possuem centróide
+    conditions = [geom_column.isnot(None)]
+
+    bbox = request.args.get('bbox')
+    if bbox:
+        conditions.append(func.ST_Intersects(geom_column, _envelope(bbox)))
+
+        # Restringe a consulta às partições que podem conter geometrias dentro do bbox
+        if current_app.config.get("GEOMETRY_PARTITIONING", False):
+            keys = pruning_keys(
+                _parse_bbox(bbox),
+                precision=current_app.config.get("GEOMETRY_PARTITION_PRECISION", 3),
+                max_keys=current_app.config.get("GEOMETRY_PARTITION_MAX_KEYS", 1024)
+            )
+            if keys is not None:
+                conditions.append(GeometryModel.partition_key.in_(keys))
+
+    description = request.args.get('description')
+    if description:
+        conditions.append(GeometryModel.description == description)
+
+    return conditions
+
+
+def _envelope(bbox: str):
+    """
+        Converts a 'minx,miny,maxx,maxy' string into a ST_MakeEnvelope expression.
+
+    Args
+    ----
+        bbox: str,
+            The bounding box.
+
+    Returns
+    -------
+        The SQL expression of the bounding box polygon.
+
+    Raises
+    ------
+        ValueError
+            If the bounding box is malformed.
+    """
+    return func.ST_MakeEnvelope(*_parse_bbox(bbox), 4326)
+
+
+def _parse_bbox(bbox: str) -> tuple:
+    """
+        Parses a 'minx,miny,maxx,maxy' string.
+
+    Args
+    ----
+        bbox: str,
+            The bounding box.
+
+    Returns
+    -------
+        tuple
+            The bounds (minx, miny, maxx, maxy).
+
+    Raises
+    ------
+        ValueError
+            If the bounding box is malformed.
+    """
+    try:
+        minx, miny, maxx, maxy = [float(value) for value in bbox.split(',')]
+    except ValueError:
+        raise ValueError("Bbox should be 'minx,miny,maxx,maxy'")
+
+    # float aceita 'nan' e 'inf', que passariam pelas comparações abaixo
+    if not all(math.isfinite(value) for value in (minx, miny, maxx, maxy)):
+        raise ValueError("Bbox should be 'minx,miny,maxx,maxy' with finite numbers")
+
+    if minx >= maxx or miny >= maxy:
+        raise ValueError("Bbox should be 'minx,miny,maxx,maxy'")
+
+    return minx, miny, maxx, maxy
+
+
+def _bounds(conditions: list):
+    """
+        Returns the grid bounds: the 'bbox' parameter or the extent of the filtered centroids.
+
+    Args
+    ----
+        conditions: list,
+            The WHERE conditions of the aggregation.
+
+    Returns
+    -------
+        The SQL expression of the bounds.
+    """
+    bbox = request.args.get('bbox')
+    if bbox:
+        return _envelope(bbox)
+
+    extent = select(func.ST_Extent(GeometryModel.centroid)).where(*conditions).scalar_subquery()
+    return func.ST_SetSRID(func.ST_Envelope(func.Geometry(extent)), 4326)
+
+
+def _check_grid_size(size: float, conditions: list) -> None:
+    """
+        Rejects grids with more cells than AGGREGATION_MAX_CELLS.
+
+    Args
+    ----
+        size: float,
+            The size of the cells, in degrees.
+        conditions: list,
+            The WHERE conditions of the aggregation.
+
+    Raises
+    ------
+        ValueError
+            If the grid has too many cells.
+    """
+    grid = select(_bounds(conditions).label('bounds')).subquery()
+    bounds = db.session.execute(
+        select(
+            func.ST_XMin(grid.c.bounds), func.ST_YMin(grid.c.bounds),
+            func.ST_XMax(grid.c.bounds), func.ST_YMax(grid.c.bounds)
+        )
+    ).one()
+    if None in bounds:
+        return
+
+    minx, miny, maxx, maxy = bounds
+    cells = ((maxx - minx) / size + 1) * ((maxy - miny) / size + 1)
+    max_cells = current_app.config.get("AGGREGATION_MAX_CELLS", 100_000)
+    if cells > max_cells:
+        raise ValueError(f"The grid would have {int(cells)} cells, the maximum allowed is {max_cells}")
+
+
+def _parse_positive_float(name: str) -> float:
+    """
+        Reads a required positive float query parameter.
+
+    Args
+    ----
+        name: str,
+            The name of the query parameter.
+
+    Returns
+    -------
+        float
+            The value of the parameter.
+
+    Raises
+    ------
+        ValueError
+            If the parameter is missing, not a finite number or not positive.
+    """
+    try:
+        value = float(request.args.get(name, ''))
+    except ValueError:
+        raise ValueError(f"Please provide {name} as a positive number")
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"Please provide {name} as a positive number")
+    return value
+
+
+def _parse_int(name: str, minimum: int, maximum: int, default: int = None) -> int:
+    """
+        Reads an integer query parameter within the given limits.
+
+    Args
+    ----
+        name: str,
+            The name of the query parameter.
+        minimum: int,
+            The minimum accepted value.
+        maximum: int,
+            The maximum accepted value.
+        default: int, optional
+            The value used when the parameter is missing. If not provided, the parameter is required.
+
+    Returns
+    -------
+        int
+            The value of the parameter.
+
+    Raises
+    ------
+        ValueError
+            If the parameter is missing and required, not an integer or out of limits.
+    """
+    value = request.args.get(name)
+    if value is None and default is not None:
+        return default
+
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Please provide {name} as an integer between {minimum} and {maximum}")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"Please provide {name} as an integer between {minimum} and {maximum}")
+    return value
@@ -1,6 +1,5 @@
 
 # third-party libraries
-import requests
 from flask import request, jsonify
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
@@ -84,6 +83,9 @@ class GeocodeResource(MethodView):
             else:
                 url = f'https://geocode.maps.co/search?q={place_name}&api_key={api_key}'
 
+            # Importado no primeiro uso para não atrasar a inicialização dos workers
+            import requests
+
             response = requests.get(url)
             if response.status_code != 200:
                 abort(response.status_code, description='Error from geocoding service')
@@ -152,6 +154,9 @@ class CoordinatesResource(MethodView):
 
             url = f'https://geocode.maps.co/reverse?lat={lat}&lon={lon}&api_key={api_key}'
 
+            # Importado no primeiro uso para não atrasar a inicialização dos workers
+            import requests
+
             response = requests.get(url)
 
             if response.status_code != 200:
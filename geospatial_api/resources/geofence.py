@@ -0,0 +1,95 @@
+# third-party libraries
+from flask import current_app, request, stream_with_context
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from werkzeug.exceptions import UnsupportedMediaType
+
+# custom libraries
+from geospatial_api.geofence import GeofenceTracker, get_index, parse_update
+from geospatial_api.storage import get_storage
+
+
+# Mapeando o geofencing de objetos em movimento sobre as geometrias armazenadas
+blp = Blueprint("Geofence", __name__, description="Geofencing of moving objects")
+
+
+@blp.route("/geometry/geofence")
+class GeofenceResource(MethodView):
+
+    def post(self):
+        """
+            Streams the enter and exit events of moving objects in the stored geometries.
+
+            The request body is a stream of position updates in NDJSON format (one JSON object
+            {"object_id", "lon", "lat", "ts"} per line, Content-Type application/x-ndjson), and
+            the response is a stream of events in the same format, one per line:
+            {"object_id", "geometry_id", "event", "ts"}, where event is 'enter' or 'exit'.
+
+            The updates are evaluated in micro-batches of GEOFENCE_BATCH_SIZE updates against an
+            in-memory index of the geometries, refreshed before each micro-batch so the stream
+            follows the writes of the zones; an empty line forces the evaluation of the pending
+            updates. Only the changes of zone are emitted, and invalid lines produce an
+            {"line", "error"} object without interrupting the stream.
+
+        Args
+        ----
+            description : str, Optional
+                Description of the geometries used as zones.
+
+        Returns
+        -------
+            Response
+                The NDJSON stream of events.
+
+        Raises
+        ------
+            UnsupportedMediaType
+                If the request body is not NDJSON.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            if request.mimetype != "application/x-ndjson":
+                raise UnsupportedMediaType("The request body should be NDJSON (application/x-ndjson)")
+
+            app = current_app._get_current_object()
+            storage = get_storage()
+            description = request.args.get('description')
+            index = get_index(app, storage, description=description)
+            batch_size = current_app.config.get("GEOFENCE_BATCH_SIZE", 1000)
+        except UnsupportedMediaType as ume:
+            abort(415, message=str(ume))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+        json = current_app.json
+        tracker = GeofenceTracker(index)
+
+        def process(batch: list) -> str:
+            # O índice é trocado quando as zonas mudam, mantendo as zonas em que cada objeto está
+            tracker.index = get_index(app, storage, description=description)
+            return "".join(json.dumps(event) + "\n" for event in tracker.process(batch))
+
+        def events():
+            batch = []
+            for number, line in enumerate(request.stream, start=1):
+                line = line.strip()
+                if line:
+                    try:
+                        batch.append(parse_update(json.loads(line)))
+                    except ValueError as ve:
+                        yield json.dumps({"line": number, "error": str(ve)}) + "\n"
+
+                # O lote é avaliado quando está cheio ou quando o cliente envia uma linha vazia
+                if len(batch) >= batch_size or (not line and batch):
+                    chunk = process(batch)
+                    batch = []
+                    if chunk:
+                        yield chunk
+
+            chunk = process(batch) if batch else ""
+            if chunk:
+                yield chunk
+
+        return current_app.response_class(stream_with_context(events()), mimetype="application/x-ndjson")
@@ -1,19 +1,20 @@
 # inbuilt libraries
-import json
 from typing import Union
 
 # third-party libraries
-from flask import request
+from flask import current_app, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 
-from sqlalchemy import func
-
 from werkzeug.exceptions import BadRequest, Unauthorized, UnsupportedMediaType
 
 # custom libraries
-from geospatial_api.models.db import db
-from geospatial_api.models.geometry import GeometryModel
+from geospatial_api.admission import Overloaded, admit_query, retry_after
+from geospatial_api.geometry_pipeline import parse_geometry, prepare_geometry
+from geospatial_api.hot_queries import hot_result
+from geospatial_api.projection import STORAGE_SRID, crs_uri, parse_srid
+from geospatial_api.storage import get_storage
+from geospatial_api.storage.base import check_predicate
 
 
 # Mapeando as interações com a API de geometrias
@@ -57,8 +58,12 @@ class GeometryResource(MethodView):
             Creates a new geometry based on the description and geom parameters extracted from
             the JSON payload of the request.
 
-            The method expects a JSON payload with 'description' and 'geom' keys. It validates the inputs
-            and then inserts a new geometry into the database.
+            The method expects a JSON payload with 'description' and 'geom' keys. It validates the inputs,
+            repairs invalid geometries with make_valid and then inserts a new geometry, together with
+            its derived columns (bbox, area, centroid and vertex count), into the database.
+
+            The geometry may be sent in another coordinate reference system, given by the 'srid'
+            or 'crs' query parameter, and is reprojected to EPSG:4326 before it is stored.
 
         Returns
         -------
@@ -68,9 +73,13 @@ class GeometryResource(MethodView):
         Raises
         ------
             ValueError
-                If 'description' or 'geom' are not provided or if 'geom' is not a valid GeoJSON object.
+                If 'description' or 'geom' are not provided, if 'geom' is not a valid GeoJSON object
+                or if it has more vertices than GEOMETRY_MAX_VERTICES.
             BadRequest
                 If the JSON payload is empty or malformed.
+            NotImplementedError
+                If another coordinate reference system is requested and the storage backend
+                cannot reproject the geometries (pyproj is not installed).
             Exception
                 For any other server-side errors.
         """
@@ -85,14 +94,8 @@ class GeometryResource(MethodView):
             # o geom é um objeto GeoJSON
             if not description or not geom:
                 raise ValueError("Please provide description or geom")
-            geom = GeometryModel(
-                description=description,
-                geom=func.ST_GeomFromGeoJSON(json.dumps(geom)) 
-            )
 
-            db.session.add(geom)
-            db.session.commit()
-            db.session.close()
+            get_storage().add(description, _prepare_geometry(geom, _request_srid()))
 
             return {"Success": f"Geometry added!"}, 201
         except ValueError as ve:
@@ -104,6 +107,8 @@ class GeometryResource(MethodView):
             abort(404, message=str(le))
         except UnsupportedMediaType as ume:
             abort(415, message=str(ume))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
         except Exception as e:
             abort(500, message=f"An error has occurred: {str(e)}")
 
@@ -117,7 +122,15 @@ class GeometryResource(MethodView):
             JSON body of the request.
 
             If no ID is provided, the method filters geometries based on the optional 'description'
-            and 'geom' fields. The 'geom' field should be in GeoJSON format.
+            and 'geom' fields. The 'geom' field should be in GeoJSON format and is matched with the
+            optional 'predicate' field, 'contains' (default) or 'intersects'.
+
+            The 'srid' or 'crs' query parameter (e.g. srid=3857 or crs=EPSG:3857) selects the
+            coordinate reference system of the returned geometries and of the 'geom' filter,
+            EPSG:4326 by default.
+
+            The filters declared in HOT_QUERIES are served, in EPSG:4326, from their stored
+            result, without running the query.
 
         Returns
         -------
@@ -134,18 +147,25 @@ class GeometryResource(MethodView):
                 If no geometry is found with the given ID or matching the filters.
             UnsupportedMediaType
                 If the request content type is not supported.
+            NotImplementedError
+                If another coordinate reference system is requested and the storage backend
+                cannot reproject the geometries (pyproj is not installed).
+            Overloaded
+                If the filter is estimated as expensive and no slot of the expensive queries
+                was released in time.
             Exception
                 For any other server-side errors.
         """
         try:
             id = request.args.get('id')
+            srid = _request_srid()
 
             # Busca pelo ID
             if id:
-                geometry = db.session.get(GeometryModel, id)
+                geometry = get_storage().get(id, srid=srid)
                 if not geometry:
                     raise LookupError(f"No geometry found with id {id}")
-                return [geometry.as_dict()]
+                return [geometry], 200, _crs_headers(srid)
 
             # Se não houver ID, busca por parâmetros de filtro
             data = request.get_json()
@@ -158,23 +178,29 @@ class GeometryResource(MethodView):
             if not self.__validate_parameters(description=description, geom=geom):
                 raise ValueError("Invalid parameters: description and geom are required.")
 
-            geometry = db.session.query(GeometryModel)
-
-            if geom:
-                geom_json = json.dumps(geom)
-                geom = func.ST_GeomFromGeoJSON(geom_json)
-                geometry = geometry.filter(func.ST_Contains(GeometryModel.geom, geom))
-                #geometry = geometry.filter(func.ST_Contains(GeometryModel.geom, geom))
-
-            if description:
-                geometry = geometry.filter_by(description=description)
-
-            geoms = [geo.as_dict() for geo in geometry.all()]
+            arguments = {
+                "description": description,
+                "geometry": _filter_geometry(geom, srid) if geom else None,
+                "predicate": data.get('predicate', 'contains')
+            }
+
+            # O corpo já serializado das consultas frequentes é enviado sem consultar as geometrias
+            stored = hot_result(**arguments) if srid is None else None
+            if stored is not None:
+                body, count = stored
+                if not count:
+                    raise LookupError("No geometry found.")
+                return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
+            # Consultas estimadas como caras são rejeitadas ou esperam por uma vaga
+            storage = get_storage()
+            with admit_query(storage, [arguments]):
+                geoms = storage.find(**arguments, srid=srid)
 
             if not geoms:
                 raise LookupError("No geometry found.")
 
-            return geoms
+            return geoms, 200, _crs_headers(srid)
         except ValueError as ve:
             abort(400, message=str(ve))
         except BadRequest as bre:
@@ -184,6 +210,10 @@ class GeometryResource(MethodView):
             abort(404, message=str(le))
         except UnsupportedMediaType as ume:
             abort(415, message=str(ume))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Overloaded as ol:
+            abort(503, message=str(ol), headers=retry_after(ol.retry_after))
         except Exception as e:
             abort(500, message=f"An error has occurred: {str(e)}")
 
@@ -194,7 +224,8 @@ class GeometryResource(MethodView):
 
             This method updates the 'description' and/or 'geom' fields of a geometry 
             identified by the given ID, which is passed as a query parameter. 
-            The 'geom' field should be in GeoJSON format.
+            The 'geom' field should be in GeoJSON format, in EPSG:4326 or in the coordinate
+            reference system given by the 'srid' or 'crs' query parameter.
 
             If the ID is not found in the database, a 404 error is returned.
 
@@ -228,17 +259,14 @@ class GeometryResource(MethodView):
             new_description = data.get("new_description", "")
             new_geom = data.get("new_geom", "")
 
-            geometry = db.session.get(GeometryModel, id)
-            if not geometry:
+            updated = get_storage().update(
+                id,
+                description=new_description,
+                geometry=_prepare_geometry(new_geom, _request_srid()) if new_geom else None
+            )
+            if not updated:
                 raise LookupError(f"No geometry with id {id}")
 
-            if new_description:
-                geometry.description = new_description
-            if new_geom:
-                geometry.geom = func.ST_GeomFromGeoJSON(json.dumps(new_geom))
-
-            db.session.commit()
-
             return {"Success": "The geometry was updated successfully"}, 200
         except ValueError as ve:
             abort(400, message=str(ve))
@@ -247,6 +275,8 @@ class GeometryResource(MethodView):
             abort(400, message=message)
         except LookupError as le:
             abort(404, message=str(le))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
         except Exception as e:
             abort(500, message=f"An error has occurred: {str(e)}")
 
@@ -279,15 +309,9 @@ class GeometryResource(MethodView):
             if not id:
                 abort(400, message="Please provide an id")
 
-            geometry = db.session.get(GeometryModel, id)
-
-            if not geometry:
+            if not get_storage().delete(id):
                 raise LookupError(f"No geometry found with id {id}")
 
-            db.session.delete(geometry)
-            db.session.commit()
-            db.session.close()
-
             return {"Sucess": f"The geometry with id {id} was deleted with successfully"}, 200
         except ValueError as ve:
             abort(400, message=str(ve))
@@ -299,3 +323,462 @@ class GeometryResource(MethodView):
         except Exception as e:
             abort(500, message=f"An error has occurred: {str(e)}")
 
+
+
+@blp.route("/geometry/bulk")
+class GeometryBulkResource(MethodView):
+
+
+    def put(self) -> dict:
+        """
+            Updates many geometries at once, selected by an id list and/or a filter.
+
+            The JSON payload selects the geometries through 'ids' (a list of integers) and/or
+            the same 'description', 'geom' and 'predicate' filters accepted by GET /geometry, and provides
+            the new values through 'new_description' and/or 'new_geom'. With the PostGIS storage,
+            the update runs as set-based UPDATE ... WHERE statements, one per chunk of ids, in a
+            single transaction.
+
+            When 'dry_run' is true, only the number of geometries that would be updated is
+            returned and nothing is modified.
+
+        Returns
+        -------
+            dict
+                A message with the number of affected geometries.
+
+        Raises
+        ------
+            ValueError
+                If no selector or no new value is provided, or if the ids are invalid.
+            BadRequest
+                If the JSON payload is empty or malformed.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            data = request.get_json()
+            if not data:
+                raise ValueError("The request body must contain data.")
+
+            dry_run = _dry_run(data)
+            new_description = data.get("new_description")
+            new_geom = data.get("new_geom")
+
+            if not new_description and not new_geom:
+                raise ValueError("Please provide new_description or new_geom")
+
+            srid = _request_srid()
+            affected = get_storage().bulk_update(
+                **_bulk_selector(data, srid),
+                new_description=new_description,
+                new_geometry=_prepare_geometry(new_geom, srid) if new_geom else None,
+                dry_run=dry_run
+            )
+
+            return {
+                "Success": f"{affected} geometries {'would be' if dry_run else 'were'} updated",
+                "affected": affected,
+                "dry_run": dry_run
+            }, 200
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except BadRequest as bre:
+            message = "JSON file cannot be empty, must have ids or a filter!"
+            abort(400, message=message)
+        except UnsupportedMediaType as ume:
+            abort(415, message=str(ume))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+    def delete(self) -> dict:
+        """
+            Deletes many geometries at once, selected by an id list and/or a filter.
+
+            The JSON payload selects the geometries through 'ids' (a list of integers) and/or
+            the same 'description', 'geom' and 'predicate' filters accepted by GET /geometry. With the
+            PostGIS storage, the removal runs as set-based DELETE ... WHERE statements, one per chunk
+            of ids, in a single transaction.
+
+            When 'dry_run' is true, only the number of geometries that would be deleted is
+            returned and nothing is modified.
+
+        Returns
+        -------
+            dict
+                A message with the number of affected geometries.
+
+        Raises
+        ------
+            ValueError
+                If no selector is provided or if the ids are invalid.
+            BadRequest
+                If the JSON payload is empty or malformed.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            data = request.get_json()
+            if not data:
+                raise ValueError("The request body must contain data.")
+
+            dry_run = _dry_run(data)
+
+            affected = get_storage().bulk_delete(**_bulk_selector(data, _request_srid()), dry_run=dry_run)
+
+            return {
+                "Success": f"{affected} geometries {'would be' if dry_run else 'were'} deleted",
+                "affected": affected,
+                "dry_run": dry_run
+            }, 200
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except BadRequest as bre:
+            message = "JSON file cannot be empty, must have ids or a filter!"
+            abort(400, message=message)
+        except UnsupportedMediaType as ume:
+            abort(415, message=str(ume))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+@blp.route("/geometry/query-batch")
+class GeometryBatchResource(MethodView):
+
+
+    def post(self) -> dict:
+        """
+            Runs many geometry queries in a single call.
+
+            The JSON payload has a 'queries' object whose values are sub-requests, either an id
+            lookup {"id": 1} or a filter with the 'description', 'geom' and 'predicate' fields
+            accepted by GET /geometry ('queries' may also be a list, keyed by position). All the id
+            lookups are resolved by a single query, and all the sub-requests read the same
+            snapshot of the geometries (a REPEATABLE READ transaction with PostGIS). The 'srid' or
+            'crs' query parameter applies to all the sub-requests.
+
+            The results are keyed by sub-request, each one with the 'STATUS' that GET /geometry
+            would have returned and either the geometries ('DATA') or an error ('MESSAGE').
+
+        Returns
+        -------
+            dict
+                The result of each sub-request, by key.
+
+        Raises
+        ------
+            ValueError
+                If 'queries' is missing, empty or has more than QUERY_BATCH_MAX_QUERIES items.
+            BadRequest
+                If the JSON payload is empty or malformed.
+            UnsupportedMediaType
+                If the request content type is not supported.
+            NotImplementedError
+                If another coordinate reference system is requested and the storage backend
+                cannot reproject the geometries (pyproj is not installed).
+            Overloaded
+                If a filter is estimated as expensive and no slot of the expensive queries
+                was released in time.
+            Exception
+                For any other server-side errors.
+        """
+        try:
+            data = request.get_json()
+            if not data:
+                raise ValueError("The request body must contain data.")
+
+            queries = _batch_queries(data.get("queries"))
+            srid = _request_srid()
+            results = {}
+            lookups = {}
+            filters = {}
+
+            # Erros de validação afetam apenas o sub-pedido correspondente
+            for key, query in queries.items():
+                try:
+                    if not isinstance(query, dict):
+                        raise ValueError("Each query should be an object with id or description and geom")
+                    if "id" in query:
+                        lookups[key] = _batch_id(query["id"])
+                    else:
+                        filters[key] = _batch_filter(query, srid)
+                except ValueError as ve:
+                    results[key] = {"STATUS": 400, "MESSAGE": str(ve)}
+
+            storage = get_storage()
+            with admit_query(storage, list(filters.values())), storage.read_transaction():
+                found = storage.get_many(sorted(set(lookups.values())), srid=srid) if lookups else {}
+                for key, id in lookups.items():
+                    if id in found:
+                        results[key] = {"STATUS": 200, "DATA": [found[id]]}
+                    else:
+                        results[key] = {"STATUS": 404, "MESSAGE": f"No geometry found with id {id}"}
+
+                for key, arguments in filters.items():
+                    geoms = storage.find(**arguments, srid=srid)
+                    if geoms:
+                        results[key] = {"STATUS": 200, "DATA": geoms}
+                    else:
+                        results[key] = {"STATUS": 404, "MESSAGE": "No geometry found."}
+
+            return {key: results[key] for key in queries}, 200, _crs_headers(srid)
+        except ValueError as ve:
+            abort(400, message=str(ve))
+        except BadRequest as bre:
+            message = "JSON file cannot be empty, must have queries!"
+            abort(400, message=message)
+        except UnsupportedMediaType as ume:
+            abort(415, message=str(ume))
+        except NotImplementedError as nie:
+            abort(501, message=str(nie))
+        except Overloaded as ol:
+            abort(503, message=str(ol), headers=retry_after(ol.retry_after))
+        except Exception as e:
+            abort(500, message=f"An error has occurred: {str(e)}")
+
+
+def _prepare_geometry(geom: dict, srid: int = None):
+    """
+        Validates and repairs a GeoJSON geometry according to the app configuration.
+
+    Args
+    ----
+        geom: dict,
+            Geometry in GeoJSON format.
+        srid: int, optional
+            EPSG code of the geometry, reprojected to EPSG:4326 before the validation.
+
+    Returns
+    -------
+        BaseGeometry
+            The valid Shapely geometry, in EPSG:4326.
+    """
+    return prepare_geometry(
+        geom,
+        repair=current_app.config.get("GEOMETRY_REPAIR", True),
+        max_vertices=current_app.config.get("GEOMETRY_MAX_VERTICES"),
+        project=_to_storage_srid(srid)
+    )
+
+
+def _filter_geometry(geom: dict, srid: int = None):
+    """
+        Parses the GeoJSON geometry of a spatial filter and reprojects it to EPSG:4326.
+
+    Args
+    ----
+        geom: dict,
+            Geometry in GeoJSON format.
+        srid: int, optional
+            EPSG code of the geometry. EPSG:4326 is assumed if not provided.
+
+    Returns
+    -------
+        BaseGeometry
+            The Shapely geometry, in EPSG:4326.
+    """
+    geometry = parse_geometry(geom)
+    project = _to_storage_srid(srid)
+    return project(geometry) if project else geometry
+
+
+def _to_storage_srid(srid: int = None):
+    """
+        Returns the function that reprojects a geometry received in the given SRID to the
+        SRID of the stored geometries, with the transform of the storage backend.
+
+    Args
+    ----
+        srid: int, optional
+            EPSG code of the received geometries.
+
+    Returns
+    -------
+        Callable
+            The function, or None when the geometries are already in EPSG:4326.
+    """
+    if srid is None or srid == STORAGE_SRID:
+        return None
+    return lambda geometry: get_storage().transform([geometry], srid, STORAGE_SRID)[0]
+
+
+def _request_srid():
+    """
+        Parses the coordinate reference system requested with the 'srid' or 'crs' query
+        parameters, e.g. srid=3857 or crs=EPSG:3857.
+
+    Returns
+    -------
+        int
+            The EPSG code, or None if not requested.
+    """
+    return parse_srid(request.args.get('srid'), request.args.get('crs'))
+
+
+def _crs_headers(srid: int = None) -> dict:
+    """
+        Returns the Content-Crs header of a response with geometries in the requested SRID.
+
+    Args
+    ----
+        srid: int, optional
+            EPSG code of the returned geometries.
+
+    Returns
+    -------
+        dict
+            The headers, empty when no SRID was requested.
+    """
+    return {"Content-Crs": crs_uri(srid)} if srid is not None else {}
+
+
+def _bulk_selector(data: dict, srid: int = None) -> dict:
+    """
+        Extracts the selector of a bulk operation from its JSON payload.
+
+    Args
+    ----
+        data: dict,
+            The JSON payload with 'ids' and/or the 'description', 'geom' and 'predicate' filters.
+        srid: int, optional
+            EPSG code of 'geom'. EPSG:4326 is assumed if not provided.
+
+    Returns
+    -------
+        dict
+            The keyword arguments of the selector of the storage bulk operations.
+    """
+    geom = data.get("geom")
+    return {
+        "ids": data.get("ids"),
+        "description": data.get("description"),
+        "geometry": _filter_geometry(geom, srid) if geom else None,
+        "predicate": data.get("predicate", "contains")
+    }
+
+
+def _dry_run(data: dict) -> bool:
+    """
+        Reads the 'dry_run' flag of a bulk operation, which must be a JSON boolean: a string
+        such as "false" would otherwise be truthy and turn a dry run into a real write, or
+        the other way around.
+
+    Args
+    ----
+        data: dict,
+            The JSON payload of the bulk operation.
+
+    Returns
+    -------
+        bool
+            Whether only the number of affected geometries must be returned.
+
+    Raises
+    ------
+        ValueError
+            If 'dry_run' is not a boolean.
+    """
+    dry_run = data.get("dry_run", False)
+    if not isinstance(dry_run, bool):
+        raise ValueError("Dry_run should be true or false")
+    return dry_run
+
+
+def _batch_queries(queries) -> dict:
+    """
+        Validates the sub-requests of a query batch.
+
+    Args
+    ----
+        queries: dict or list,
+            The sub-requests, by key or by position.
+
+    Returns
+    -------
+        dict
+            The sub-requests by key, positions being converted to strings.
+
+    Raises
+    ------
+        ValueError
+            If there is no sub-request or more than QUERY_BATCH_MAX_QUERIES.
+    """
+    if isinstance(queries, list):
+        queries = {str(position): query for position, query in enumerate(queries)}
+
+    if not isinstance(queries, dict) or not queries:
+        raise ValueError("Please provide queries as a non-empty object or list")
+
+    max_queries = current_app.config.get("QUERY_BATCH_MAX_QUERIES", 100)
+    if len(queries) > max_queries:
+        raise ValueError(f"A batch can have at most {max_queries} queries")
+
+    return queries
+
+
+def _batch_id(id) -> int:
+    """
+        Validates the id of an id lookup of a query batch.
+
+    Args
+    ----
+        id: int or str,
+            The id of the geometry.
+
+    Returns
+    -------
+        int
+            The integer id.
+
+    Raises
+    ------
+        ValueError
+            If the id is not an integer or a string of digits.
+    """
+    # int() truncaria 1.9 e True para 1, buscando uma geometria diferente da pedida
+    if isinstance(id, int) and not isinstance(id, bool):
+        return id
+    if isinstance(id, str) and id.isascii() and id.isdigit():
+        return int(id)
+    raise ValueError("Id should be an integer")
+
+
+def _batch_filter(query: dict, srid: int = None) -> dict:
+    """
+        Validates a filter of a query batch, with the same rules as GET /geometry.
+
+    Args
+    ----
+        query: dict,
+            The sub-request with 'description', 'geom' and 'predicate'.
+        srid: int, optional
+            EPSG code of 'geom'. EPSG:4326 is assumed if not provided.
+
+    Returns
+    -------
+        dict
+            The arguments of StorageBackend.find.
+
+    Raises
+    ------
+        ValueError
+            If neither description nor geom is provided, or if they are invalid.
+    """
+    description = query.get('description')
+    geom = query.get('geom')
+    predicate = query.get('predicate', 'contains')
+
+    if not description and not geom:
+        raise ValueError("Please provide description or geom")
+
+    check_predicate(predicate)
+    return {
+        "description": description,
+        "geometry": _filter_geometry(geom, srid) if geom else None,
+        "predicate": predicate
+    }
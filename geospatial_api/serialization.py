@@ -0,0 +1,86 @@
+# third-party libraries
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes with orjson, which is much faster than the standard
+    library on large lists of geometries. Types not supported natively by orjson are
+    converted by the default Flask serializer.
+    """
+
+    def _options(self, indent: bool = False) -> int:
+        """
+        Returns the orjson options equivalent to the provider settings.
+
+        Parameters
+        ----------
+        indent : bool, default value is False,
+            Whether the output should be indented.
+
+        Returns
+        -------
+            The orjson option flags.
+        """
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # Evita decodificar e codificar novamente o corpo da resposta
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent=indent))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {
+    "default": DefaultJSONProvider,
+    "orjson": OrjsonProvider,
+}
+
+
+def make_json_provider(app: Flask, name: str = "orjson") -> JSONProvider:
+    """
+    Creates the JSON provider of the app.
+
+    The orjson provider falls back to the default Flask provider when orjson is not installed.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app.
+    name : str, default value is 'orjson',
+        The name of the provider, 'orjson' or 'default'.
+
+    Returns
+    ----------
+        The JSON provider.
+
+    Raises
+    ----------
+        ValueError
+            If the provider name is unknown.
+    """
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON provider '{name}', use one of {list(JSON_PROVIDERS)}")
+
+    if name == "orjson" and orjson is None:
+        name = "default"
+
+    return JSON_PROVIDERS[name](app)
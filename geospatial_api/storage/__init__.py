@@ -0,0 +1,66 @@
+# third-party libraries
+from flask import Flask, current_app
+
+# custom libraries
+from geospatial_api.storage.base import StorageBackend, StorageError
+from geospatial_api.storage.memory import MemoryStorage
+from geospatial_api.storage.postgis import PostGISStorage
+
+
+BACKENDS = {
+    "postgis": PostGISStorage,
+    "memory": MemoryStorage,
+}
+
+
+def init_storage(app: Flask) -> StorageBackend:
+    """
+    Creates the storage backend selected by STORAGE_BACKEND and registers it on the app.
+
+    Parameters
+    ----------
+    app : Flask
+        The Flask app.
+
+    Returns
+    ----------
+        The storage backend.
+
+    Raises
+    ----------
+        ValueError
+            If the backend name is unknown.
+    """
+    name = app.config.get("STORAGE_BACKEND", "postgis")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}', use one of {list(BACKENDS)}")
+
+    storage = BACKENDS[name](app)
+    app.extensions["geometry_storage"] = storage
+    return storage
+
+
+def get_storage() -> StorageBackend:
+    """
+    Returns the storage backend of the current app.
+
+    Returns
+    ----------
+        The storage backend.
+    """
+    return current_app.extensions["geometry_storage"]
+
+
+def require_postgis() -> None:
+    """
+    Ensures that the current app stores the geometries in PostGIS, for the features that
+    are implemented in SQL only.
+
+    Raises
+    ----------
+        NotImplementedError
+            If another storage backend is used.
+    """
+    storage = get_storage()
+    if storage.name != PostGISStorage.name:
+        raise NotImplementedError(f"This operation is not available with the '{storage.name}' storage backend")
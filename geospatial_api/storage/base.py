@@ -0,0 +1,447 @@
+# inbuilt libraries
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from typing import Callable, Optional
+
+# third-party libraries
+from flask import Flask
+from shapely.geometry.base import BaseGeometry
+
+# custom libraries
+from geospatial_api import projection
+
+
+PREDICATES = ("contains", "intersects")
+
+
+class StorageError(Exception):
+    """
+    Raised by a storage backend when an operation fails on the backend side, e.g. an invalid
+    identifier. It is reported as a server-side error, as the database errors of PostGIS.
+    """
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the storage of geometries used by the resources.
+
+    Geometries are returned in the format of GeometryModel.as_dict. Spatial filters are Shapely
+    geometries matched with a predicate: 'contains' selects the stored geometries that contain
+    the filter geometry and 'intersects' the ones that intersect it.
+    """
+
+    name = None
+
+    def __init__(self, app: Flask):
+        self.config = app.config
+        self.generation = 0
+        self.listeners = []
+
+    def touch(self) -> None:
+        """
+        Marks the stored geometries as changed, so the in-memory indexes built from them in this
+        process (e.g. the geofence index) are rebuilt.
+        """
+        self.generation += 1
+
+    def notify(self, changes: Optional[list]) -> None:
+        """
+        Calls the listeners of the writes (e.g. the hot queries) after a write was applied and
+        before it is committed, so what they derive from the geometries is committed with it.
+
+        Parameters
+        ----------
+        changes : list, optional
+            The (description, bounds) of the written geometries, before and after the write,
+            where bounds is the (minx, miny, maxx, maxy) envelope. None when all the geometries
+            were replaced, e.g. by reset.
+        """
+        for listener in self.listeners:
+            listener(changes)
+
+    @abstractmethod
+    def add(self, description: str, geometry: BaseGeometry) -> int:
+        """
+        Stores a new geometry.
+
+        Parameters
+        ----------
+        description : str
+            Description of the geometry.
+        geometry : BaseGeometry
+            A valid geometry, usually returned by prepare_geometry.
+
+        Returns
+        ----------
+            The id of the new geometry.
+        """
+
+    @abstractmethod
+    def get(self, id, srid: int = None) -> Optional[dict]:
+        """
+        Retrieves a geometry by its id.
+
+        Parameters
+        ----------
+        id : int or str
+            The id of the geometry.
+        srid : int, optional
+            The EPSG code of the returned geometries, EPSG:4326 (the SRID they are stored in)
+            if not provided.
+
+        Returns
+        ----------
+            The geometry, or None if it does not exist.
+
+        Raises
+        ----------
+            StorageError
+                If the id is not an integer.
+        """
+
+    @abstractmethod
+    def get_many(self, ids: list, srid: int = None) -> dict:
+        """
+        Retrieves several geometries by their ids with a single lookup.
+
+        Parameters
+        ----------
+        ids : list
+            The integer ids of the geometries.
+        srid : int, optional
+            The EPSG code of the returned geometries, EPSG:4326 (the SRID they are stored in)
+            if not provided.
+
+        Returns
+        ----------
+            A dictionary with the geometries by id. Ids that do not exist are omitted.
+        """
+
+    @abstractmethod
+    def read_transaction(self) -> AbstractContextManager:
+        """
+        Returns a context manager within which all the reads see the same snapshot of the
+        stored geometries, e.g. for the queries of a batch.
+
+        Returns
+        ----------
+            The context manager.
+        """
+
+    @abstractmethod
+    def find(self, description: str = None, geometry: BaseGeometry = None, predicate: str = "contains",
+             srid: int = None) -> list:
+        """
+        Retrieves the geometries that match the filters.
+
+        Parameters
+        ----------
+        description : str, optional
+            Description of the geometries.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+        srid : int, optional
+            The EPSG code of the returned geometries, EPSG:4326 (the SRID they are stored in)
+            if not provided.
+
+        Returns
+        ----------
+            A list of geometries.
+        """
+
+    def transform(self, geometries: list, source: int, target: int) -> list:
+        """
+        Reprojects geometries, e.g. the geometries received in another SRID before they are
+        stored or used as filters.
+
+        Parameters
+        ----------
+        geometries : list
+            The Shapely geometries.
+        source : int
+            The EPSG code of the geometries.
+        target : int
+            The EPSG code of the reprojected geometries.
+
+        Returns
+        ----------
+            A list with the reprojected geometries.
+
+        Raises
+        ----------
+            NotImplementedError
+                If the backend cannot reproject the geometries (pyproj is not installed).
+            ValueError
+                If an EPSG code is unknown or a geometry cannot be reprojected.
+        """
+        return projection.transform(geometries, source, target)
+
+    def estimate_cost(self, description: str = None, geometry: BaseGeometry = None,
+                      predicate: str = "contains") -> Optional[float]:
+        """
+        Estimates the cost of a find with the given filters, before running it.
+
+        Parameters
+        ----------
+        description : str, optional
+            Description of the geometries.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+
+        Returns
+        ----------
+            The estimated cost, in the units of the backend, or None if the backend does not
+            estimate the cost of its queries.
+        """
+        return None
+
+    @abstractmethod
+    def geometries(self, description: str = None) -> tuple:
+        """
+        Retrieves the ids and the Shapely geometries of all the stored geometries, e.g. to
+        build an in-memory index.
+
+        Parameters
+        ----------
+        description : str, optional
+            Description of the geometries.
+
+        Returns
+        ----------
+            A tuple (ids, geometries) with a list of ids and a list of Shapely geometries.
+        """
+
+    @abstractmethod
+    def update(self, id, description: str = None, geometry: BaseGeometry = None) -> bool:
+        """
+        Updates the description and/or the geometry of a geometry.
+
+        Parameters
+        ----------
+        id : int or str
+            The id of the geometry.
+        description : str, optional
+            The new description.
+        geometry : BaseGeometry, optional
+            The new geometry.
+
+        Returns
+        ----------
+            True if the geometry was updated, False if it does not exist.
+        """
+
+    @abstractmethod
+    def delete(self, id) -> bool:
+        """
+        Deletes a geometry.
+
+        Parameters
+        ----------
+        id : int or str
+            The id of the geometry.
+
+        Returns
+        ----------
+            True if the geometry was deleted, False if it does not exist.
+        """
+
+    @abstractmethod
+    def bulk_update(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                    predicate: str = "contains", new_description: str = None,
+                    new_geometry: BaseGeometry = None, dry_run: bool = False) -> int:
+        """
+        Updates all the geometries selected by the id list and/or the filters.
+
+        Parameters
+        ----------
+        ids : list, optional
+            The ids of the geometries.
+        description : str, optional
+            Description of the geometries.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+        new_description : str, optional
+            The new description.
+        new_geometry : BaseGeometry, optional
+            The new geometry.
+        dry_run : bool, default value is False,
+            Whether only the number of selected geometries should be returned.
+
+        Returns
+        ----------
+            The number of updated (or selected, in a dry run) geometries.
+        """
+
+    @abstractmethod
+    def bulk_delete(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                    predicate: str = "contains", dry_run: bool = False) -> int:
+        """
+        Deletes all the geometries selected by the id list and/or the filters.
+
+        Parameters
+        ----------
+        ids : list, optional
+            The ids of the geometries.
+        description : str, optional
+            Description of the geometries.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+        dry_run : bool, default value is False,
+            Whether only the number of selected geometries should be returned.
+
+        Returns
+        ----------
+            The number of deleted (or selected, in a dry run) geometries.
+        """
+
+    @abstractmethod
+    def stored_result(self, key: str) -> Optional[tuple]:
+        """
+        Retrieves a result stored by save_result.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+
+        Returns
+        ----------
+            A tuple (body, count), or None if no result is stored with the key.
+        """
+
+    @abstractmethod
+    def save_result(self, key: str, compute: Callable, commit: bool = True) -> tuple:
+        """
+        Computes and stores a precomputed result, e.g. the serialized response of a hot query.
+
+        Concurrent saves of the same key are serialized, so a result computed before a
+        concurrent write was committed never replaces a result computed after it.
+
+        Parameters
+        ----------
+        key : str
+            The key of the result.
+        compute : Callable
+            The function that computes the result, which returns a tuple (body, count) with
+            the body in bytes.
+        commit : bool, default value is True,
+            Whether the result is committed. A listener of the writes saves its results in the
+            transaction of the write, which is committed by the write.
+
+        Returns
+        ----------
+            The computed tuple (body, count).
+        """
+
+    @abstractmethod
+    def remove_results(self, keys: list = None, commit: bool = True) -> None:
+        """
+        Removes stored results, e.g. the ones a write made stale. The removal of a key is
+        serialized with its saves, as in save_result.
+
+        Parameters
+        ----------
+        keys : list, optional
+            The keys of the results, all the stored results if None.
+        commit : bool, default value is True,
+            Whether the removal is committed. A listener of the writes removes the results in
+            the transaction of the write, which is committed by the write.
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        Removes all the stored geometries and recreates the storage, e.g. between tests.
+        """
+
+    @staticmethod
+    def check_selector(ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                       predicate: str = "contains") -> Optional[list]:
+        """
+        Validates the selector of a bulk operation.
+
+        Parameters
+        ----------
+        ids : list, optional
+            The ids of the geometries.
+        description : str, optional
+            Description of the geometries.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+
+        Returns
+        ----------
+            The sorted unique ids, or None if no id list was provided.
+
+        Raises
+        ----------
+            ValueError
+                If neither ids nor a filter is provided, if the ids are not integers or if the
+                predicate is unknown.
+        """
+        check_predicate(predicate)
+
+        if ids is None:
+            # Impede que uma operação em massa sem seletor altere a tabela inteira
+            if not description and geometry is None:
+                raise ValueError("Please provide ids or a filter (description or geom)")
+            return None
+
+        if not isinstance(ids, list) or not ids:
+            raise ValueError("Ids should be a non-empty list of integers")
+        if not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            raise ValueError("Ids should be a non-empty list of integers")
+
+        return sorted(set(ids))
+
+
+def check_predicate(predicate: str) -> None:
+    """
+    Validates a spatial predicate.
+
+    Parameters
+    ----------
+    predicate : str
+        The spatial predicate.
+
+    Raises
+    ----------
+        ValueError
+            If the predicate is not 'contains' or 'intersects'.
+    """
+    if predicate not in PREDICATES:
+        raise ValueError("Predicate should be 'contains' or 'intersects'")
+
+
+def to_int_id(id) -> int:
+    """
+    Converts an id received in the query string to an integer.
+
+    Parameters
+    ----------
+    id : int or str
+        The id.
+
+    Returns
+    ----------
+        The integer id.
+
+    Raises
+    ----------
+        StorageError
+            If the id is not an integer.
+    """
+    try:
+        return int(id)
+    except (TypeError, ValueError):
+        raise StorageError(f'invalid input syntax for type integer: "{id}"')
@@ -0,0 +1,291 @@
+# inbuilt libraries
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# third-party libraries
+import shapely
+from flask import Flask
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
+
+# custom libraries
+from geospatial_api.projection import STORAGE_SRID
+from geospatial_api.storage.base import StorageBackend, check_predicate, to_int_id
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Embedded storage of geometries in memory, indexed by a Shapely STRtree.
+
+    It does not depend on a database server, which makes reads local on edge nodes and the
+    test suite independent of PostGIS. The geometries can be persisted in a snapshot file
+    (MEMORY_SNAPSHOT_PATH), loaded when the storage is created and written when snapshot is
+    called and, unless MEMORY_SNAPSHOT_ON_EXIT is false, when the process exits.
+    """
+
+    name = "memory"
+
+    def __init__(self, app: Flask):
+        super().__init__(app)
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._next_id = 1
+        self._tree = None
+        self._tree_ids = []
+        self._results = {}
+
+        self.snapshot_path = self.config.get("MEMORY_SNAPSHOT_PATH")
+        if self.snapshot_path:
+            if os.path.exists(self.snapshot_path):
+                self.load(self.snapshot_path)
+            if self.config.get("MEMORY_SNAPSHOT_ON_EXIT", True):
+                atexit.register(self.snapshot)
+
+    def add(self, description: str, geometry: BaseGeometry) -> int:
+        with self._lock:
+            id = self._next_id
+            self._next_id += 1
+            self._rows[id] = (description, geometry)
+            self._tree = None
+            self.touch()
+            if self.listeners:
+                self.notify([(description, geometry.bounds)])
+            return id
+
+    def get(self, id, srid: int = None) -> Optional[dict]:
+        id = to_int_id(id)
+        with self._lock:
+            row = self._rows.get(id)
+        return self._as_dicts([(id, row)], srid)[0] if row else None
+
+    def get_many(self, ids: list, srid: int = None) -> dict:
+        with self._lock:
+            rows = [(id, self._rows[id]) for id in ids if id in self._rows]
+        return {geometry["ID"]: geometry for geometry in self._as_dicts(rows, srid)}
+
+    @contextmanager
+    def read_transaction(self):
+        # O lock impede escritas durante as leituras do lote
+        with self._lock:
+            yield
+
+    def find(self, description: str = None, geometry: BaseGeometry = None, predicate: str = "contains",
+             srid: int = None) -> list:
+        with self._lock:
+            rows = [
+                (id, self._rows[id])
+                for id in self._select(description=description, geometry=geometry, predicate=predicate)
+            ]
+        return self._as_dicts(rows, srid)
+
+    def geometries(self, description: str = None) -> tuple:
+        with self._lock:
+            rows = [
+                (id, geometry) for id, (row_description, geometry) in self._rows.items()
+                if not description or row_description == description
+            ]
+        return [id for id, _ in rows], [geometry for _, geometry in rows]
+
+    def update(self, id, description: str = None, geometry: BaseGeometry = None) -> bool:
+        id = to_int_id(id)
+        with self._lock:
+            if id not in self._rows:
+                return False
+            changes = self._changes([id], description, geometry)
+            self._write(id, description, geometry)
+            if changes:
+                self.notify(changes)
+            return True
+
+    def delete(self, id) -> bool:
+        id = to_int_id(id)
+        with self._lock:
+            if id not in self._rows:
+                return False
+            changes = self._changes([id])
+            del self._rows[id]
+            self._tree = None
+            self.touch()
+            if changes:
+                self.notify(changes)
+            return True
+
+    def bulk_update(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                    predicate: str = "contains", new_description: str = None,
+                    new_geometry: BaseGeometry = None, dry_run: bool = False) -> int:
+        with self._lock:
+            selected = self._select(ids, description, geometry, predicate, bulk=True)
+            if not dry_run and selected:
+                changes = self._changes(selected, new_description, new_geometry)
+                for id in selected:
+                    self._write(id, new_description, new_geometry)
+                if changes:
+                    self.notify(changes)
+            return len(selected)
+
+    def bulk_delete(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                    predicate: str = "contains", dry_run: bool = False) -> int:
+        with self._lock:
+            selected = self._select(ids, description, geometry, predicate, bulk=True)
+            if not dry_run and selected:
+                changes = self._changes(selected)
+                for id in selected:
+                    del self._rows[id]
+                self._tree = None
+                self.touch()
+                if changes:
+                    self.notify(changes)
+            return len(selected)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rows = {}
+            self._next_id = 1
+            self._tree = None
+            self._results = {}
+            self.touch()
+            self.notify(None)
+
+    def stored_result(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            return self._results.get(key)
+
+    def save_result(self, key: str, compute: Callable, commit: bool = True) -> tuple:
+        # O lock é o mesmo das escritas, que chamam os listeners com ele adquirido
+        with self._lock:
+            result = self._results[key] = compute()
+            return result
+
+    def remove_results(self, keys: list = None, commit: bool = True) -> None:
+        with self._lock:
+            if keys is None:
+                self._results = {}
+            for key in keys or []:
+                self._results.pop(key, None)
+
+    def snapshot(self, path: str = None) -> None:
+        """
+        Writes all the geometries, as WKB, to a snapshot file.
+
+        The file is written to a temporary path and then renamed, so an interrupted snapshot
+        never replaces a complete one.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path of the snapshot file. MEMORY_SNAPSHOT_PATH is used if not provided.
+        """
+        path = path or self.snapshot_path
+        if not path:
+            return
+
+        with self._lock:
+            ids = list(self._rows)
+            wkbs = shapely.to_wkb([self._rows[id][1] for id in ids], hex=True)
+            data = {
+                "next_id": self._next_id,
+                "rows": [[id, self._rows[id][0], wkb] for id, wkb in zip(ids, wkbs)]
+            }
+
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path: str) -> None:
+        """
+        Replaces the stored geometries with the ones of a snapshot file.
+
+        Parameters
+        ----------
+        path : str
+            The path of the snapshot file.
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        geometries = shapely.from_wkb([wkb for _, _, wkb in data["rows"]])
+        with self._lock:
+            self._rows = {
+                id: (description, geometry)
+                for (id, description, _), geometry in zip(data["rows"], geometries)
+            }
+            self._next_id = data["next_id"]
+            self._tree = None
+            self.touch()
+            self.notify(None)
+
+    def _write(self, id: int, description: str = None, geometry: BaseGeometry = None) -> None:
+        """
+        Replaces the description and/or the geometry of a stored geometry.
+        """
+        old_description, old_geometry = self._rows[id]
+        self._rows[id] = (description or old_description, old_geometry if geometry is None else geometry)
+        self.touch()
+        if geometry is not None:
+            self._tree = None
+
+    def _changes(self, ids: list, description: str = None, geometry: BaseGeometry = None) -> list:
+        """
+        Returns the (description, bounds) of the given stored geometries and, when a new
+        description or geometry is given, of their new versions, for the listeners of the
+        writes. Nothing is computed when there is no listener.
+        """
+        if not self.listeners:
+            return []
+
+        changes = []
+        for id in ids:
+            old_description, old_geometry = self._rows[id]
+            changes.append((old_description, old_geometry.bounds))
+            if description or geometry is not None:
+                changes.append((description or old_description, (old_geometry if geometry is None else geometry).bounds))
+        return changes
+
+    def _select(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                predicate: str = "contains", bulk: bool = False) -> list:
+        """
+        Returns the sorted ids of the geometries that match the id list and the filters.
+        """
+        if bulk:
+            ids = self.check_selector(ids, description, geometry, predicate)
+        else:
+            check_predicate(predicate)
+
+        selected = set(self._rows) if ids is None else set(ids) & set(self._rows)
+
+        if geometry is not None:
+            # A árvore é reconstruída apenas na primeira consulta após uma escrita
+            if self._tree is None:
+                self._tree_ids = list(self._rows)
+                self._tree = STRtree([self._rows[id][1] for id in self._tree_ids])
+
+            # O predicado é aplicado à geometria do filtro: "within" seleciona as que a contêm
+            indexes = self._tree.query(geometry, predicate="within" if predicate == "contains" else "intersects")
+            selected &= {self._tree_ids[index] for index in indexes}
+
+        if description:
+            selected = {id for id in selected if self._rows[id][0] == description}
+
+        return sorted(selected)
+
+    def _as_dicts(self, rows: list, srid: int = None) -> list:
+        """
+        Returns geometries in the format of GeometryModel.as_dict, reprojected all at once
+        when a SRID is requested.
+        """
+        geometries = [geometry for _, (_, geometry) in rows]
+        if srid is not None:
+            geometries = self.transform(geometries, STORAGE_SRID, srid)
+
+        return [
+            {
+                "ID": id,
+                "DESCRIPTION": description,
+                "GEOMETRY": geometry.wkt
+            }
+            for (id, (description, _)), geometry in zip(rows, geometries)
+        ]
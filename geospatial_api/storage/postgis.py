@@ -0,0 +1,562 @@
+# inbuilt libraries
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# third-party libraries
+import shapely
+from geoalchemy2 import Geometry
+from geoalchemy2.shape import from_shape
+from shapely.geometry.base import BaseGeometry
+from flask import Flask
+from sqlalchemy import ARRAY, Integer, any_, bindparam, delete, func, literal, literal_column, select, text, update
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+# custom libraries
+from geospatial_api.models.db import db
+from geospatial_api import geohash, projection
+from geospatial_api.models.geometry import GeometryModel
+from geospatial_api.models.geometry_cell import GeometryCellModel
+from geospatial_api.models.geometry_piece import GeometryPieceModel
+from geospatial_api.models.hot_query_result import HotQueryResultModel
+from geospatial_api.partitioning import pruning_keys
+from geospatial_api.storage.base import StorageBackend, check_predicate
+
+
+class PostGISStorage(StorageBackend):
+    """
+    Storage of geometries in the PostGIS database configured by SQLALCHEMY_DATABASE_URI.
+
+    Spatial filters are evaluated on the subdivided pieces of geometry_pieces, and bulk
+    operations run as set-based statements, one per chunk of BULK_CHUNK_SIZE ids, in a single
+    transaction. The covering geohash cells of each geometry are stored in geometry_cells and,
+    when GEOMETRY_CELL_INDEX is enabled, used as an indexed prefilter of the spatial filters.
+    When GEOMETRY_PARTITIONING is enabled, spatial filters are also restricted to the partition
+    keys that may match, so PostgreSQL only scans the matching partitions.
+    """
+
+    name = "postgis"
+
+    def __init__(self, app: Flask):
+        super().__init__(app)
+        self._srids = {projection.STORAGE_SRID}
+        self._materialized = None
+
+    def add(self, description: str, geometry: BaseGeometry) -> int:
+        model = GeometryModel(description=description, **self._geometry_values(geometry))
+
+        db.session.add(model)
+        db.session.flush()
+        self._refresh_pieces([model.id])
+        GeometryCellModel.refresh({model.id: self._covering_cells(geometry)})
+        if self.listeners:
+            self.notify([(description, geometry.bounds)])
+        db.session.commit()
+        self.touch()
+
+        id = model.id
+        db.session.close()
+        return id
+
+    def get(self, id, srid: int = None) -> Optional[dict]:
+        if srid not in (None, projection.STORAGE_SRID):
+            geometries = self._projected([GeometryModel.id == id], srid)
+            return geometries[0] if geometries else None
+
+        geometry = db.session.get(GeometryModel, id)
+        return geometry.as_dict() if geometry else None
+
+    def get_many(self, ids: list, srid: int = None) -> dict:
+        # Um único parâmetro do tipo array, em vez de um parâmetro por id
+        condition = GeometryModel.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer)))
+        if srid not in (None, projection.STORAGE_SRID):
+            return {geometry["ID"]: geometry for geometry in self._projected([condition], srid)}
+
+        statement = select(GeometryModel).where(condition)
+        return {geometry.id: geometry.as_dict() for geometry in db.session.execute(statement).scalars()}
+
+    @contextmanager
+    def read_transaction(self):
+        # O nível de isolamento só pode ser definido no início da transação
+        db.session.close()
+        db.session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        try:
+            yield
+        finally:
+            db.session.rollback()
+
+    def find(self, description: str = None, geometry: BaseGeometry = None, predicate: str = "contains",
+             srid: int = None) -> list:
+        conditions = self._filter_conditions(description=description, geometry=geometry, predicate=predicate)
+        if srid not in (None, projection.STORAGE_SRID):
+            return self._projected(conditions, srid)
+
+        query = db.session.query(GeometryModel).filter(*conditions)
+        return [geo.as_dict() for geo in query.all()]
+
+    def transform(self, geometries: list, source: int, target: int) -> list:
+        if projection.pyproj is not None or source == target or not geometries:
+            return super().transform(geometries, source, target)
+
+        # Sem o pyproj, todas as geometrias são reprojetadas pelo PostGIS em uma única consulta
+        self._check_srid(source)
+        self._check_srid(target)
+        rows = db.session.execute(
+            text("""
+                SELECT ST_AsBinary(ST_Transform(ST_GeomFromWKB(wkb, :source), :target))
+                FROM unnest(:wkbs) WITH ORDINALITY AS input (wkb, position)
+                ORDER BY position
+            """),
+            {"source": source, "target": target, "wkbs": list(shapely.to_wkb(geometries))}
+        ).scalars()
+        return list(shapely.from_wkb([bytes(wkb) for wkb in rows]))
+
+    def estimate_cost(self, description: str = None, geometry: BaseGeometry = None,
+                      predicate: str = "contains") -> Optional[float]:
+        # Custo total estimado pelo planejador, sem executar a consulta
+        statement = select(GeometryModel).where(
+            *self._filter_conditions(description=description, geometry=geometry, predicate=predicate)
+        )
+        plan = db.session.execute(_Explain(statement)).scalar_one()
+        return float(plan[0]["Plan"]["Total Cost"])
+
+    def geometries(self, description: str = None) -> tuple:
+        statement = select(GeometryModel.id, func.ST_AsBinary(GeometryModel.geom))
+        if description:
+            statement = statement.where(GeometryModel.description == description)
+
+        rows = db.session.execute(statement).all()
+        return [id for id, _ in rows], list(shapely.from_wkb([bytes(wkb) for _, wkb in rows]))
+
+    def update(self, id, description: str = None, geometry: BaseGeometry = None) -> bool:
+        model = db.session.get(GeometryModel, id)
+        if not model:
+            return False
+
+        changes = self._changes([GeometryModel.id == model.id], description, geometry)
+        if description:
+            model.description = description
+        if geometry is not None:
+            for column, value in self._geometry_values(geometry).items():
+                setattr(model, column, value)
+            db.session.flush()
+            self._refresh_pieces([model.id])
+            GeometryCellModel.refresh({model.id: self._covering_cells(geometry)})
+
+        if changes:
+            self.notify(changes)
+        db.session.commit()
+        self.touch()
+        return True
+
+    def delete(self, id) -> bool:
+        model = db.session.get(GeometryModel, id)
+        if not model:
+            return False
+
+        changes = self._changes([GeometryModel.id == model.id])
+        db.session.delete(model)
+        GeometryPieceModel.remove([model.id])
+        GeometryCellModel.remove([model.id])
+        if changes:
+            self.notify(changes)
+        db.session.commit()
+        self.touch()
+        db.session.close()
+        return True
+
+    def bulk_update(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                    predicate: str = "contains", new_description: str = None,
+                    new_geometry: BaseGeometry = None, dry_run: bool = False) -> int:
+        values = {}
+        if new_description:
+            values["description"] = new_description
+        if new_geometry is not None:
+            values.update(self._geometry_values(new_geometry))
+            cells = self._covering_cells(new_geometry)
+
+        try:
+            affected = 0
+            changes = []
+            for conditions in self._bulk_conditions(ids, description, geometry, predicate):
+                if dry_run:
+                    affected += self._count(conditions)
+                    continue
+                changes += self._changes(conditions, new_description, new_geometry)
+                statement = (
+                    update(GeometryModel)
+                    .where(*conditions)
+                    .values(**values)
+                    .returning(GeometryModel.id)
+                    .execution_options(synchronize_session=False)
+                )
+                updated = db.session.execute(statement).scalars().all()
+                if new_geometry is not None:
+                    self._refresh_pieces(updated)
+                    GeometryCellModel.refresh({id: cells for id in updated})
+                affected += len(updated)
+
+            if changes:
+                self.notify(changes)
+            if not dry_run:
+                db.session.commit()
+                self.touch()
+            return affected
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def bulk_delete(self, ids: list = None, description: str = None, geometry: BaseGeometry = None,
+                    predicate: str = "contains", dry_run: bool = False) -> int:
+        try:
+            affected = 0
+            changes = []
+            for conditions in self._bulk_conditions(ids, description, geometry, predicate):
+                if dry_run:
+                    affected += self._count(conditions)
+                    continue
+                changes += self._changes(conditions)
+                statement = (
+                    delete(GeometryModel)
+                    .where(*conditions)
+                    .returning(GeometryModel.id)
+                    .execution_options(synchronize_session=False)
+                )
+                deleted = db.session.execute(statement).scalars().all()
+                GeometryPieceModel.remove(deleted)
+                GeometryCellModel.remove(deleted)
+                affected += len(deleted)
+
+            if changes:
+                self.notify(changes)
+            if not dry_run:
+                db.session.commit()
+                self.touch()
+            return affected
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def reset(self) -> None:
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        self.touch()
+        self.notify(None)
+
+    def stored_result(self, key: str) -> Optional[tuple]:
+        return HotQueryResultModel.fetch(key)
+
+    def save_result(self, key: str, compute: Callable, commit: bool = True) -> tuple:
+        try:
+            # Uma escrita concorrente que detém o lock já estará confirmada quando a consulta rodar
+            HotQueryResultModel.lock(key)
+            body, count = compute()
+            HotQueryResultModel.save(key, body, count)
+            if commit:
+                db.session.commit()
+            return body, count
+        except Exception:
+            if commit:
+                db.session.rollback()
+            raise
+
+    def remove_results(self, keys: list = None, commit: bool = True) -> None:
+        try:
+            # Em ordem de chave, para que escritas concorrentes bloqueiem os resultados na mesma ordem
+            for key in sorted(keys or []):
+                HotQueryResultModel.lock(key)
+            HotQueryResultModel.remove(keys)
+            if commit:
+                db.session.commit()
+        except Exception:
+            if commit:
+                db.session.rollback()
+            raise
+
+    def _changes(self, conditions: list, description: str = None, geometry: BaseGeometry = None) -> list:
+        """
+        Returns the (description, bounds) of the geometries that match the conditions, before a
+        write, and of their new versions when a new description or geometry is given, for the
+        listeners of the writes. The bounds are aggregated by description with ST_Extent over
+        the bbox column, so the (possibly huge) geometries are not read, and nothing is queried
+        when there is no listener.
+
+        Parameters
+        ----------
+        conditions : list
+            A list of SQLAlchemy conditions that select the written geometries.
+        description : str, optional
+            The new description.
+        geometry : BaseGeometry, optional
+            The new geometry.
+
+        Returns
+        ----------
+            A list of (description, bounds) tuples, where bounds is None for empty geometries.
+        """
+        if not self.listeners:
+            return []
+
+        extent = func.ST_Extent(GeometryModel.bbox)
+        statement = (
+            select(
+                GeometryModel.description,
+                func.ST_XMin(extent), func.ST_YMin(extent), func.ST_XMax(extent), func.ST_YMax(extent)
+            )
+            .where(*conditions)
+            .group_by(GeometryModel.description)
+        )
+
+        changes = []
+        for old_description, *bounds in db.session.execute(statement).all():
+            bounds = None if bounds[0] is None else tuple(bounds)
+            changes.append((old_description, bounds))
+            if description or geometry is not None:
+                changes.append((description or old_description, bounds if geometry is None else geometry.bounds))
+        return changes
+
+    def _refresh_pieces(self, ids: list) -> None:
+        """
+        Rebuilds the subdivided pieces of the geometries written in the current transaction.
+
+        Parameters
+        ----------
+        ids : list
+            The ids of the geometries.
+        """
+        GeometryPieceModel.refresh(
+            ids,
+            max_vertices=self.config.get("GEOMETRY_SUBDIVIDE_MAX_VERTICES", 256)
+        )
+
+    def _geometry_values(self, geometry: BaseGeometry) -> dict:
+        """
+        Returns the values of the geometry column and of its derived columns, see
+        GeometryModel.geometry_values.
+        """
+        return GeometryModel.geometry_values(
+            geometry,
+            partition_precision=self.config.get("GEOMETRY_PARTITION_PRECISION", 3)
+        )
+
+    def _covering_cells(self, geometry: BaseGeometry) -> list:
+        """
+        Returns the covering cells of a geometry, stored in geometry_cells.
+
+        Parameters
+        ----------
+        geometry : BaseGeometry
+            The geometry.
+
+        Returns
+        ----------
+            A list of geohashes.
+        """
+        return geohash.covering_cells(
+            geometry,
+            min_precision=self.config.get("GEOMETRY_CELL_MIN_PRECISION", 1),
+            max_precision=self.config.get("GEOMETRY_CELL_MAX_PRECISION", 7),
+            max_cells=self.config.get("GEOMETRY_CELL_MAX_CELLS", 32)
+        )
+
+    def _query_cells(self, geometry: BaseGeometry) -> Optional[list]:
+        """
+        Returns the cells of the geometries that may match a spatial filter, or None if the
+        cell index is not used.
+
+        Parameters
+        ----------
+        geometry : BaseGeometry
+            Geometry of the spatial filter.
+
+        Returns
+        ----------
+            A list of geohashes, or None.
+        """
+        if not self.config.get("GEOMETRY_CELL_INDEX", True):
+            return None
+
+        return geohash.query_cells(
+            geometry.bounds,
+            min_precision=self.config.get("GEOMETRY_CELL_MIN_PRECISION", 1),
+            max_precision=self.config.get("GEOMETRY_CELL_MAX_PRECISION", 7),
+            max_cells=self.config.get("GEOMETRY_CELL_MAX_QUERY_CELLS", 256)
+        )
+
+    def _pruning_keys(self, geometry: BaseGeometry) -> Optional[list]:
+        """
+        Returns the partition keys of the geometries that may match a spatial filter, or None
+        if the partitions are not pruned.
+
+        Parameters
+        ----------
+        geometry : BaseGeometry
+            Geometry of the spatial filter.
+
+        Returns
+        ----------
+            A list of partition keys, or None.
+        """
+        if not self.config.get("GEOMETRY_PARTITIONING", False):
+            return None
+
+        return pruning_keys(
+            geometry.bounds,
+            precision=self.config.get("GEOMETRY_PARTITION_PRECISION", 3),
+            max_keys=self.config.get("GEOMETRY_PARTITION_MAX_KEYS", 1024)
+        )
+
+    def _projected(self, conditions: list, srid: int) -> list:
+        """
+        Retrieves the geometries that match the conditions, reprojected by PostGIS to the given
+        SRID, or read from the generated column geom_<srid> when the projection is materialized.
+
+        Parameters
+        ----------
+        conditions : list
+            A list of SQLAlchemy conditions.
+        srid : int
+            The EPSG code of the returned geometries.
+
+        Returns
+        ----------
+            A list of geometries in the format of GeometryModel.as_dict.
+        """
+        self._check_srid(srid)
+
+        if self._materialized is None:
+            self._materialized = projection.materialized_srids(db.session.connection())
+
+        if srid in self._materialized:
+            geom = literal_column(f"{GeometryModel.__tablename__}.geom_{srid}")
+        else:
+            geom = func.ST_Transform(GeometryModel.geom, srid)
+
+        statement = select(GeometryModel.id, GeometryModel.description, func.ST_AsBinary(geom)).where(*conditions)
+        rows = db.session.execute(statement).all()
+        if not rows:
+            return []
+
+        wkts = shapely.to_wkt(shapely.from_wkb([bytes(wkb) for _, _, wkb in rows]), rounding_precision=-1)
+        return [
+            {"ID": id, "DESCRIPTION": description, "GEOMETRY": wkt}
+            for (id, description, _), wkt in zip(rows, wkts)
+        ]
+
+    def _check_srid(self, srid: int) -> None:
+        """
+        Ensures that PostGIS knows a SRID, so an unknown code is reported as a client error
+        instead of failing in ST_Transform. The known SRIDs are cached by the storage.
+
+        Raises
+        ----------
+            ValueError
+                If the SRID is not in spatial_ref_sys.
+        """
+        if srid not in self._srids:
+            projection.check_srid(db.session.connection(), srid)
+            self._srids.add(srid)
+
+    def _filter_conditions(self, description: str = None, geometry: BaseGeometry = None,
+                           predicate: str = "contains") -> list:
+        """
+        Builds the WHERE conditions for the description and spatial filters.
+
+        Parameters
+        ----------
+        description : str, optional
+            Description of the geometries to be selected.
+        geometry : BaseGeometry, optional
+            Geometry matched with the predicate.
+        predicate : str, default value is 'contains',
+            The spatial predicate, 'contains' or 'intersects'.
+
+        Returns
+        ----------
+            A list of SQLAlchemy conditions, empty if no filter was provided.
+        """
+        check_predicate(predicate)
+        conditions = []
+
+        if geometry is not None:
+            geom = literal(from_shape(geometry, srid=4326), Geometry(srid=4326))
+            keys = self._pruning_keys(geometry)
+
+            # As células da área consultada selecionam, por igualdade no índice B-tree, as
+            # únicas geometrias que passam pelo teste exato
+            cells = self._query_cells(geometry)
+            candidates = None if cells is None else GeometryCellModel.candidates(cells)
+            if candidates is not None:
+                conditions.append(GeometryModel.id.in_(candidates))
+
+            if predicate == "contains":
+                conditions.append(GeometryPieceModel.contains_condition(geom, keys, candidates))
+            else:
+                conditions.append(GeometryPieceModel.intersects_condition(geom, keys, candidates))
+
+            # A condição sobre a chave permite ao PostgreSQL descartar as demais partições
+            if keys is not None:
+                conditions.append(GeometryModel.partition_key.in_(keys))
+
+        if description:
+            conditions.append(GeometryModel.description == description)
+
+        return conditions
+
+    def _bulk_conditions(self, ids: list, description: str, geometry: BaseGeometry, predicate: str) -> list:
+        """
+        Builds the WHERE conditions of a bulk operation, chunking the id list.
+
+        Each item of the returned list holds the conditions of one statement. The id list
+        is split into chunks of at most BULK_CHUNK_SIZE ids so that very large sets do not
+        produce a single huge statement.
+
+        Returns
+        ----------
+            A list with one list of SQLAlchemy conditions per statement.
+        """
+        ids = self.check_selector(ids, description, geometry, predicate)
+        conditions = self._filter_conditions(description=description, geometry=geometry, predicate=predicate)
+
+        if ids is None:
+            return [conditions]
+
+        chunk_size = self.config.get("BULK_CHUNK_SIZE", 1000)
+        return [
+            [GeometryModel.id.in_(ids[i:i + chunk_size]), *conditions]
+            for i in range(0, len(ids), chunk_size)
+        ]
+
+    @staticmethod
+    def _count(conditions: list) -> int:
+        """
+        Counts the geometries that match the given conditions.
+
+        Parameters
+        ----------
+        conditions : list
+            A list of SQLAlchemy conditions.
+
+        Returns
+        ----------
+            The number of matching geometries.
+        """
+        statement = select(func.count()).select_from(GeometryModel).where(*conditions)
+        return db.session.execute(statement).scalar_one()
+
+
+class _Explain(Executable, ClauseElement):
+    """
+    EXPLAIN (FORMAT JSON) of a statement, compiled with the bound parameters of the statement.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
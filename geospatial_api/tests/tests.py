@@ -1,10 +1,25 @@
 import sys
 import os
+import gzip
+import json
+import math
+import tempfile
 import unittest
 from pathlib import Path
 from dotenv import load_dotenv
 from geospatial_api.app import create_app
+from shapely.geometry import Point, Polygon
+from sqlalchemy import text
+from geospatial_api import geofence, geohash, migrations, partitioning, projection, query_log
 from geospatial_api.models.db import db
+from geospatial_api.models.geometry import GeometryModel
+from geospatial_api.resources import aggregation
+from geospatial_api.models.geometry_cell import GeometryCellModel
+from geospatial_api.storage import get_storage
+
+# Os testes podem ser executados sem PostGIS com STORAGE_BACKEND=memory
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgis")
+requires_postgis = unittest.skipUnless(STORAGE_BACKEND == "postgis", "Requires the PostGIS storage backend")
 
 class TestGeometryResource(unittest.TestCase):
 
@@ -17,23 +32,21 @@ class TestGeometryResource(unittest.TestCase):
 
         env_file_path = Path(__file__).resolve().parent.parent.parent / '.env'
 
-        if not env_file_path.exists():
+        if STORAGE_BACKEND == "postgis" and not env_file_path.exists():
             raise FileNotFoundError(f"No .env file found at {env_file_path}. It's required to run this app.")
 
         load_dotenv(dotenv_path=env_file_path)
 
         try:
-            cls.app = create_app()
+            cls.app = create_app({"STORAGE_BACKEND": STORAGE_BACKEND, "ADMIN_TOKEN": "test-admin-token"})
+            cls.admin_headers = {"X-Admin-Token": "test-admin-token"}
             cls.app.config['TESTING'] = True
-            cls.app.config['SQLALCHEMY_DATABASE_URI'] = (
-                f"postgresql://{os.getenv('DATABASE_USER')}:{os.getenv('DATABASE_PASSWORD')}@"
-                f"{os.getenv('DATABASE_HOST')}/{os.getenv('DATABASE_NAME')}"
-            )
 
             cls.client = cls.app.test_client()
 
-            with cls.app.app_context():
-                db.create_all()
+            if STORAGE_BACKEND == "postgis":
+                with cls.app.app_context():
+                    db.create_all()
         except Exception as e:
             print(f"Error in setUpClass: {e}")
             raise
@@ -42,20 +55,23 @@ class TestGeometryResource(unittest.TestCase):
     def tearDownClass(cls):
         """Clean up after all tests."""
         with cls.app.app_context():
-            db.drop_all()
+            if STORAGE_BACKEND == "postgis":
+                db.drop_all()
 
     def setUp(self):
         """Setup for individual tests."""
         with self.app.app_context():
-            db.session.remove()
-            db.drop_all()
-            db.create_all()
+            get_storage().reset()
+        self.app.extensions["admission"].reset()
 
     def tearDown(self):
         """Cleanup after individual tests."""
         with self.app.app_context():
-            db.session.remove()
-            db.drop_all()
+            if STORAGE_BACKEND == "postgis":
+                db.session.remove()
+                db.drop_all()
+            else:
+                get_storage().reset()
 
     # ---------------------------------------------------------------------------
     # TESTING POST GEOMETRY
@@ -106,6 +122,54 @@ class TestGeometryResource(unittest.TestCase):
         response = self.client.post(f'{self.base_url}geometry', json=data)
         self.assertEqual(response.status_code, 400)
 
+    @requires_postgis
+    def test_post_self_intersecting_geometry(self):
+        """
+            Test if the API repairs a self-intersecting polygon and stores its derived columns.
+
+        Returns
+        -------
+            A 201 response if the repaired geometry is successfully posted.
+        """
+        data = {
+            "description": "Bowtie",
+            "geom": {
+                "type": "Polygon",
+                "coordinates": [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]
+            }
+        }
+        response = self.client.post(f'{self.base_url}geometry', json=data)
+        self.assertEqual(response.status_code, 201)
+
+        with self.app.app_context():
+            geometry = db.session.get(GeometryModel, 1)
+            self.assertEqual(geometry.num_points, 8)
+            self.assertGreater(geometry.area, 0)
+            self.assertIsNotNone(geometry.bbox)
+            self.assertIsNotNone(geometry.centroid)
+
+    def test_post_oversized_geometry(self):
+        """
+            Test if the API returns a 400 response when the geometry has more vertices than allowed.
+
+        Returns
+        -------
+            A 400 response if the geometry is rejected.
+        """
+        self.app.config["GEOMETRY_MAX_VERTICES"] = 3
+        data = {
+            "description": "My new geometry",
+            "geom": {
+                "type": "LineString",
+                "coordinates": [[0, 0], [1, 1], [2, 2], [3, 3]]
+            }
+        }
+        try:
+            response = self.client.post(f'{self.base_url}geometry', json=data)
+        finally:
+            self.app.config["GEOMETRY_MAX_VERTICES"] = 1_000_000
+        self.assertEqual(response.status_code, 400)
+
     # ---------------------------------------------------------------------------
     # TESTING GET GEOMETRY
     # ---------------------------------------------------------------------------
@@ -158,6 +222,49 @@ class TestGeometryResource(unittest.TestCase):
         response = self.client.get(f'{self.base_url}geometry?id=99')
         self.assertEqual(response.status_code, 404)
 
+    def test_geometry_contains_on_subdivided_polygon(self):
+        """
+            Test if the containment filter finds a point inside a polygon split in many pieces,
+            and returns a 404 response for a point outside of it.
+
+        Returns
+        -------
+            A 200 response for the inner point and a 404 response for the outer point.
+        """
+        coordinates = [
+            [10 * math.cos(2 * math.pi * i / 4000), 10 * math.sin(2 * math.pi * i / 4000)]
+            for i in range(4000)
+        ]
+        data = {
+            "description": "Huge polygon",
+            "geom": {"type": "Polygon", "coordinates": [coordinates + [coordinates[0]]]}
+        }
+        response = self.client.post(f'{self.base_url}geometry', json=data)
+        self.assertEqual(response.status_code, 201)
+
+        inside = {"geom": {"type": "Point", "coordinates": [0, 0]}}
+        response = self.client.get(f'{self.base_url}geometry', json=inside)
+        self.assertEqual(response.status_code, 200)
+
+        outside = {"geom": {"type": "Point", "coordinates": [9.9, 9.9]}}
+        response = self.client.get(f'{self.base_url}geometry', json=outside)
+        self.assertEqual(response.status_code, 404)
+
+    def test_geometry_with_invalid_predicate(self):
+        """
+            Test if the API returns a 400 response when the spatial predicate is not supported.
+
+        Returns
+        -------
+            A 400 response if the predicate is invalid.
+        """
+        data = {
+            "geom": {"type": "Point", "coordinates": [0, 0]},
+            "predicate": "touches"
+        }
+        response = self.client.get(f'{self.base_url}geometry', json=data)
+        self.assertEqual(response.status_code, 400)
+
     # ---------------------------------------------------------------------------
     # TESTING PUT GEOMETRY
     # ---------------------------------------------------------------------------
@@ -220,6 +327,815 @@ class TestGeometryResource(unittest.TestCase):
         response = self.client.delete(f'{self.base_url}geometry?id=99')
         self.assertEqual(response.status_code, 404)
 
+    # ---------------------------------------------------------------------------
+    # TESTING BULK GEOMETRY
+    # ---------------------------------------------------------------------------
+    def test_bulk_update_by_ids(self):
+        """
+            Test if the API returns a 200 response and the number of affected geometries
+            when many geometries are updated by an id list.
+
+        Returns
+        -------
+            A 200 response with the number of updated geometries.
+        """
+        self.test_post_valid_geometry()
+        self.test_post_valid_geometry()
+        update_data = {
+            "ids": [1, 2, 99],
+            "new_description": "Sample point"
+        }
+        response = self.client.put(f'{self.base_url}geometry/bulk', json=update_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["affected"], 2)
+
+    def test_bulk_delete_dry_run(self):
+        """
+            Test if the API reports the number of geometries matching a filter without
+            deleting them when dry_run is true.
+
+        Returns
+        -------
+            A 200 response with the number of geometries that would be deleted.
+        """
+        self.test_post_valid_geometry()
+        delete_data = {
+            "description": "My new geometry",
+            "dry_run": True
+        }
+        response = self.client.delete(f'{self.base_url}geometry/bulk', json=delete_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["affected"], 1)
+
+        response = self.client.get(f'{self.base_url}geometry?id=1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_delete_rejects_non_boolean_dry_run(self):
+        """
+            Test if the API rejects a dry_run that is not a JSON boolean, e.g. the string
+            "false", instead of reading it as true, and leaves the geometries untouched.
+
+        Returns
+        -------
+            A 400 response for a non-boolean dry_run.
+        """
+        self.test_post_valid_geometry()
+        for dry_run in ("false", "true", 0, None):
+            response = self.client.delete(
+                f'{self.base_url}geometry/bulk', json={"description": "My new geometry", "dry_run": dry_run}
+            )
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(f'{self.base_url}geometry?id=1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_delete_without_selector(self):
+        """
+            Test if the API returns a 400 response when a bulk delete has neither ids nor
+            a filter.
+
+        Returns
+        -------
+            A 400 response if no geometry selector is provided.
+        """
+        response = self.client.delete(f'{self.base_url}geometry/bulk', json={"dry_run": False})
+        self.assertEqual(response.status_code, 400)
+
+    # ---------------------------------------------------------------------------
+    # TESTING GEOMETRY AGGREGATIONS
+    # ---------------------------------------------------------------------------
+    @requires_postgis
+    def test_count_by_description(self):
+        """
+            Test if the API returns one count per description, with the total area and vertices
+            of the derived columns.
+
+        Returns
+        -------
+            A 200 response with the counts grouped by description.
+        """
+        self.test_post_valid_geometry()
+        self.test_post_valid_geometry()
+        bowtie = {"type": "Polygon", "coordinates": [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}
+        self.client.post(f'{self.base_url}geometry', json={"description": "Bowtie", "geom": bowtie})
+        response = self.client.get(f'{self.base_url}geometry/aggregate/count?group_by=description')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()[0], {"DESCRIPTION": "My new geometry", "COUNT": 2, "AREA": 0.0, "VERTICES": 2})
+        self.assertEqual(response.get_json()[1]["VERTICES"], 8)
+        self.assertGreater(response.get_json()[1]["AREA"], 0)
+
+    @requires_postgis
+    def test_square_grid(self):
+        """
+            Test if the API bins the geometries in the non-empty cells of a square grid.
+
+        Returns
+        -------
+            A 200 response with a single cell holding both geometries.
+        """
+        self.test_post_valid_geometry()
+        self.test_post_valid_geometry()
+        response = self.client.get(f'{self.base_url}geometry/aggregate/grid?size=1&bbox=-80,30,-70,50')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 1)
+        self.assertEqual(response.get_json()[0]["COUNT"], 2)
+
+    @requires_postgis
+    def test_hex_grid_counts_each_geometry_once(self):
+        """
+            Test if a geometry whose centroid is a vertex shared by three hexagons is counted
+            in a single cell of the hexagonal grid.
+
+        Returns
+        -------
+            A 200 response whose counts add up to the number of geometries.
+        """
+        # Com size=1, o ponto (1, 0) é um vértice comum a três hexágonos de ST_HexagonGrid
+        self.client.post(f'{self.base_url}geometry', json={
+            "description": "Vertex", "geom": {"type": "Point", "coordinates": [1, 0]}
+        })
+        response = self.client.get(f'{self.base_url}geometry/aggregate/grid?size=1&shape=hex&bbox=-3,-3,3,3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(cell["COUNT"] for cell in response.get_json()), 1)
+
+    @requires_postgis
+    def test_grid_with_invalid_size(self):
+        """
+            Test if the API returns a 400 response when the grid size is not a positive number.
+
+        Returns
+        -------
+            A 400 response if the size is invalid.
+        """
+        response = self.client.get(f'{self.base_url}geometry/aggregate/grid?size=-1')
+        self.assertEqual(response.status_code, 400)
+
+    def test_aggregation_rejects_non_finite_parameters(self):
+        """
+            Test if NaN and infinite sizes and bounding boxes are rejected before they reach
+            the aggregation queries.
+        """
+        for query in ("size=nan", "size=inf", "size=-inf"):
+            with self.app.test_request_context(f"/geometry/aggregate/grid?{query}"):
+                with self.assertRaises(ValueError):
+                    aggregation._parse_positive_float('size')
+
+        for bbox in ("nan,0,1,1", "0,0,inf,1", "-inf,-inf,inf,inf"):
+            with self.assertRaises(ValueError):
+                aggregation._parse_bbox(bbox)
+
+    @requires_postgis
+    def test_clusters_by_zoom(self):
+        """
+            Test if the API clusters close geometries at a low zoom level.
+
+        Returns
+        -------
+            A 200 response with a single cluster holding both geometries.
+        """
+        self.test_post_valid_geometry()
+        self.test_post_valid_geometry()
+        response = self.client.get(f'{self.base_url}geometry/aggregate/clusters?zoom=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 1)
+        self.assertEqual(response.get_json()[0]["COUNT"], 2)
+
+    @requires_postgis
+    def test_clusters_above_limit(self):
+        """
+            Test if the API returns a 400 response when the clustering has more clusters than
+            AGGREGATION_MAX_CLUSTERS.
+
+        Returns
+        -------
+            A 400 response for two distant geometries with a limit of one cluster.
+        """
+        for coordinates in ([0, 0], [50, 50]):
+            self.client.post(f'{self.base_url}geometry', json={
+                "description": "Point", "geom": {"type": "Point", "coordinates": coordinates}
+            })
+
+        self.app.config["AGGREGATION_MAX_CLUSTERS"] = 1
+        try:
+            response = self.client.get(f'{self.base_url}geometry/aggregate/clusters?zoom=10')
+        finally:
+            self.app.config["AGGREGATION_MAX_CLUSTERS"] = 10_000
+        self.assertEqual(response.status_code, 400)
+
+    # ---------------------------------------------------------------------------
+    # TESTING RESPONSE COMPRESSION
+    # ---------------------------------------------------------------------------
+    def test_response_compressed_with_gzip(self):
+        """
+            Test if the response is compressed with gzip when the client accepts it.
+
+        Returns
+        -------
+            A 200 gzip encoded response with the same content as the uncompressed one.
+        """
+        self.test_post_valid_geometry()
+        self.app.config["COMPRESS_MIN_SIZE"] = 0
+        try:
+            response = self.client.get(f'{self.base_url}geometry?id=1', headers={"Accept-Encoding": "gzip"})
+        finally:
+            self.app.config["COMPRESS_MIN_SIZE"] = 1024
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.data))[0]["ID"], 1)
+
+    def test_response_not_compressed_without_accept_encoding(self):
+        """
+            Test if the response is not compressed when the client does not send Accept-Encoding.
+
+        Returns
+        -------
+            A 200 response without Content-Encoding.
+        """
+        self.test_post_valid_geometry()
+        self.app.config["COMPRESS_MIN_SIZE"] = 0
+        try:
+            response = self.client.get(f'{self.base_url}geometry?id=1')
+        finally:
+            self.app.config["COMPRESS_MIN_SIZE"] = 1024
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.get_json()[0]["ID"], 1)
+
+    # ---------------------------------------------------------------------------
+    # TESTING QUERY BATCH
+    # ---------------------------------------------------------------------------
+    def test_query_batch_keyed_results(self):
+        """
+            Test if a query batch returns the result of each id lookup and filter by key, with
+            the status GET /geometry would have returned.
+
+        Returns
+        -------
+            A 200 response with one result per sub-request.
+        """
+        self.test_post_valid_geometry()
+
+        data = {
+            "queries": {
+                "found": {"id": 1},
+                "missing": {"id": 99},
+                "invalid": {"id": "a"},
+                "float": {"id": 1.9},
+                "boolean": {"id": True},
+                "digits": {"id": "1"},
+                "filter": {"description": "My new geometry"}
+            }
+        }
+        response = self.client.post(f'{self.base_url}geometry/query-batch', json=data)
+        self.assertEqual(response.status_code, 200)
+
+        results = response.get_json()
+        self.assertEqual(results["found"]["STATUS"], 200)
+        self.assertEqual(results["found"]["DATA"][0]["ID"], 1)
+        self.assertEqual(results["missing"]["STATUS"], 404)
+        self.assertEqual(results["invalid"]["STATUS"], 400)
+        self.assertEqual(results["float"]["STATUS"], 400)
+        self.assertEqual(results["boolean"]["STATUS"], 400)
+        self.assertEqual(results["digits"]["DATA"][0]["ID"], 1)
+        self.assertEqual(results["filter"]["DATA"][0]["DESCRIPTION"], "My new geometry")
+
+    def test_query_batch_too_many_queries(self):
+        """
+            Test if a query batch with more than QUERY_BATCH_MAX_QUERIES sub-requests is rejected.
+
+        Returns
+        -------
+            A 400 response.
+        """
+        data = {"queries": [{"id": id} for id in range(self.app.config["QUERY_BATCH_MAX_QUERIES"] + 1)]}
+        response = self.client.post(f'{self.base_url}geometry/query-batch', json=data)
+        self.assertEqual(response.status_code, 400)
+
+    # ---------------------------------------------------------------------------
+    # TESTING ADMISSION CONTROL
+    # ---------------------------------------------------------------------------
+    def test_rate_limit_per_api_key(self):
+        """
+            Test if a client that used up its token bucket gets a 429 response with Retry-After,
+            while the other clients are still served.
+
+        Returns
+        -------
+            A 429 response for the third request of the limited key.
+        """
+        self.app.config["ADMISSION_CLIENT_LIMITS"] = {"limited": {"rate": 0.01, "burst": 2}}
+        try:
+            responses = [
+                self.client.get(f'{self.base_url}geometry?id=1', headers={"X-API-Key": "limited"})
+                for _ in range(3)
+            ]
+            other = self.client.get(f'{self.base_url}geometry?id=1', headers={"X-API-Key": "other"})
+        finally:
+            self.app.config["ADMISSION_CLIENT_LIMITS"] = {}
+
+        self.assertEqual([response.status_code for response in responses], [404, 404, 429])
+        self.assertGreaterEqual(int(responses[2].headers["Retry-After"]), 1)
+        self.assertEqual(other.status_code, 404)
+
+    def test_rate_limit_ignores_unknown_keys(self):
+        """
+            Test if a client that sends a new unknown API key on each request shares the bucket
+            of its address, so rotating the keys does not escape the rate limit.
+
+        Returns
+        -------
+            A 429 response for the third request, whatever key it sends.
+        """
+        limits = self.app.config["ADMISSION_RATE"], self.app.config["ADMISSION_BURST"]
+        self.app.config["ADMISSION_RATE"], self.app.config["ADMISSION_BURST"] = 0.01, 2
+        try:
+            responses = [
+                self.client.get(f'{self.base_url}geometry?id=1', headers={"X-API-Key": f"random-{i}"})
+                for i in range(3)
+            ]
+            clients = self.client.get(f'{self.base_url}admin/admission', headers=self.admin_headers).get_json()["rate"]["clients"]
+        finally:
+            self.app.config["ADMISSION_RATE"], self.app.config["ADMISSION_BURST"] = limits
+
+        self.assertEqual([response.status_code for response in responses], [404, 404, 429])
+        self.assertEqual(clients, 1)
+
+    def test_route_concurrency_sheds_load(self):
+        """
+            Test if a request is shed with a 503 response when its route has no free slot and
+            no room in its queue, and if the shed request is counted in the admin metrics.
+
+        Returns
+        -------
+            A 503 response with Retry-After.
+        """
+        limits = self.app.config["ADMISSION_ROUTE_CONCURRENCY"], self.app.config["ADMISSION_QUEUE_SIZE"]
+        self.app.config["ADMISSION_ROUTE_CONCURRENCY"] = {"/geometry": 0}
+        self.app.config["ADMISSION_QUEUE_SIZE"] = 0
+        try:
+            self.app.extensions["admission"].reset()
+            response = self.client.get(f'{self.base_url}geometry?id=1')
+            metrics = self.client.get(f'{self.base_url}admin/admission', headers=self.admin_headers).get_json()
+        finally:
+            self.app.config["ADMISSION_ROUTE_CONCURRENCY"], self.app.config["ADMISSION_QUEUE_SIZE"] = limits
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertEqual(metrics["routes"]["/geometry"]["shed"], 1)
+
+    def test_admin_routes_require_token(self):
+        """
+            Test if the admin routes reject requests without the admin token, and if they are not
+            registered when ADMIN_TOKEN is not set.
+
+        Returns
+        -------
+            A 401 response without the token and a 404 response without ADMIN_TOKEN.
+        """
+        without_token = self.client.delete(f'{self.base_url}admin/slow-queries')
+        wrong_token = self.client.get(f'{self.base_url}admin/hot-queries', headers={"X-Admin-Token": "guess"})
+        with_token = self.client.get(f'{self.base_url}admin/hot-queries', headers=self.admin_headers)
+
+        app = create_app({"STORAGE_BACKEND": STORAGE_BACKEND, "ADMIN_TOKEN": None})
+        disabled = app.test_client().get(f'{self.base_url}admin/admission')
+
+        self.assertEqual(without_token.status_code, 401)
+        self.assertEqual(wrong_token.status_code, 401)
+        self.assertEqual(with_token.status_code, 200)
+        self.assertEqual(disabled.status_code, 404)
+
+    # ---------------------------------------------------------------------------
+    # TESTING SLOW QUERY LOG
+    # ---------------------------------------------------------------------------
+    def test_query_fingerprint_and_redaction(self):
+        """
+            Test if statements that only differ by their parameters, literals or IN list length
+            share a fingerprint, and if texts are redacted from the logged parameters.
+        """
+        self.assertEqual(
+            query_log.fingerprint("SELECT * FROM geometries WHERE id IN (%(id_1_1)s, %(id_1_2)s) AND area > 10"),
+            query_log.fingerprint("SELECT *\n FROM geometries WHERE id IN (%(id_1_1)s) AND area > 2.5")
+        )
+        self.assertEqual(
+            query_log.redact({"description": "secret", "id": 3, "ids": [1, 2]}),
+            {"description": "<str:6>", "id": 3, "ids": [1, 2]}
+        )
+
+    def test_plan_outline_without_parameters(self):
+        """
+            Test if the outline of a plan keeps its nodes, relations and rows but not the
+            conditions of the nodes, where PostgreSQL prints the parameters as literals.
+        """
+        plan = [{
+            "Plan": {
+                "Node Type": "Seq Scan", "Relation Name": "geometries", "Startup Cost": 0.0,
+                "Total Cost": 25.5, "Plan Rows": 3, "Filter": "(description = 'secret'::text)",
+                "Output": ["'secret'::text"], "Rows Removed by Filter": 7
+            },
+            "Planning Time": 0.1,
+            "Execution Time": 0.5
+        }]
+        outline = query_log.plan_outline(json.dumps(plan))
+
+        self.assertIn("Seq Scan on geometries (cost=0.00..25.50 rows=3)", outline)
+        self.assertIn("Rows Removed by Filter: 7", outline)
+        self.assertNotIn("secret", outline)
+
+    def test_slow_queries_endpoint(self):
+        """
+            Test if the statements above the threshold are aggregated by fingerprint and served,
+            with redacted parameters, by the admin endpoint.
+
+        Returns
+        -------
+            A 200 response with the statistics of the statement.
+        """
+        self.app.config["SLOW_QUERY_THRESHOLD_MS"] = 0
+        try:
+            with self.app.app_context():
+                self.app.extensions["query_log"].reset()
+                for value in ("first secret", "second secret"):
+                    db.session.execute(text("SELECT :value AS value"), {"value": value})
+                db.session.remove()
+            response = self.client.get(f'{self.base_url}admin/slow-queries?order_by=calls', headers=self.admin_headers)
+        finally:
+            self.app.config["SLOW_QUERY_THRESHOLD_MS"] = 200
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        statement = next(stats for stats in data["STATEMENTS"] if "AS value" in stats["statement"])
+        self.assertEqual(statement["calls"], 2)
+        self.assertEqual(statement["slow"], 2)
+        self.assertNotIn("secret", json.dumps(data["RECENT"]))
+
+    # ---------------------------------------------------------------------------
+    # TESTING REPROJECTION
+    # ---------------------------------------------------------------------------
+    def test_parse_srid(self):
+        """
+            Test if the srid and crs parameters accept EPSG codes, and if an invalid code is
+            rejected with a 400 response.
+
+        Returns
+        -------
+            A 400 response for an invalid srid.
+        """
+        self.assertEqual(projection.parse_srid(srid="3857"), 3857)
+        self.assertEqual(projection.parse_srid(crs="EPSG:32723"), 32723)
+        self.assertEqual(projection.parse_srid(crs="http://www.opengis.net/def/crs/EPSG/0/3857"), 3857)
+        self.assertIsNone(projection.parse_srid())
+        with self.assertRaises(ValueError):
+            projection.parse_srid(srid=3857, crs="EPSG:4326")
+
+        response = self.client.get(f'{self.base_url}geometry?id=1&srid=mercator')
+        self.assertEqual(response.status_code, 400)
+
+    @unittest.skipIf(projection.pyproj is None, "Requires pyproj")
+    def test_transformer_cache_is_bounded(self):
+        """
+            Test if the transformers of the client-supplied SRIDs are cached up to
+            MAX_TRANSFORMERS per thread, the most recently used ones being kept.
+        """
+        projection._TRANSFORMERS.cache = None
+        first = projection.transformer(4326, 3857)
+        for zone in range(32601, 32601 + projection.MAX_TRANSFORMERS):
+            projection.transformer(4326, zone)
+            projection.transformer(4326, 3857)
+
+        self.assertEqual(len(projection._TRANSFORMERS.cache), projection.MAX_TRANSFORMERS)
+        self.assertIs(projection.transformer(4326, 3857), first)
+        self.assertNotIn((4326, 32601), projection._TRANSFORMERS.cache)
+
+    @unittest.skipIf(
+        STORAGE_BACKEND == "memory" and projection.pyproj is None,
+        "Requires pyproj with the memory storage backend"
+    )
+    def test_geometry_in_requested_crs(self):
+        """
+            Test if a geometry posted in Web Mercator is stored in EPSG:4326 and returned in
+            Web Mercator when requested, with the Content-Crs header.
+
+        Returns
+        -------
+            A 200 response with the geometry in EPSG:3857.
+        """
+        radius = 6378137
+        x = math.radians(-73.935242) * radius
+        y = math.log(math.tan(math.pi / 4 + math.radians(40.73061) / 2)) * radius
+
+        data = {"description": "Mercator", "geom": {"type": "Point", "coordinates": [x, y]}}
+        response = self.client.post(f'{self.base_url}geometry?srid=3857', json=data)
+        self.assertEqual(response.status_code, 201)
+
+        geometry = self.client.get(f'{self.base_url}geometry?id=1').get_json()[0]["GEOMETRY"]
+        lon, lat = map(float, geometry[geometry.index("(") + 1:-1].split())
+        self.assertAlmostEqual(lon, -73.935242, places=6)
+        self.assertAlmostEqual(lat, 40.73061, places=6)
+
+        response = self.client.get(f'{self.base_url}geometry?id=1&crs=EPSG:3857')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Crs"], "<http://www.opengis.net/def/crs/EPSG/0/3857>")
+        geometry = response.get_json()[0]["GEOMETRY"]
+        projected_x, projected_y = map(float, geometry[geometry.index("(") + 1:-1].split())
+        self.assertAlmostEqual(projected_x, x, places=2)
+        self.assertAlmostEqual(projected_y, y, places=2)
+
+    # ---------------------------------------------------------------------------
+    # TESTING HOT QUERIES
+    # ---------------------------------------------------------------------------
+    def test_hot_query_served_and_refreshed(self):
+        """
+            Test if a hot query is served from its stored result, and if the result is
+            invalidated by the writes of matching geometries only and computed again on the
+            next request.
+
+        Returns
+        -------
+            A 200 response with the geometries written before the request.
+        """
+        cache = self.app.extensions["hot_queries"]
+        self.app.config["HOT_QUERIES"] = [{"description": "Hot"}]
+        try:
+            cache.reset()
+            self.client.post(f'{self.base_url}geometry', json={"description": "Hot", "geom": {"type": "Point", "coordinates": [1, 1]}})
+            self.assertEqual(self.client.get(f'{self.base_url}geometry', json={"description": "Hot"}).status_code, 200)
+
+            self.client.post(f'{self.base_url}geometry', json={"description": "Cold", "geom": {"type": "Point", "coordinates": [3, 3]}})
+            self.assertEqual(self.client.get(f'{self.base_url}geometry', json={"description": "Hot"}).status_code, 200)
+
+            self.client.post(f'{self.base_url}geometry', json={"description": "Hot", "geom": {"type": "Point", "coordinates": [2, 2]}})
+            response = self.client.get(f'{self.base_url}geometry', json={"description": "Hot"})
+            metrics = cache.metrics()
+
+            self.client.delete(f'{self.base_url}geometry/bulk', json={"description": "Hot"})
+            deleted = self.client.get(f'{self.base_url}geometry', json={"description": "Hot"})
+        finally:
+            self.app.config["HOT_QUERIES"] = []
+            cache.reset()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([geometry["ID"] for geometry in response.get_json()], [1, 3])
+        self.assertEqual(
+            (metrics["hits"], metrics["misses"], metrics["refreshes"], metrics["invalidations"]),
+            (1, 2, 2, 2)
+        )
+        self.assertEqual(deleted.status_code, 404)
+
+    def test_hot_query_lookup(self):
+        """
+            Test if a spatial filter equivalent to a hot query (the same box starting at another
+            vertex) is matched, and if only the writes within its box affect it.
+        """
+        cache = self.app.extensions["hot_queries"]
+        self.app.config["HOT_QUERIES"] = [{"description": "Park", "bbox": [0, 0, 10, 10], "predicate": "intersects"}]
+        try:
+            cache.reset()
+            query = cache.lookup("Park", Polygon([(10, 10), (0, 10), (0, 0), (10, 0)]), "intersects")
+            self.assertIsNotNone(query)
+            self.assertIsNone(cache.lookup("Park", Polygon([(10, 10), (0, 10), (0, 0), (10, 0)]), "contains"))
+            self.assertIsNone(cache.lookup("Park"))
+        finally:
+            self.app.config["HOT_QUERIES"] = []
+            cache.reset()
+
+        self.assertTrue(query.affected_by("Park", (9, 9, 12, 12)))
+        self.assertFalse(query.affected_by("Park", (11, 11, 12, 12)))
+        self.assertFalse(query.affected_by("Other", (1, 1, 2, 2)))
+
+    # ---------------------------------------------------------------------------
+    # TESTING GEOFENCE STREAM
+    # ---------------------------------------------------------------------------
+    def test_geofence_enter_and_exit_events(self):
+        """
+            Test if the geofence stream emits only the enter and exit events of the moving
+            objects, and an error line for an invalid update.
+
+        Returns
+        -------
+            A 200 NDJSON response with the expected events.
+        """
+        zone = {
+            "description": "Zone",
+            "geom": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+        }
+        response = self.client.post(f'{self.base_url}geometry', json=zone)
+        self.assertEqual(response.status_code, 201)
+
+        updates = [
+            {"object_id": "truck", "lon": -1, "lat": 0.5, "ts": 1},
+            {"object_id": "truck", "lon": 0.5, "lat": 0.5, "ts": 2},
+            {"object_id": "truck", "lon": 0.6, "lat": 0.5, "ts": 3},
+            {"object_id": "truck", "lon": "east", "lat": 0.5, "ts": 4},
+            {"object_id": "truck", "lon": 2, "lat": 0.5, "ts": 5},
+        ]
+        response = self.client.post(
+            f'{self.base_url}geometry/geofence?description=Zone',
+            data="".join(json.dumps(update) + "\n" for update in updates),
+            content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(lines[0]["line"], 4)
+        events = [(line["event"], line["geometry_id"], line["ts"]) for line in lines[1:]]
+        self.assertEqual(events, [("enter", 1, 2), ("exit", 1, 5)])
+
+    def test_geofence_stream_follows_zone_writes(self):
+        """
+            Test if an open geofence stream sees a zone added after it started, and if the
+            indexes kept by description are bounded by GEOFENCE_MAX_INDEXES.
+
+        Returns
+        -------
+            An enter event in the zone added during the stream.
+        """
+        square = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+        self.client.post(f'{self.base_url}geometry', json={"description": "Zone", "geom": square})
+
+        updates = [
+            {"object_id": "truck", "lon": 0.5, "lat": 0.5, "ts": 1},
+            {"object_id": "truck", "lon": 0.6, "lat": 0.5, "ts": 2},
+        ]
+        response = self.client.post(
+            f'{self.base_url}geometry/geofence?description=Zone',
+            data="".join(json.dumps(update) + "\n\n" for update in updates),
+            content_type="application/x-ndjson",
+            buffered=False
+        )
+        chunks = iter(response.response)
+        first = [json.loads(line) for line in next(chunks).decode().splitlines()]
+
+        with self.app.app_context():
+            get_storage().add("Zone", Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]))
+        second = [json.loads(line) for line in b"".join(chunks).decode().splitlines()]
+        response.close()
+
+        self.assertEqual([(event["event"], event["geometry_id"]) for event in first], [("enter", 1)])
+        self.assertEqual([(event["event"], event["geometry_id"]) for event in second], [("enter", 2)])
+
+        self.app.config["GEOFENCE_MAX_INDEXES"] = 2
+        try:
+            with self.app.app_context():
+                for description in ("a", "b", "c"):
+                    geofence.get_index(self.app, get_storage(), description=description)
+            self.assertEqual(list(self.app.extensions["geofence_indexes"]), ["b", "c"])
+        finally:
+            self.app.config["GEOFENCE_MAX_INDEXES"] = 64
+
+    def test_geofence_without_ndjson(self):
+        """
+            Test if the geofence stream returns a 415 response when the body is not NDJSON.
+
+        Returns
+        -------
+            A 415 response.
+        """
+        response = self.client.post(f'{self.base_url}geometry/geofence', json={"object_id": 1})
+        self.assertEqual(response.status_code, 415)
+
+    # ---------------------------------------------------------------------------
+    # TESTING COVERING CELLS
+    # ---------------------------------------------------------------------------
+    def test_query_cells_match_covering_cells(self):
+        """
+            Test if the cells of a queried point share a cell with the covering cells of the
+            polygons that contain it, and not with the ones of a distant polygon.
+
+        Returns
+        -------
+            True if only the polygons around the point share a cell with it.
+        """
+        point = Point(-73.935242, 40.73061)
+        cells = set(geohash.query_cells(point.bounds, min_precision=1, max_precision=7))
+
+        for polygon in (point.buffer(0.001), point.buffer(1), Polygon([(-80, 30), (-60, 30), (-70, 50)])):
+            covering = geohash.covering_cells(polygon, min_precision=1, max_precision=7, max_cells=32)
+            self.assertLessEqual(len(covering), 32)
+            self.assertTrue(cells & set(covering))
+
+        distant = geohash.covering_cells(Point(2.35, 48.85).buffer(1), min_precision=1, max_precision=7, max_cells=32)
+        self.assertFalse(cells & set(distant))
+
+    @requires_postgis
+    def test_geometry_cells_follow_writes(self):
+        """
+            Test if the covering cells are stored on write, used by the containment filter and
+            removed with the geometry.
+
+        Returns
+        -------
+            A 200 response for the point inside the geometry, and no cells after its removal.
+        """
+        self.test_post_valid_geometry()
+        with self.app.app_context():
+            self.assertEqual(db.session.query(GeometryCellModel).filter_by(geometry_id=1).count(), 1)
+
+        data = {"geom": {"type": "Point", "coordinates": [-73.935242, 40.73061]}}
+        response = self.client.get(f'{self.base_url}geometry', json=data)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.delete(f'{self.base_url}geometry?id=1')
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(db.session.query(GeometryCellModel).count(), 0)
+
+    # ---------------------------------------------------------------------------
+    # TESTING SPATIAL PARTITIONING
+    # ---------------------------------------------------------------------------
+    def test_pruning_keys_cover_partition_keys(self):
+        """
+            Test if the partition keys used to prune a query include the keys of the geometries
+            that intersect it, and exclude the keys of distant geometries.
+
+        Returns
+        -------
+            True if only the distant geometry is pruned.
+        """
+        query = Polygon([(-74.0, 40.7), (-73.9, 40.7), (-73.9, 40.8), (-74.0, 40.8)])
+        keys = partitioning.pruning_keys(query.bounds, precision=3)
+
+        touching = Polygon([(-73.9, 40.75), (-73.0, 40.75), (-73.0, 41.0), (-73.9, 41.0)])
+        self.assertIn(partitioning.partition_key(touching, 3), keys)
+        self.assertIn(partitioning.partition_key(Point(-73.95, 40.75), 3), keys)
+        self.assertIn(partitioning.partition_key(Polygon([(-170, -80), (170, -80), (0, 80)]), 3), keys)
+        self.assertNotIn(partitioning.partition_key(Point(2.35, 48.85), 3), keys)
+
+    @requires_postgis
+    def test_contains_on_partitioned_table(self):
+        """
+            Test if the containment filter finds the geometries of a partitioned table when the
+            partitions are pruned.
+
+        Returns
+        -------
+            A 200 response with the geometry stored in its own partition.
+        """
+        with self.app.app_context():
+            self.assertTrue(partitioning.enable(db.engine))
+
+        self.test_post_valid_geometry()
+
+        self.app.config["GEOMETRY_PARTITIONING"] = True
+        try:
+            with self.app.app_context():
+                moved = partitioning.rebalance(db.engine, split_rows=1, merge_rows=0)
+                self.assertEqual([action for action, _, _ in moved], ["split"])
+
+            data = {"geom": {"type": "Point", "coordinates": [-73.935242, 40.73061]}}
+            response = self.client.get(f'{self.base_url}geometry', json=data)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()[0]["ID"], 1)
+        finally:
+            self.app.config["GEOMETRY_PARTITIONING"] = False
+
+    # ---------------------------------------------------------------------------
+    # TESTING SCHEMA MIGRATIONS
+    # ---------------------------------------------------------------------------
+    @requires_postgis
+    def test_migrations_upgrade(self):
+        """
+            Test if the migrations create the schema from scratch, up to the latest version,
+            and if the API works on the migrated schema.
+
+        Returns
+        -------
+            A 201 response if a geometry is posted on the migrated schema.
+        """
+        with self.app.app_context():
+            db.drop_all()
+            try:
+                applied = migrations.upgrade(db.engine, self.app.config)
+                self.assertEqual(applied[-1][0], migrations.latest_version())
+                self.assertEqual(migrations.upgrade(db.engine, self.app.config), [])
+
+                self.test_post_valid_geometry()
+            finally:
+                with db.engine.begin() as connection:
+                    connection.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+
+    @requires_postgis
+    def test_outdated_schema_is_reported(self):
+        """
+            Test if a geometries table without the derived columns is reported with a 503
+            response that names the missing column, instead of failing on the first write.
+
+        Returns
+        -------
+            A 503 response while the column is missing.
+        """
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text("ALTER TABLE geometries DROP COLUMN num_points"))
+                self.assertEqual(migrations.missing_columns(connection, db.metadata), ["geometries.num_points"])
+
+        self.app.extensions.pop("schema_checked", None)
+        try:
+            response = self.client.get(f'{self.base_url}geometry?id=1')
+        finally:
+            self.app.extensions.pop("schema_checked", None)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("geometries.num_points", response.get_json()["message"])
+
     # ---------------------------------------------------------------------------
     # TESTING GET ADDRESS
     # ---------------------------------------------------------------------------
@@ -277,5 +1193,43 @@ class TestGeometryResource(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
 
 
+class TestMemoryStorage(unittest.TestCase):
+
+    def test_snapshot_roundtrip(self):
+        """
+            Test if the geometries of the memory storage are restored from a snapshot, keeping
+            their ids and the next id.
+
+        Returns
+        -------
+            The same geometries and ids after loading the snapshot in a new storage.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "geometries.json")
+            app = create_app({
+                "STORAGE_BACKEND": "memory",
+                "MEMORY_SNAPSHOT_PATH": path,
+                "MEMORY_SNAPSHOT_ON_EXIT": False
+            })
+
+            storage = app.extensions["geometry_storage"]
+            storage.add("Point", Point(-73.935242, 40.73061))
+            storage.add("Square", Polygon([(0, 0), (1, 0), (1, 1), (0, 1)]))
+            storage.delete(1)
+            storage.snapshot()
+
+            restored = create_app({
+                "STORAGE_BACKEND": "memory",
+                "MEMORY_SNAPSHOT_PATH": path,
+                "MEMORY_SNAPSHOT_ON_EXIT": False
+            })
+            storage = restored.extensions["geometry_storage"]
+
+            self.assertIsNone(storage.get(1))
+            self.assertEqual(storage.get(2)["DESCRIPTION"], "Square")
+            self.assertEqual(storage.find(geometry=Point(0.5, 0.5))[0]["ID"], 2)
+            self.assertEqual(storage.add("Other", Point(0, 0)), 3)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=2)
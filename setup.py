@@ -22,6 +22,10 @@ setup(
         packages=packages,
         include_package_data=True,
         install_requires=requires,
+        extras_require={
+            # Reprojeção das geometrias fora do PostGIS (parâmetros srid/crs)
+            'projection': ['pyproj>=3.6'],
+        },
         classifiers= [
             "Development Status :: 1 - Planning",
             'Programming Language :: Python :: 3 :: Only',